@@ -0,0 +1,293 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+
+from antlr_plsql import ast
+from antlr_plsql.batch import (
+    WARMUP_QUERIES,
+    init_worker,
+    load_result,
+    parse_detached,
+    parse_or_error,
+)
+
+# Async parsing ---------------------------------------------------------------
+# Parsing a long query takes tens to hundreds of milliseconds, so asyncio
+# services parse in an executor of warm workers instead of on the event loop:
+#
+#   parser = AsyncParser(workers=4, max_queue=100)
+#   tree = await parser.parse(sql_text, timeout=5)
+#   trees = await parser.parse_many(texts)
+#   parser.metrics.as_dict()
+#
+# or use parse_async and parse_many_async, with a default AsyncParser.
+#
+# Requests wait in a bounded queue until a worker is free. When the queue is
+# full, parse waits for room (backpressure). A request that's cancelled or times
+# out is dropped from the queue, but a parse that already started in a worker
+# process runs to completion (and its result is discarded).
+
+
+class ParseMetrics:
+    """Request counts and recent latencies of an AsyncParser
+
+    queue_depth: number of requests waiting for a worker
+    running: number of requests being parsed
+    wait_times: seconds that requests waited in the queue
+    latencies: seconds from submitting requests to their results
+    (for the last max_samples requests)
+    """
+
+    def __init__(self, max_samples=1000):
+        self.submitted = 0
+        self.completed = 0
+        self.parse_errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.running = 0
+        self.wait_times = deque(maxlen=max_samples)
+        self.latencies = deque(maxlen=max_samples)
+
+    def as_dict(self):
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "parse_errors": self.parse_errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+            "wait_time": get_percentiles(self.wait_times),
+            "latency": get_percentiles(self.latencies),
+        }
+
+    def __repr__(self):
+        return "<{} {} completed, {} queued, {} running, p50 {:.4f}s>".format(
+            self.__class__.__name__,
+            self.completed,
+            self.queue_depth,
+            self.running,
+            get_percentiles(self.latencies)["p50"],
+        )
+
+
+def get_percentiles(values, percentiles=(50, 90, 99)):
+    """{"p50": ..., "p90": ..., "p99": ...} of values (nearest rank), 0 if empty"""
+    values = sorted(values)
+    result = {}
+    for percentile in percentiles:
+        if values:
+            rank = max(0, -(-percentile * len(values) // 100) - 1)
+            result["p{}".format(percentile)] = values[rank]
+        else:
+            result["p{}".format(percentile)] = 0.0
+    return result
+
+
+class AsyncParser:
+    """Parses SQL in an executor, without blocking the event loop
+
+    executor is "process" (worker processes that parse the warmup queries and
+    load the DFA cache at dfa_path first, like batch.ParsePool), "thread"
+    (threads of this process, which is warmed up the same way) or an Executor.
+    Up to workers requests are parsed at a time, and up to max_queue requests
+    wait for a worker. mp_context (the multiprocessing context of the worker
+    processes) needs Python 3.7.
+    """
+
+    def __init__(
+        self,
+        workers=None,
+        max_queue=100,
+        executor="process",
+        warmup=WARMUP_QUERIES,
+        dfa_path=None,
+        mp_context=None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        if executor == "process":
+            if mp_context is None:
+                executor = ProcessPoolExecutor(self.workers)
+            else:
+                executor = ProcessPoolExecutor(self.workers, mp_context=mp_context)
+            # ProcessPoolExecutor only has an initializer from Python 3.7,
+            # so every worker is sent a warmup instead (while a worker warms
+            # up, the next warmup goes to another one)
+            for _ in range(self.workers):
+                executor.submit(init_worker, warmup, dfa_path)
+        elif executor == "thread":
+            executor = ThreadPoolExecutor(self.workers)
+            executor.submit(init_worker, warmup, dfa_path)
+        self.executor = executor
+        # trees parsed in other processes are sent back detached from ANTLR
+        self.detached = isinstance(executor, ProcessPoolExecutor)
+        self.metrics = ParseMetrics()
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+
+    async def parse(
+        self, sql_text, start="sql_script", strict=False, two_stage=False, timeout=None
+    ):
+        """Parse sql_text like ast.parse, in the executor
+
+        Raises asyncio.TimeoutError if there's no result after timeout seconds
+        (including the time waiting in the queue).
+        """
+        result = await self.submit(sql_text, start, strict, two_stage, timeout)
+        if isinstance(result, ast.ParseError):
+            raise result
+        return result
+
+    async def parse_many(
+        self, texts, start="sql_script", strict=False, two_stage=False, timeout=None
+    ):
+        """Parse texts concurrently, returning trees in input order
+
+        Texts that can't be parsed (or time out) get a ParseError (or
+        asyncio.TimeoutError) in their place, instead of failing the batch.
+        """
+        return await asyncio.gather(
+            *[
+                self.submit_or_timeout(text, start, strict, two_stage, timeout)
+                for text in texts
+            ]
+        )
+
+    async def submit(self, sql_text, start, strict, two_stage, timeout):
+        """Tree or ParseError for sql_text"""
+        args = (sql_text, start, strict, two_stage)
+        if self.detached:
+            result = load_result(await self.call(parse_detached, args, timeout))
+        else:
+            result = await self.call(parse_or_error, args, timeout)
+        if isinstance(result, ast.ParseError):
+            self.metrics.parse_errors += 1
+        return result
+
+    async def submit_or_timeout(self, *args):
+        try:
+            return await self.submit(*args)
+        except asyncio.TimeoutError as e:
+            return e
+
+    async def call(self, func, args, timeout=None):
+        """Result of func(*args) in the executor, queued like parse requests
+
+        func and its arguments have to be picklable for a process executor.
+        """
+        self.start()
+        metrics = self.metrics
+        metrics.submitted += 1
+        submitted = perf_counter()
+        future = self._loop.create_future()
+        try:
+            result = await asyncio.wait_for(self.request(func, args, future), timeout)
+        except asyncio.TimeoutError:
+            metrics.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            metrics.cancelled += 1
+            raise
+        finally:
+            # drops the request if it's still in the queue
+            future.cancel()
+        metrics.completed += 1
+        metrics.latencies.append(perf_counter() - submitted)
+        return result
+
+    async def request(self, func, args, future):
+        await self._queue.put((func, args, future, perf_counter()))
+        self.update_queue_depth()
+        return await future
+
+    def start(self):
+        """Start the tasks that pass requests to the executor (on this loop)"""
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_queue)
+            self._tasks = [loop.create_task(self.work()) for _ in range(self.workers)]
+
+    async def work(self):
+        metrics = self.metrics
+        while True:
+            func, args, future, queued = await self._queue.get()
+            self.update_queue_depth()
+            if future.done():
+                # cancelled or timed out while waiting
+                continue
+            metrics.wait_times.append(perf_counter() - queued)
+            metrics.running += 1
+            try:
+                result = await self._loop.run_in_executor(self.executor, func, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            finally:
+                metrics.running -= 1
+            if not future.done():
+                future.set_result(result)
+
+    def update_queue_depth(self):
+        metrics = self.metrics
+        metrics.queue_depth = self._queue.qsize()
+        metrics.max_queue_depth = max(metrics.max_queue_depth, metrics.queue_depth)
+
+    def close(self):
+        """Stop the workers, cancelling the requests that are still waiting"""
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        self._loop = None
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+default_parser = None
+
+
+def get_default_parser():
+    """AsyncParser used by parse_async, created with the defaults on first use"""
+    global default_parser
+    if default_parser is None:
+        default_parser = AsyncParser()
+    return default_parser
+
+
+def set_default_parser(parser):
+    """Use parser (e.g. with other workers or executor) for parse_async"""
+    global default_parser
+    default_parser = parser
+
+
+async def parse_async(
+    sql_text, start="sql_script", strict=False, two_stage=False, timeout=None
+):
+    """ast.parse in the executor of the default AsyncParser"""
+    return await get_default_parser().parse(sql_text, start, strict, two_stage, timeout)
+
+
+async def parse_many_async(
+    texts, start="sql_script", strict=False, two_stage=False, timeout=None
+):
+    """AsyncParser.parse_many with the default AsyncParser"""
+    return await get_default_parser().parse_many(
+        texts, start, strict, two_stage, timeout
+    )
@@ -1,4 +1,30 @@
-from .plsqlLexer import plsqlLexer as Lexer
-from .plsqlListener import plsqlListener as Listener
-from .plsqlParser import plsqlParser as Parser
-from .plsqlVisitor import plsqlVisitor as Visitor
+import sys
+from importlib import import_module
+from types import ModuleType
+
+# The generated modules are large and deserialize their ATN on import,
+# so they are only imported when one of these names is first used.
+GRAMMAR_CLASSES = {
+    "Lexer": (".plsqlLexer", "plsqlLexer"),
+    "Listener": (".plsqlListener", "plsqlListener"),
+    "Parser": (".plsqlParser", "plsqlParser"),
+    "Visitor": (".plsqlVisitor", "plsqlVisitor"),
+}
+
+
+class GrammarModule(ModuleType):
+    def __getattr__(self, name):
+        if name not in GRAMMAR_CLASSES:
+            raise AttributeError(
+                "module {!r} has no attribute {!r}".format(self.__name__, name)
+            )
+        module_name, cls_name = GRAMMAR_CLASSES[name]
+        cls = getattr(import_module(module_name, self.__name__), cls_name)
+        setattr(self, name, cls)
+        return cls
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(GRAMMAR_CLASSES))
+
+
+sys.modules[__name__].__class__ = GrammarModule
@@ -1,10 +1,25 @@
-import yaml
-import pkg_resources
 import inspect
+import pkgutil
+import queue
+import sys
+import threading
+from array import array
+from ast import AST
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+from string import Formatter
+from time import perf_counter
+
+from antlr4 import CommonTokenStream, ParserRuleContext, PredictionMode, Token
+from antlr4.Token import CommonToken
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.ErrorListener import ConsoleErrorListener
+from antlr4.error.Errors import ParseCancellationException
+from antlr4.tree.Tree import ErrorNode, TerminalNode, TerminalNodeImpl
 
 from antlr_ast.ast import (
-    parse as parse_ast,
-    process_tree,
     BaseAstVisitor,
     AliasNode,
     BaseNodeTransformer,
@@ -14,26 +29,538 @@ from antlr_ast.ast import (
     Terminal,
     BaseNode as AstNode,
     AntlrException as ParseError,
-    dump_node,  # TODO only used in tests
+    LexerErrorListener,
+    StrictErrorListener,
+    BaseNodeRegistry,
+    get_transformer_method_name,
 )
-from antlr_ast.inputstream import CaseTransformInputStream
 
 from antlr_plsql import grammar
+from antlr_plsql.cache import ParseCache
+from antlr_plsql.inputstream import CaseInsensitiveInputStream
+from antlr_plsql.stats import ParseStats, StatsListener, count_nodes
 
 # AST -------------------------------------------------------------------------
 # TODO: Finish Unary+Binary Expr
 #       sql_script
 
 
-def parse(sql_text, start="sql_script", **kwargs):
-    antlr_tree = parse_ast(
-        grammar, sql_text, start, transform=CaseTransformInputStream.UPPER, **kwargs
+def parse(
+    sql_text, start="sql_script", strict=False, two_stage=False, stats=None, **kwargs
+):
+    """Parse sql_text to an AST
+
+    stats can be a ParseStats, which is filled in while parsing,
+    or a callable, which is called with a new ParseStats after parsing
+    (also when parsing raises).
+    """
+    if stats is None or isinstance(stats, ParseStats):
+        parse_stats = stats
+    else:
+        parse_stats = ParseStats()
+    try:
+        return parse_with_stats(
+            sql_text, start, strict, two_stage, parse_stats, **kwargs
+        )
+    finally:
+        if parse_stats is not stats:
+            stats(parse_stats)
+
+
+def parse_with_stats(sql_text, start, strict, two_stage, stats, **kwargs):
+    # results can only be reused when they don't depend on a custom error listener
+    cache = parse_cache if not kwargs else None
+    if cache is not None:
+        key = (sql_text, start, strict)
+        cached = cache.get(key, MISSING)
+        if cached is not MISSING:
+            if stats is not None:
+                stats.cached = True
+                stats.nodes = count_nodes(cached)
+            return cached
+
+    antlr_tree, stage = parse_antlr(
+        sql_text, start, strict=strict, two_stage=two_stage, stats=stats, **kwargs
     )
-    simple_tree = process_tree(
-        antlr_tree, base_visitor_cls=AstVisitor, transformer_cls=Transformer
+    if two_stage:
+        stage_counts[stage] += 1
+    if cache is None:
+        return shape(antlr_tree, stats)
+
+    # Terminal.DEBUG_INSTANCES would keep evicted results alive
+    with untracked_terminals():
+        simple_tree = shape(antlr_tree, stats)
+    cache.put(key, simple_tree, len(sql_text))
+    return simple_tree
+
+
+def shape(antlr_tree, stats=None):
+    """Convert an ANTLR parse tree to the AST returned by parse"""
+    # the steps of antlr_ast.process_tree, without recursion
+    registry = BaseNodeRegistry()
+    start = perf_counter()
+    tree = AstVisitor(registry).visit(antlr_tree)
+    visited = perf_counter()
+    tree = Transformer(registry).visit(tree)
+    tree = simplify_tree(tree, unpack_lists=False)
+    if stats is not None:
+        stats.times["visit"] = visited - start
+        stats.times["transform"] = perf_counter() - visited
+        stats.nodes = count_nodes(tree)
+    return tree
+
+
+# Terminals
+# antlr_ast keeps every Terminal it creates (in Terminal.DEBUG_INSTANCES),
+# and through them the ANTLR parse trees, for the life of the process.
+# Loops that parse many inputs parse within untracked_terminals(), so the
+# Terminals of their trees aren't added to it (in the current thread only).
+
+terminal_tracking = threading.local()
+
+
+@contextmanager
+def untracked_terminals():
+    """Create Terminals without adding them to Terminal.DEBUG_INSTANCES"""
+    tracked = getattr(terminal_tracking, "tracked", True)
+    terminal_tracking.tracked = False
+    try:
+        yield
+    finally:
+        terminal_tracking.tracked = tracked
+
+
+def new_terminal(text, ctx):
+    """Terminal.from_text, unless in untracked_terminals()"""
+    if getattr(terminal_tracking, "tracked", True):
+        return Terminal.from_text(text, ctx)
+    # AST.__new__ skips Terminal.__new__, which adds the debug instance
+    terminal = AST.__new__(Terminal)
+    terminal.__init__([text], {"value": 0}, {}, ctx)
+    return terminal
+
+
+# Prediction stages
+
+SLL = "sll"
+LL = "ll"
+RECOVERY = "recovery"
+
+# number of two stage parses that finished in each stage
+stage_counts = Counter()
+
+
+def parse_antlr(
+    sql_text,
+    start="sql_script",
+    strict=False,
+    error_listener=None,
+    two_stage=False,
+    stats=None,
+    literal_lists=False,
+):
+    """Parse sql_text to an ANTLR parse tree
+
+    With two_stage, prediction first uses the faster SLL mode, bailing out on
+    the first syntax error. Only if that fails, the input is parsed again
+    using full LL prediction (which reports errors as usual).
+    SLL can reject input that needs full context to predict,
+    but when it succeeds for the whole input, the tree is the one LL would produce.
+
+    Returns the tree and the stage that produced it:
+    SLL, LL or RECOVERY (LL with syntax errors, only when not strict).
+    With stats (a ParseStats), the input is lexed before parsing
+    to time both stages.
+    With literal_lists, long lists of literals are parsed to LiteralList nodes
+    (see collapse_literal_lists).
+    """
+    token_stream = lex(sql_text)
+    if stats is not None:
+        start_time = perf_counter()
+        token_stream.fill()
+        stats.times["lex"] = perf_counter() - start_time
+    return parse_tokens(
+        token_stream,
+        start,
+        strict=strict,
+        error_listener=error_listener,
+        two_stage=two_stage,
+        stats=stats,
+        literal_lists=literal_lists,
     )
 
-    return simple_tree
+
+def lex(sql_text):
+    """Create a token stream for sql_text (tokens are fetched on demand)"""
+    input_stream = CaseInsensitiveInputStream(sql_text)
+    lexer = grammar.Lexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(LexerErrorListener())
+
+    return CommonTokenStream(lexer)
+
+
+def parse_tokens(
+    token_stream,
+    start="sql_script",
+    strict=False,
+    error_listener=None,
+    two_stage=False,
+    stats=None,
+    literal_lists=False,
+):
+    """Parse a token stream to an ANTLR parse tree, see parse_antlr"""
+    if literal_lists:
+        collapse_literal_lists(token_stream)
+    if stats is None:
+        return predict_deep(token_stream, start, strict, error_listener, two_stage)
+
+    start_time = perf_counter()
+    try:
+        tree, stats.stage = predict_deep(
+            token_stream, start, strict, error_listener, two_stage, stats
+        )
+    finally:
+        stats.times["parse"] = perf_counter() - start_time
+        stats.tokens = len(token_stream.tokens)
+    return tree, stats.stage
+
+
+# Literal lists
+# Data loading scripts can have IN lists and INSERT VALUES rows with thousands
+# of literals, which cost a chain of parse tree contexts and an AST node each.
+# Before parsing, such lists are replaced in the token stream by a list of a
+# single literal, with the source text of all values on its opening parenthesis.
+# The list is shaped to a LiteralList node, which is expanded on access.
+# This changes the shape of the AST, so it's only done with literal_lists.
+
+# shorter lists are parsed as usual
+LITERAL_LIST_MIN = 100
+
+
+@lru_cache(maxsize=None)
+def list_token_types():
+    """Token types of the literals and of their signs in literal lists"""
+    # a function, as importing this module shouldn't load the grammar
+    lexer = grammar.Lexer
+    literals = {
+        lexer.CHAR_STRING,
+        lexer.NATIONAL_CHAR_STRING_LIT,
+        lexer.BIT_STRING_LIT,
+        lexer.HEX_STRING_LIT,
+        lexer.UNSIGNED_INTEGER,
+        lexer.APPROXIMATE_NUM_LIT,
+        lexer.NULL,
+    }
+    return literals, {lexer.MINUS_SIGN, lexer.PLUS_SIGN}
+
+
+class ListStartToken(CommonToken):
+    """Opening parenthesis of a collapsed literal list"""
+
+    def __init__(self, token, values, positions=None):
+        super().__init__(
+            token.source, token.type, token.channel, token.start, token.stop
+        )
+        self.line = token.line
+        self.column = token.column
+        self.text = token.text
+        self.values = values
+        # start, stop, line and column of the signs, literals and commas
+        self.positions = positions
+
+
+def collapse_literal_lists(token_stream):
+    """Replace lists of LITERAL_LIST_MIN or more literals after IN or VALUES
+
+    Consecutive VALUES rows are collapsed together, as the rows are concatenated
+    in InsertStmt.values.
+    """
+    token_stream.fill()
+    tokens = token_stream.tokens
+    result = []
+    collapsed = False
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        result.append(token)
+        i += 1
+        if token.type not in (grammar.Lexer.IN, grammar.Lexer.VALUES):
+            continue
+        match = match_literal_list(tokens, i, token.type == grammar.Lexer.VALUES)
+        if match is None or len(match[3]) < LITERAL_LIST_MIN:
+            continue
+        start, first, stop, values = match
+        result.extend(tokens[i:start])
+        positions = get_positions(tokens[start + 1 : stop])
+        result += (
+            ListStartToken(tokens[start], values, positions),
+            tokens[first],
+            tokens[stop],
+        )
+        i = stop + 1
+        collapsed = True
+
+    if collapsed:
+        for index, token in enumerate(result):
+            token.tokenIndex = index
+        tokens[:] = result
+
+
+def get_positions(tokens):
+    """Flat array of the positions of the tokens of a list between its parentheses
+
+    Parentheses (between VALUES rows) and tokens on other channels are skipped.
+    """
+    positions = array("q")
+    for token in tokens:
+        if token.channel == Token.DEFAULT_CHANNEL and token.type not in (
+            grammar.Lexer.LEFT_PAREN,
+            grammar.Lexer.RIGHT_PAREN,
+        ):
+            positions.extend((token.start, token.stop, token.line, token.column))
+    return positions
+
+
+def parse_literal_list(values, ctx):
+    """Parse the values of a collapsed list, at their position in the source
+
+    ctx is the context of the collapsed list, the tokens of the parsed values are
+    moved to the positions stored on its opening parenthesis. Trees loaded from a
+    dump (see marshalling) don't have these, so their positions are relative
+    to the values.
+    """
+    token_stream = lex("(" + ", ".join(values) + ")")
+    token_stream.fill()
+    positions = getattr(ctx.start, "positions", None)
+    if positions is not None:
+        tokens = [
+            token
+            for token in token_stream.tokens
+            if token.channel == Token.DEFAULT_CHANNEL and token.type != Token.EOF
+        ]
+        # the values are one token and an optional sign, like in the source
+        for token in tokens:
+            # the text of a token is read from the input at its position
+            token.text = token.text
+        move_token(tokens[0], ctx.start)
+        for token, i in zip(tokens[1:-1], range(0, len(positions), 4)):
+            token.start, token.stop, token.line, token.column = positions[i : i + 4]
+        move_token(tokens[-1], ctx.stop)
+    antlr_tree, _ = parse_tokens(token_stream, "expression_list")
+    return shape(antlr_tree)
+
+
+def move_token(token, source):
+    token.start, token.stop = source.start, source.stop
+    token.line, token.column = source.line, source.column
+
+
+def match_literal_list(tokens, i, rows=False):
+    """Match a parenthesized list of literals at tokens[i:]
+
+    With rows, also matches the following lists, separated by commas.
+    Returns the indices of the opening parenthesis, the first literal and the
+    closing parenthesis, and the source text of the values (with their sign),
+    or None if the tokens don't start with a list of literals.
+    """
+    literals, signs = list_token_types()
+    start = first = None
+    values = []
+    sign = ""
+    # the next token: opening parenthesis, value, comma or closing parenthesis,
+    # or comma between rows
+    expected = "("
+    end = None
+    for j in range(i, len(tokens)):
+        token = tokens[j]
+        if token.channel != Token.DEFAULT_CHANNEL:
+            continue
+        ttype = token.type
+        if expected == "(":
+            if ttype != grammar.Lexer.LEFT_PAREN:
+                return None
+            if start is None:
+                start = j
+            expected = "value"
+        elif expected == "value":
+            if ttype in signs and not sign:
+                sign = token.text
+            elif ttype in literals:
+                if first is None:
+                    first = j
+                values.append(sign + token.text)
+                sign = ""
+                expected = ","
+            else:
+                return None
+        elif expected == ",":
+            if ttype == grammar.Lexer.COMMA:
+                expected = "value"
+            elif ttype == grammar.Lexer.RIGHT_PAREN:
+                end = j
+                if not rows:
+                    break
+                expected = "row"
+            else:
+                return None
+        elif ttype == grammar.Lexer.COMMA:
+            expected = "("
+        else:
+            break
+    if end is None or expected == "(":
+        return None
+    return start, first, end, values
+
+
+# The generated parser recurses for nested parentheses, and once per operand
+# of UNION and other set operators (the right operand of SubqueryCompound
+# is a full subquery, as it can be followed by an ORDER BY clause).
+# Longer inputs are parsed by a worker thread with a stack that fits them,
+# which is started once and parses them one at a time (the shaping of their
+# trees doesn't recurse, see trampoline). The recursion limit is process wide
+# (it can't be raised for that thread only), so it's raised for all threads
+# while the worker parses, and restored after.
+
+DEEP_TOKENS = 1000
+DEEP_STACK_SIZE = 512 << 20
+# upper bound of the number of nested calls per token in the parser
+FRAMES_PER_TOKEN = 16
+
+
+def predict_deep(token_stream, *args):
+    """predict, in a thread with a larger stack and recursion limit for long inputs"""
+    token_stream.fill()
+    tokens = len(token_stream.tokens)
+    if tokens <= DEEP_TOKENS:
+        return predict(token_stream, *args)
+    return deep_worker.call(
+        lambda: predict(token_stream, *args), FRAMES_PER_TOKEN * tokens
+    )
+
+
+class DeepWorker:
+    """A thread with a large stack, that runs calls which need it one at a time"""
+
+    def __init__(self, stack_size):
+        self.stack_size = stack_size
+        self.lock = threading.Lock()
+        self.thread = None
+        self.calls = None
+
+    def call(self, func, frames):
+        """Call func in the worker thread, with room for frames nested calls"""
+        if threading.current_thread() is self.thread:
+            return call_with_recursion_limit(func, frames)
+        future = Future()
+        with self.lock:
+            # threads don't survive a fork
+            if self.thread is None or not self.thread.is_alive():
+                self.start()
+            self.calls.put((func, frames, future))
+        return future.result()
+
+    def start(self):
+        self.calls = queue.Queue()
+        # the stack size applies to the threads started after setting it
+        stack_size = threading.stack_size(self.stack_size)
+        try:
+            self.thread = threading.Thread(
+                target=self.run, args=(self.calls,), name="antlr_plsql-deep"
+            )
+            self.thread.daemon = True
+            self.thread.start()
+        finally:
+            threading.stack_size(stack_size)
+
+    def run(self, calls):
+        while True:
+            func, frames, future = calls.get()
+            try:
+                future.set_result(call_with_recursion_limit(func, frames))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+recursion_limit_lock = threading.Lock()
+
+
+def call_with_recursion_limit(func, frames):
+    """Call func with a recursion limit of at least frames, and restore it after"""
+    with recursion_limit_lock:
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, frames))
+    try:
+        return func()
+    finally:
+        with recursion_limit_lock:
+            sys.setrecursionlimit(limit)
+
+
+deep_worker = DeepWorker(DEEP_STACK_SIZE)
+
+
+def predict(token_stream, start, strict, error_listener, two_stage, stats=None):
+    parser = grammar.Parser(token_stream)
+    rule = getattr(parser, start)
+
+    if two_stage:
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        parser.removeErrorListeners()
+        try:
+            tree = rule()
+            # start rules without EOF can match a prefix, which SLL may choose
+            # differently, so only accept SLL results that consume all input
+            if token_stream.LA(1) == Token.EOF:
+                return tree, SLL
+        except ParseCancellationException:
+            pass
+        parser.reset()
+        parser._interp.predictionMode = PredictionMode.LL
+        parser._errHandler = DefaultErrorStrategy()
+        parser.addErrorListener(ConsoleErrorListener.INSTANCE)
+
+    if strict:
+        error_listener = StrictErrorListener()
+
+    if error_listener is not None and error_listener is not True:
+        parser.removeErrorListeners()
+        if error_listener:
+            parser.addErrorListener(error_listener)
+
+    if stats is not None:
+        # before listeners that raise, so errors in strict mode are recorded
+        listeners = [StatsListener(stats)] + parser._listeners
+        parser.removeErrorListeners()
+        for listener in listeners:
+            parser.addErrorListener(listener)
+
+    tree = rule()
+    return tree, RECOVERY if parser.getNumberOfSyntaxErrors() else LL
+
+
+# Parse cache (opt-in, per process)
+
+MISSING = object()
+parse_cache = None
+
+
+def enable_cache(maxsize=256, maxbytes=None):
+    """Cache parse results, keyed on (sql_text, start, strict)
+
+    maxsize limits the number of cached results,
+    maxbytes limits the combined length of the cached source texts.
+    Replaces the current cache, if any.
+    """
+    global parse_cache
+    parse_cache = ParseCache(maxsize=maxsize, maxbytes=maxbytes)
+    return parse_cache
+
+
+def disable_cache():
+    global parse_cache
+    parse_cache = None
 
 
 # AliasNodes
@@ -490,16 +1017,309 @@ class DeleteStmt(AliasNode):
     _rules = ["Delete_statement"]
 
 
+# Flattened chains
+# The grammar nests chains of binary expressions (left to right) and unions
+# (right to left). flatten_chains replaces chains of 3 or more operands with
+# the same operator by a single node with a list of operands.
+
+
+class NaryExpr(AliasNode):
+    _fields_spec = ["op", "args"]
+
+
+class NaryUnion(AliasNode):
+    _fields_spec = ["op", "args", "order_by_clause", "with_clause"]
+
+
+# operators of BinaryExpr chains that are flattened (the associative ones)
+FLATTEN_OPS = ("and", "or", "||", "+", "*")
+
+
+def flatten_chains(tree):
+    """Replace chains of BinaryExpr and Union nodes by NaryExpr and NaryUnion nodes
+
+    Modifies tree (and returns the new root).
+    """
+    tree = flatten_node(tree)
+    seen = set()
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            value[:] = [flatten_node(el) for el in value]
+            stack.extend(value)
+        elif isinstance(value, AstNode) and id(value) not in seen:
+            seen.add(id(value))
+            for field in alias_fields.get(type(value)) or value._fields:
+                child = getattr(value, field, None)
+                if isinstance(child, (AstNode, list)):
+                    flat = flatten_node(child)
+                    if flat is not child:
+                        setattr(value, field, flat)
+                    stack.append(flat)
+    return tree
+
+
+def flatten_node(node):
+    if isinstance(node, BinaryExpr):
+        op = get_op_key(node.op)
+        if op not in FLATTEN_OPS:
+            return node
+        args = []
+        stack = [node]
+        while stack:
+            el = stack.pop()
+            if isinstance(el, BinaryExpr) and get_op_key(el.op) == op:
+                stack += (el.right, el.left)
+            else:
+                args.append(el)
+        if len(args) == 2:
+            return node
+        return NaryExpr(node, {"op": node.op, "args": args})
+
+    if isinstance(node, Union):
+        op = get_op_key(node.op)
+        args = [node.left]
+        last = node
+        # only the last union of a chain has the ORDER BY clause of the chain
+        while (
+            isinstance(last.right, Union)
+            and not last.order_by_clause
+            and not last.right.with_clause
+            and get_op_key(last.right.op) == op
+        ):
+            last = last.right
+            args.append(last.left)
+        if last is node:
+            return node
+        args.append(last.right)
+        fields = {
+            "op": node.op,
+            "args": args,
+            "order_by_clause": last.order_by_clause,
+            "with_clause": node.with_clause,
+        }
+        return NaryUnion(node, fields)
+
+    return node
+
+
+def get_op_key(op):
+    # the operator of e.g. UNION ALL is a node with a terminal per keyword
+    if isinstance(op, Terminal):
+        return op.value
+    return str(dump_node(op))
+
+
+class LiteralList(AliasNode):
+    """List of literals, collapsed while parsing (see collapse_literal_lists)
+
+    values has the source text of the literals, items the nodes the list is
+    parsed to without collapsing (see parse_literal_list for their positions).
+    """
+
+    _fields_spec = ["values"]
+
+    @property
+    def items(self):
+        items = self.__dict__.get("_items")
+        if items is None:
+            items = self._items = parse_literal_list(self.values, self._ctx)
+        return items
+
+    def __len__(self):
+        return len(self.values)
+
+
 # class FunctionArgument
 
 
 # PARSE TREE VISITOR ----------------------------------------------------------
 
 
+# Deep trees
+# Long chains of AND, OR, || or UNION are as deep as they are long.
+# To not recurse that deep, the visitor, transformer, simplify_tree and
+# dump_node are generators that yield the generator of each recursive call
+# and get back its result, and trampoline runs them using a list as stack.
+
+
+def trampoline(gen):
+    """Run a generator that yields generators for its recursive calls"""
+    stack = [gen]
+    value = None
+    while True:
+        try:
+            call = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            if not stack:
+                return stop.value
+            value = stop.value
+        else:
+            stack.append(call)
+            value = None
+
+
+def simplify_tree(tree, unpack_lists=True):
+    """antlr_ast.simplify_tree, without recursion"""
+    return trampoline(iter_simplify_tree(tree, unpack_lists))
+
+
+def iter_simplify_tree(tree, unpack_lists=True, in_list=False):
+    while True:
+        if isinstance(tree, AstNode) and not isinstance(tree, Terminal):
+            fields = alias_fields.get(type(tree)) or tree._fields
+            used_fields = [field for field in fields if getattr(tree, field, False)]
+            if len(used_fields) == 1:
+                result = getattr(tree, used_fields[0])
+            else:
+                result = None
+            if (
+                len(used_fields) != 1
+                or isinstance(tree, AliasNode)
+                or (in_list and isinstance(result, list))
+            ):
+                for field in fields:
+                    old_value = getattr(tree, field, None)
+                    if old_value:
+                        value = yield iter_simplify_tree(old_value, unpack_lists)
+                        setattr(tree, field, value)
+                return tree
+        elif isinstance(tree, list) and len(tree) == 1 and unpack_lists:
+            result = tree[0]
+        elif isinstance(tree, list):
+            result = []
+            for el in tree:
+                result.append((yield iter_simplify_tree(el, unpack_lists, True)))
+            return result
+        else:
+            return tree
+        # simplify the unpacked value
+        tree, in_list = result, False
+
+
+def dump_node(node, node_class=AST):
+    """antlr_ast.dump_node, without recursion"""
+    return trampoline(iter_dump_node(node, node_class))
+
+
+def iter_dump_node(node, node_class=AST):
+    if isinstance(node, node_class):
+        fields = OrderedDict()
+        for name in alias_fields.get(type(node)) or node._fields:
+            attr = getattr(node, name, None)
+            if attr is not None:
+                fields[name] = yield iter_dump_node(attr, node_class)
+        return {"type": node.__class__.__name__, "data": fields}
+    elif isinstance(node, list):
+        result = []
+        for el in node:
+            result.append((yield iter_dump_node(el, node_class)))
+        return result
+    else:
+        return node
+
+
+# Dispatch tables
+# BaseNodeTransformer and ANTLR's accept look up visit methods by name for
+# every node (and check the signature of alias node methods on every call).
+# Transformer and AstVisitor look them up in tables instead, which are
+# filled once per class (and per context class).
+
+# names of the visit_ methods of Transformer classes, by class
+transformer_visit_names = {}
+
+# visitor methods of AstVisitor classes, by class and context class
+visitor_methods = {}
+
+
 class Transformer(BaseNodeTransformer):
+    def __init__(self, registry):
+        super().__init__(registry)
+        names = transformer_visit_names.get(type(self))
+        if names is None:
+            names = transformer_visit_names[type(self)] = [
+                name for name in dir(type(self)) if name.startswith("visit_")
+            ]
+        # node class name -> bound visit_ method
+        self.dispatch = {name[6:]: getattr(self, name) for name in names}
+
+    def visit(self, node):
+        return trampoline(self.iter_visit(node))
+
+    def generic_visit(self, node):
+        return trampoline(self.iter_generic_visit(node))
+
+    def iter_visit(self, node):
+        # BaseNodeTransformer.visit, using the dispatch table (see trampoline)
+        transformer = self.dispatch.get(type(node).__name__)
+
+        if transformer is None:
+            return (yield self.iter_generic_visit(node))
+
+        alias = transformer(node)
+        if isinstance(alias, AliasNode) or alias == node:
+            if isinstance(alias, AstNode):
+                yield self.iter_generic_visit(alias)
+        elif isinstance(alias, list):
+            result = []
+            for el in alias:
+                if isinstance(el, AstNode):
+                    el = yield self.iter_visit(el)
+                result.append(el)
+            alias = result
+        elif isinstance(alias, AstNode):
+            alias = yield self.iter_visit(alias)
+        return alias
+
+    def iter_generic_visit(self, node):
+        # NodeTransformer.generic_visit (see trampoline)
+        # the _fields of alias nodes are parsed from _fields_spec on every access
+        fields = alias_fields.get(type(node)) or node._fields
+        for field in fields:
+            try:
+                old_value = getattr(node, field)
+            except AttributeError:
+                continue
+            if isinstance(old_value, list):
+                new_values = []
+                for value in old_value:
+                    if isinstance(value, AST):
+                        value = yield self.iter_visit(value)
+                        if value is None:
+                            continue
+                        elif not isinstance(value, AST):
+                            new_values.extend(value)
+                            continue
+                    new_values.append(value)
+                old_value[:] = new_values
+            elif isinstance(old_value, AST):
+                new_node = yield self.iter_visit(old_value)
+                if new_node is None:
+                    delattr(node, field)
+                else:
+                    setattr(node, field, new_node)
+        return node
+
+    @classmethod
+    def bind_alias_nodes(cls, alias_classes):
+        """Add visit_ methods for the _rules of alias_classes"""
+        for alias_cls in alias_classes:
+            for rule in getattr(alias_cls, "_rules", None) or ():
+                if isinstance(rule, str):
+                    method_name = "from_spec"
+                else:
+                    rule, method_name = rule[:2]
+                transformer_method = get_alias_transformer(
+                    getattr(alias_cls, method_name)
+                )
+                setattr(cls, get_transformer_method_name(rule), transformer_method)
+        transformer_visit_names.clear()
+
     @staticmethod
     def visit_Relational_operator(node):
-        return Terminal.from_text(node.get_text(), node._ctx)  # node.children[0]?
+        return new_terminal(node.get_text(), node._ctx)  # node.children[0]?
 
     @staticmethod
     def visit_SubqueryParen(node):
@@ -563,6 +1383,8 @@ class Transformer(BaseNodeTransformer):
 
     @staticmethod
     def visit_Expression_list(node):
+        if isinstance(node._ctx.start, ListStartToken):
+            return LiteralList(node, {"values": node._ctx.start.values})
         return node.expression
 
     @staticmethod
@@ -580,26 +1402,280 @@ class Transformer(BaseNodeTransformer):
 
 # Add visit methods to Transformer for all nodes (in _rules) that convert to AliasNode instances
 
+
+def get_alias_transformer(transform_function):
+    """Transformer method for an alias node method, like AliasNode.get_transformer"""
+    if "helper" in inspect.signature(transform_function).parameters:
+
+        def transformer_method(self, node):
+            return transform_function(node, helper=self.helper)
+
+    else:
+
+        def transformer_method(self, node):
+            return transform_function(node)
+
+    return transformer_method
+
+
 alias_nodes = get_alias_nodes(globals().values())
+alias_fields = {cls: cls._fields for cls in alias_nodes}
 Transformer.bind_alias_nodes(alias_nodes)
 
 
 # Create Speaker
+# Feedback describes every node and field of many trees, so CompiledSpeaker
+# formats node names with prepared templates, and keeps the messages that don't
+# depend on the node (e.g. "join expression", or the name of a field).
 
-speaker_cfg = yaml.safe_load(
-    pkg_resources.resource_stream("antlr_plsql", "speaker.yml")
-)
-speaker = Speaker(**speaker_cfg)
+# arguments of describe formats that depend on the node only through node_name
+NODE_NAME_ARGUMENTS = frozenset(["node_name", "field_name"])
+
+FORMATTER = Formatter()
+
+
+@lru_cache(maxsize=1024)
+def get_template_names(template):
+    """Names of the arguments of a format string"""
+    return frozenset(
+        field.partition(".")[0].partition("[")[0]
+        for _, field, _, _ in FORMATTER.parse(template)
+        if field is not None
+    )
+
+
+def compile_template(template):
+    """Text of a template without node fields, else its format method
+
+    A template with node fields like "`{node.op}`" is formatted for every node.
+    """
+    if "node" in get_template_names(template):
+        return template.format
+    return template.format()
+
+
+class CompiledSpeaker(Speaker):
+    """Speaker that compiles the templates of its node and field names once"""
+
+    def __init__(self, **cfg):
+        super().__init__(**cfg)
+        self.reset()
+
+    def reset(self):
+        """Forget compiled templates, after changing node_names or field_names"""
+        self._node_infos = {}
+        self._messages = {}
+        self._field_messages = {}
+
+    def describe(self, node, fmt="{node_name}", field=None, **kwargs):
+        cls_name = node.__class__.__name__
+        key = (cls_name, field, fmt)
+        if not kwargs:
+            message = self._messages.get(key)
+            if message is not None:
+                return message
+
+        node_name, field_names = self._node_infos.get(cls_name) or self.compile_node(
+            cls_name
+        )
+        if not isinstance(node_name, str):
+            node_name = node_name(node=node)
+        if field:
+            field_name = field_names.get(field)
+            if field_name is None:
+                field_name = self.field_names.get(field) or field.replace("_", " ")
+        else:
+            field_name = field_names.get(field, "")
+
+        if fmt == "{node_name}":
+            message, names = node_name, NODE_NAME_ARGUMENTS
+        else:
+            names = get_template_names(fmt)
+            message = fmt.format(
+                node=node, field_name=field_name, node_name=node_name, **kwargs
+            )
+        if not kwargs and names <= NODE_NAME_ARGUMENTS:
+            if isinstance(self._node_infos[cls_name][0], str):
+                self._messages[key] = message
+        return message
+
+    def describe_many(
+        self, tree, fmt="{node_name}", field_fmt=None, fields=None, **kwargs
+    ):
+        """Describe the nodes of tree (and their fields) in a single traversal
+
+        Returns (node, field, message) for each node in preorder, followed by
+        the messages for its fields (in fields, by default all of them) if there's
+        a field_fmt. field is None in the message of the node itself.
+        """
+        messages = []
+        append = messages.append
+        describe = self.describe
+        node_messages = self._messages
+        # field messages of the classes with a fixed node name are kept
+        fixed = field_fmt is not None and not kwargs
+        fixed = fixed and get_template_names(field_fmt) <= NODE_NAME_ARGUMENTS
+        fields_key = fields if fields is None else tuple(fields)
+        seen = set()
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+                continue
+            if not isinstance(node, AST) or id(node) in seen:
+                continue
+            seen.add(id(node))
+            node_cls = type(node)
+            cls_name = node_cls.__name__
+            node_fields = tuple(alias_fields.get(node_cls) or node._fields)
+            message = None if kwargs else node_messages.get((cls_name, None, fmt))
+            if message is None:
+                message = describe(node, fmt, **kwargs)
+            append((node, None, message))
+            if field_fmt is not None:
+                # by name and fields, as each parse creates its own node classes
+                key = (cls_name, node_fields, field_fmt, fields_key)
+                field_messages = self._field_messages.get(key) if fixed else None
+                if field_messages is None:
+                    field_messages = [
+                        (field, describe(node, field_fmt, field, **kwargs))
+                        for field in (node_fields if fields is None else fields)
+                    ]
+                    node_name = self._node_infos[cls_name][0]
+                    if fixed and isinstance(node_name, str):
+                        self._field_messages[key] = field_messages
+                messages += [
+                    (node, field, message) for field, message in field_messages
+                ]
+            stack.extend(
+                [getattr(node, field, None) for field in reversed(node_fields)]
+            )
+        return messages
+
+    def compile_node(self, cls_name):
+        node_cfg = self.node_names.get(cls_name, cls_name)
+        node_name, field_names = self.get_info(node_cfg)
+        info = self._node_infos[cls_name] = (compile_template(node_name), field_names)
+        return info
+
+
+class LazySpeaker(CompiledSpeaker):
+    """Speaker that loads speaker.yml when it's first used"""
+
+    def __init__(self):
+        self.reset()
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set yet, so before loading
+        if name not in ("node_names", "field_names"):
+            raise AttributeError(name)
+        import yaml
+
+        speaker_cfg = yaml.safe_load(pkgutil.get_data("antlr_plsql", "speaker.yml"))
+        Speaker.__init__(self, **speaker_cfg)
+        return getattr(self, name)
+
+
+speaker = LazySpeaker()
 
 
 class AstVisitor(BaseAstVisitor):
+    def __init__(self, registry):
+        super().__init__(registry)
+        self.methods = visitor_methods.setdefault(type(self), {})
+
+    def visit(self, tree):
+        # same as tree.accept(self), using the methods table
+        method = self.methods.get(type(tree)) or self.add_method(type(tree))
+        if method is AstVisitor.visitChildren:
+            return trampoline(self.iter_children(tree))
+        return method(self, tree)
+
+    def visitChildren(self, node, predicate=None, simplify=False):
+        return trampoline(self.iter_children(node))
+
+    def iter_children(self, node):
+        # BaseAstVisitor.visitChildren (see trampoline)
+        children = []
+        for child in node.children or []:
+            method = self.methods.get(type(child)) or self.add_method(type(child))
+            if method is AstVisitor.visitChildren:
+                child = yield self.iter_children(child)
+            else:
+                child = method(self, child)
+            children.append(child)
+        return AstNode.create(node, children, self.registry)
+
+    def add_method(self, ctx_cls):
+        method = self.methods[ctx_cls] = get_visitor_method(type(self), ctx_cls)
+        return method
+
     def visitTerminal(self, ctx):
         """Converts case insensitive keywords and identifiers to lowercase"""
-        text = str(super().visitTerminal(ctx))
-        quotes = ["'", '"']
-        if not (text[0] in quotes and text[-1] in quotes):
-            text = text.lower()
-        return Terminal.from_text(text, ctx)
+        return new_terminal(normalize_terminal(ctx.getText()), ctx)
+
+    # Identifiers
+    # regular_id matches an identifier or one of the hundreds of keywords that
+    # can be used as one, and id_expression a regular_id or quoted identifier.
+    # Their nodes only have the terminal, which simplify_tree unpacks them to,
+    # so visit to the terminal right away (unless parsing recovered from errors).
+    # This only makes shaping them cheaper: predicting regular_id while parsing
+    # costs as much as before, as the grammar is unchanged (making the keywords
+    # a token class in plsql.g4 is still to do).
+
+    def visitRegular_id(self, ctx):
+        children = ctx.children
+        if children and len(children) == 1 and type(children[0]) is TerminalNodeImpl:
+            return self.visitTerminal(children[0])
+        return self.visitChildren(ctx)
+
+    def visitId_expression(self, ctx):
+        children = ctx.children
+        if children and len(children) == 1:
+            child = children[0]
+            if type(child) is TerminalNodeImpl:
+                return self.visitTerminal(child)
+            if isinstance(child, grammar.Parser.Regular_idContext):
+                return self.visitRegular_id(child)
+        return self.visitChildren(ctx)
+
+
+def get_visitor_method(visitor_cls, ctx_cls):
+    """Method of visitor_cls that the accept method of ctx_cls calls"""
+    if issubclass(ctx_cls, ErrorNode):
+        return visitor_cls.visitErrorNode
+    if issubclass(ctx_cls, TerminalNode):
+        return visitor_cls.visitTerminal
+    if not issubclass(ctx_cls, ParserRuleContext):
+        return lambda visitor, tree: tree.accept(visitor)
+    # generated contexts call e.g. visitSelect_statement or visitBinaryExpr
+    name = "visit" + ctx_cls.__name__[: -len("Context")]
+    return getattr(visitor_cls, name, visitor_cls.visitChildren)
+
+
+# Terminal texts
+# Keywords and identifiers repeat a lot, so their lowercase text is looked up
+# in a table, and all terminals with the same text share one string.
+
+MAX_TERMINAL_TEXTS = 1 << 16
+terminal_texts = {}
+
+QUOTES = ("'", '"')
+
+
+def normalize_terminal(text):
+    """Lowercase text, unless it's quoted"""
+    normalized = terminal_texts.get(text)
+    if normalized is not None:
+        return normalized
+    if text[0] in QUOTES and text[-1] in QUOTES:
+        # string literals and quoted identifiers are mostly unique
+        return text
+    normalized = text.lower()
+    if len(terminal_texts) < MAX_TERMINAL_TEXTS:
+        normalized = terminal_texts[text] = sys.intern(normalized)
+    return normalized
 
 
 if __name__ == "__main__":
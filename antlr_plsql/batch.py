@@ -0,0 +1,117 @@
+import os
+from functools import partial
+from multiprocessing import get_context
+
+from antlr_plsql import ast, dfa
+from antlr_plsql.marshalling import dump_tree, load_tree
+
+# Parsed by every worker before accepting work,
+# to fill the (per process) lexer and parser DFA caches
+WARMUP_QUERIES = [
+    "SELECT a, b AS c, COUNT(*) FROM x JOIN y ON x.id = y.id WHERE a > 1 AND b IN (1, 2) GROUP BY a, b HAVING COUNT(*) > 1 ORDER BY a DESC",
+    "SELECT DISTINCT a || 'x' FROM (SELECT a FROM b UNION ALL SELECT c FROM d) sub LEFT JOIN e USING (a) WHERE a LIKE '%x' OR a IS NULL",
+    "SELECT CASE WHEN a BETWEEN 1 AND 2 THEN 'x' ELSE 'y' END, MAX(b) OVER (PARTITION BY c ORDER BY d) FROM e",
+    "INSERT INTO a (b, c) VALUES (1, 'x')",
+    "UPDATE a SET b = b + 1 WHERE c <> 2",
+    "DELETE FROM a WHERE b NOT IN (SELECT c FROM d)",
+    "CREATE TABLE a (b INTEGER PRIMARY KEY, c VARCHAR(10) NOT NULL)",
+]
+
+
+class ParsePool:
+    """Pool of worker processes that parse SQL
+
+    Workers import the grammar and parse the warmup queries once,
+    so they parse at steady state speed from the first batch on.
+    Workers can also start from a DFA cache (see dfa.save), at dfa_path.
+    Trees are sent back detached from ANTLR (see marshalling).
+    """
+
+    def __init__(
+        self, workers=None, warmup=WARMUP_QUERIES, mp_context=None, dfa_path=None
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        ctx = mp_context or get_context()
+        self._pool = ctx.Pool(
+            self.workers, initializer=init_worker, initargs=(warmup, dfa_path)
+        )
+
+    def parse_many(
+        self, texts, start="sql_script", strict=False, chunksize=1, two_stage=False
+    ):
+        """Parse texts, returning trees in input order
+
+        Texts that can't be parsed get a ParseError in their place,
+        instead of failing the entire batch.
+        """
+        return [
+            load_result(result)
+            for result in self.parse_detached_many(
+                texts, start, strict, chunksize, two_stage
+            )
+        ]
+
+    def parse_detached_many(
+        self, texts, start="sql_script", strict=False, chunksize=1, two_stage=False
+    ):
+        """Like parse_many, but returns the results as (ok, state or message)"""
+        parse_one = partial(
+            parse_detached, start=start, strict=strict, two_stage=two_stage
+        )
+        return self._pool.imap(parse_one, texts, chunksize)
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.terminate()
+
+
+def parse_many(texts, start="sql_script", strict=False, workers=None, chunksize=1):
+    """Parse texts using a temporary ParsePool (or in process, when workers is 0)
+
+    Use a ParsePool directly to reuse warm workers across batches.
+    """
+    if workers == 0:
+        return [parse_or_error(text, start, strict) for text in texts]
+    with ParsePool(workers) as pool:
+        return pool.parse_many(texts, start, strict=strict, chunksize=chunksize)
+
+
+def init_worker(warmup=(), dfa_path=None):
+    if dfa_path is not None:
+        dfa.load(dfa_path)
+    with ast.untracked_terminals():
+        for query in warmup:
+            ast.parse(query)
+
+
+def parse_or_error(text, start="sql_script", strict=False, two_stage=False):
+    # workers parse for the life of the pool
+    try:
+        with ast.untracked_terminals():
+            return ast.parse(text, start, strict=strict, two_stage=two_stage)
+    except ast.ParseError as e:
+        return e
+
+
+def parse_detached(text, start="sql_script", strict=False, two_stage=False):
+    result = parse_or_error(text, start, strict, two_stage)
+    if isinstance(result, ast.ParseError):
+        return False, result.msg
+    return True, dump_tree(result)
+
+
+def load_result(result):
+    ok, value = result
+    if not ok:
+        return ast.ParseError(value, None)
+    return load_tree(value)
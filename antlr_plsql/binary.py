@@ -0,0 +1,760 @@
+import struct
+import sys
+from array import array
+from ast import AST
+from operator import is_
+
+from antlr4.tree.Tree import TerminalNodeImpl
+from antlr_ast.ast import AliasNode, Terminal
+
+from antlr_plsql.compact import NODE_SLOTS, CompactNode, CompactTerminal
+from antlr_plsql.marshalling import (
+    ALIAS,
+    NODE,
+    NODE_ATTRIBUTES,
+    TERMINAL,
+    DetachedContext,
+    DetachedTerminalNode,
+    DetachedToken,
+    get_alias_classes,
+    loaded_classes,
+)
+
+# Binary trees ----------------------------------------------------------------
+# dumps_binary serializes the complete state of the nodes of a tree (like
+# dump_tree, so including the ANTLR rule fields of alias nodes) with their
+# positions, loads_binary recreates the nodes. The format is
+#
+#   header  magic, version, integer size, number of integers,
+#           size of the string table
+#   ints    little endian 16 bit integers, or 32 bit if a value doesn't fit
+#   strings all strings (identifiers, keywords, class and field names) joined
+#           and utf-8 encoded, each stored once
+#
+# The integers are a series of tables: the lengths of the strings, the tokens
+# (start, stop, line, column and text), the spans of the nodes (start and stop
+# token), the node classes, the keys of references and the node layouts.
+# Nodes of the same class with the same references to their children
+# (e.g. all column names, or all `a = 1` expressions) share a layout, so the
+# node table only holds the layout and span of every node, their children
+# and the values that differ between nodes (e.g. the value of a Terminal).
+# The fixed size tables are decoded by slicing, and nodes with the same
+# layout share their references, contexts and field names.
+#
+# It's a compact format to send and store complete trees, not a fast one.
+# Compared to pickling the dump_tree state, it's about half the size and
+# dumps and loads no faster, but loading it can't run code. json of
+# dump_node output dumps ~7x and loads ~30x faster, and with zlib it's ~18x
+# smaller, but it only loads dicts (see benchmarks/serialization.py).
+
+MAGIC = b"PLSQ"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBBII")
+
+# array typecodes by integer size
+TYPECODES = {2: "h", 4: "i"}
+
+# value tags
+NONE, FALSE, TRUE, INT, STR, LIST, DICT, REF, TUPLE = range(9)
+
+# layout flags: which node state is stored per node
+POSITION, CHILDREN_BY_FIELD, CHILDREN_BY_LABEL = 1, 2, 4
+
+MISSING = object()
+
+NODE_ATTRIBUTE_NAMES = frozenset(NODE_ATTRIBUTES)
+
+# the references of a plain Terminal
+PLAIN_REFERENCES = {"value": 0}
+
+
+def dumps_binary(tree):
+    """Serialize a tree returned by parse to bytes, which can be passed to loads_binary
+
+    Compact trees (see compact.compact_tree) are serialized like the tree they
+    were created from.
+    """
+    return BinaryWriter().write(tree)
+
+
+def loads_binary(data, registry=None):
+    """Recreate a tree from bytes created by dumps_binary
+
+    The nodes have the same classes, state and positions as those of the
+    dumped tree, and a detached context (see marshalling).
+    """
+    return BinaryReader(data, registry).read()
+
+
+class BinaryWriter:
+    def __init__(self):
+        self.strings = []
+        # start, stop, line, column and text id of each token
+        self.tokens = []
+        # start and stop token id of each span
+        self.spans = []
+        self.classes = []
+        # no references (e.g. the labels of most nodes) have id 0
+        self.keys = [()]
+        self.layouts = []
+        self.nodes = []
+        # the node table
+        self.node_layouts = []
+        self.node_spans = []
+        self.children = []
+        self.values = []
+        self._string_ids = {}
+        self._token_ids = {}
+        self._span_ids = {}
+        # nodes without a context have span id -1
+        self._ctx_spans = {id(None): -1}
+        self._class_ids = {}
+        self._keys_ids = {(): 0}
+        self._references = {((), ()): 0}
+        self.references_table = [[0, 0]]
+        self._layout_ids = {}
+        # None (an error node) as a child
+        self._node_ids = {id(None): -1}
+
+    def write(self, tree):
+        # nodes are numbered when they're first referenced and written in that
+        # order, so deep trees don't need recursion
+        root = []
+        self.write_value(tree, root)
+        self.write_nodes()
+        nodes = self.nodes
+
+        tables = [len(self.tokens) // 5]
+        tables.extend(self.tokens)
+        tables.append(len(self.spans) // 2)
+        tables.extend(self.spans)
+        # names are identifiers, so the fields and keys are stored as one string
+        tables.append(len(self.classes))
+        for kind, name, fields in self.classes:
+            tables.extend(
+                (kind, self.string_id(name), self.string_id(" ".join(fields)))
+            )
+        tables.append(len(self.keys))
+        tables.extend([self.string_id(" ".join(keys)) for keys in self.keys])
+        tables.append(len(self._layout_ids))
+        tables.extend(self.layouts)
+        tables.extend((len(nodes), len(self.children), len(self.values)))
+        tables.extend(self.node_layouts)
+        tables.extend(self.node_spans)
+        tables.extend(self.children)
+        tables.extend(self.values)
+        tables.extend(root)
+
+        # the string table is complete now, its lengths go in front
+        ints = [len(self.strings)]
+        ints.extend([len(string) for string in self.strings])
+        ints.extend(tables)
+        return self.to_bytes(ints)
+
+    def to_bytes(self, ints):
+        if -(2**15) <= min(ints) and max(ints) < 2**15:
+            ints = array(TYPECODES[2], ints)
+        else:
+            ints = array(TYPECODES[4], ints)
+        if sys.byteorder == "big":
+            ints.byteswap()
+        blob = "".join(self.strings).encode("utf-8", "surrogatepass")
+        header = HEADER.pack(MAGIC, VERSION, ints.itemsize, len(ints), len(blob))
+        return b"".join((header, ints.tobytes(), blob))
+
+    def string_id(self, string):
+        if string is None:
+            return -1
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def class_info(self, node, plain=False):
+        """Class id, kind and fields of node (plain for a plain Terminal)"""
+        cls = type(node)
+        # only Terminals can be stored either way
+        key = (cls, plain) if cls is Terminal else cls
+        info = self._class_ids.get(key)
+        if info is None:
+            if plain or isinstance(node, CompactTerminal):
+                kind = TERMINAL
+            elif isinstance(node, AliasNode):
+                kind = ALIAS
+            else:
+                kind = NODE
+            # dynamic node classes differ between parses, compact classes
+            # (see compact) from the class they replace, but have the same name
+            name_key = kind, cls.__name__
+            info = self._class_ids.get(name_key)
+            if info is None:
+                fields = tuple(cls._fields)
+                info = self._class_ids[name_key] = len(self.classes), kind, fields
+                self.classes.append(
+                    (kind, cls.__name__, fields if kind == NODE else ())
+                )
+            self._class_ids[key] = info
+        return info
+
+    def node_id(self, node):
+        node_id = self._node_ids.get(id(node))
+        if node_id is None:
+            node_id = self._node_ids[id(node)] = len(self.nodes)
+            self.nodes.append(node)
+        return node_id
+
+    def write_nodes(self):
+        """Write the numbered nodes, and those they reference, to the node table"""
+        # the attributes used for every node are local variables
+        nodes = self.nodes
+        node_ids = self._node_ids
+        class_ids = self._class_ids
+        ctx_spans = self._ctx_spans
+        layout_ids = self._layout_ids
+        node_spans = self.node_spans
+        node_layouts = self.node_layouts
+        ids = self.children
+        ints = self.values
+        references = self.references
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            i += 1
+            cls = type(node)
+            if cls is Terminal:
+                info = self.terminal_info(node)
+            else:
+                info = class_ids.get(cls)
+                if info is None:
+                    info = self.class_info(node)
+            cls_id, kind, fields = info
+            ctx = node._ctx
+            span_id = ctx_spans.get(id(ctx))
+            if span_id is None:
+                span_id = self.span_id(ctx)
+            node_spans.append(span_id)
+            if kind == TERMINAL:
+                layout_id = layout_ids.get(cls_id)
+                if layout_id is None:
+                    layout_id = layout_ids[cls_id] = len(layout_ids)
+                    self.layouts.append(cls_id)
+                node_layouts.append(layout_id)
+                value = node.value
+                if type(value) is str:
+                    ints.extend((STR, self.string_id(value)))
+                else:
+                    self.write_value(value)
+                continue
+
+            compact = isinstance(node, CompactNode)
+            if compact:
+                attrs = {name: getattr(node, name) for name in NODE_ATTRIBUTES}
+            else:
+                attrs = node.__dict__
+            children = attrs["children"]
+            for child in children:
+                # None (an error node) has id -1
+                child_id = node_ids.get(id(child))
+                if child_id is None:
+                    child_id = node_ids[id(child)] = len(nodes)
+                    nodes.append(child)
+                ids.append(child_id)
+            field_references = attrs["_field_references"]
+            label_references = attrs["_label_references"]
+            children_by_field = attrs["children_by_field"]
+            children_by_label = attrs["children_by_label"]
+            values = []
+            flags = 0
+            position = attrs.get("position")
+            if position is not None:
+                flags |= POSITION
+                values.append(position)
+            if not is_materialized(children_by_field, field_references, children):
+                flags |= CHILDREN_BY_FIELD
+                values.append(children_by_field)
+            # most nodes don't have labels
+            if (label_references or children_by_label) and not is_materialized(
+                children_by_label, label_references, children
+            ):
+                flags |= CHILDREN_BY_LABEL
+                values.append(children_by_label)
+            names = ()
+            if compact or len(attrs) != len(NODE_ATTRIBUTES):
+                names = []
+                attributes = None
+                if not compact and len(attrs) == len(NODE_ATTRIBUTES) + len(fields):
+                    # mostly only the fields (set by the transformer)
+                    attributes = [
+                        (name, attrs[name])
+                        for name in fields
+                        if name in attrs and name not in NODE_ATTRIBUTE_NAMES
+                    ]
+                    if len(attributes) != len(fields):
+                        attributes = None
+                if attributes is None:
+                    attributes = get_attributes(node, fields, attrs)
+                for name, value in attributes:
+                    # the transformer sets all fields, also when they don't change
+                    # skip those that BaseNode.__getattr__ would return anyway
+                    default = children_by_label.get(name) or children_by_field.get(
+                        name, MISSING
+                    )
+                    if value is not default and not is_same(value, default):
+                        names.append(name)
+                        values.append(value)
+                names = tuple(names)
+
+            layout = (
+                cls_id,
+                len(children),
+                references(field_references) if field_references else 0,
+                references(label_references) if label_references else 0,
+                flags,
+                names,
+            )
+            layout_id = layout_ids.get(layout)
+            if layout_id is None:
+                layout_id = layout_ids[layout] = len(layout_ids)
+                self.write_layout(layout)
+            node_layouts.append(layout_id)
+            for value in values:
+                # mostly child nodes in the fields of alias nodes
+                child_id = node_ids.get(id(value)) if isinstance(value, AST) else None
+                if child_id is None:
+                    self.write_value(value)
+                else:
+                    ints.extend((REF, child_id))
+
+    def terminal_info(self, node):
+        """class_info of a Terminal, which is stored as a node if it isn't plain"""
+        attrs = node.__dict__
+        children = attrs["children"]
+        by_field = attrs["children_by_field"]
+        # a quick is_plain_terminal
+        plain = (
+            len(attrs) == len(NODE_ATTRIBUTES)
+            and len(children) == 1
+            and len(by_field) == 1
+            and by_field.get("value", MISSING) is children[0]
+            and attrs["_field_references"] == PLAIN_REFERENCES
+            and not attrs["_label_references"]
+            and not attrs["children_by_label"]
+            and attrs["position"] is None
+        )
+        info = self._class_ids.get((Terminal, plain))
+        if info is None:
+            info = self.class_info(node, plain)
+        return info
+
+    def references(self, references):
+        """Id of the keys and references of a node
+
+        The ids index self.references_table, which holds them as they're
+        stored in a layout: the keys id and the number of references that
+        aren't None, followed by their key positions and references.
+        """
+        keys = tuple(references)
+        refs = tuple(references.values())
+        if list in map(type, refs):
+            # lists of references aren't hashable
+            refs = tuple([tuple(ref) if type(ref) is list else ref for ref in refs])
+        references_id = self._references.get((keys, refs))
+        if references_id is not None:
+            return references_id
+        keys_id = self._keys_ids.get(keys)
+        if keys_id is None:
+            keys_id = self._keys_ids[keys] = len(self.keys)
+            self.keys.append(keys)
+        ints = [keys_id, len(refs) - refs.count(None)]
+        for i, ref in enumerate(refs):
+            if type(ref) is tuple:
+                # lists are stored as -1 - their length, followed by the items
+                ints.extend((i, -1 - len(ref)))
+                ints.extend(ref)
+            elif ref is not None:
+                ints.extend((i, ref))
+        references_id = self._references[keys, refs] = len(self.references_table)
+        self.references_table.append(ints)
+        return references_id
+
+    def write_layout(self, layout):
+        ints = self.layouts
+        ints.append(layout[0])
+        cls_id, n_children, field_references, label_references, flags, names = layout
+        ints.append(n_children)
+        ints.extend(self.references_table[field_references])
+        ints.extend(self.references_table[label_references])
+        ints.extend((flags, len(names)))
+        ints.extend(self.string_id(name) for name in names)
+
+    def span_id(self, ctx):
+        """Id of the span of a context that hasn't been written yet
+
+        Alias nodes share their context with the node they're created from,
+        so write_nodes looks contexts up first.
+        """
+        token_ids = self._token_ids
+        if isinstance(ctx, TerminalNodeImpl):
+            token = ctx.symbol
+            token_id = token_ids.get(id(token))
+            if token_id is None:
+                token_id = self.add_token(token)
+            # the text of a token is only used by the get_text of terminals
+            # (and slow to get), so it isn't stored for the bounds of other nodes
+            self.tokens[5 * token_id + 4] = self.string_id(token.text)
+            span = token_id, -1
+        else:
+            start, stop = getattr(ctx, "start", None), getattr(ctx, "stop", None)
+            if start is None or stop is None:
+                self._ctx_spans[id(ctx)] = -1
+                return -1
+            start_id = token_ids.get(id(start))
+            if start_id is None:
+                start_id = self.add_token(start)
+            stop_id = token_ids.get(id(stop))
+            if stop_id is None:
+                stop_id = self.add_token(stop)
+            span = start_id, stop_id
+        span_id = self._span_ids.get(span)
+        if span_id is None:
+            span_id = self._span_ids[span] = len(self.spans) // 2
+            self.spans.extend(span)
+        self._ctx_spans[id(ctx)] = span_id
+        return span_id
+
+    def add_token(self, token):
+        token_id = self._token_ids[id(token)] = len(self.tokens) // 5
+        self.tokens.extend((token.start, token.stop, token.line, token.column, -1))
+        return token_id
+
+    def write_value(self, value, ints=None):
+        if ints is None:
+            ints = self.values
+        if isinstance(value, AST):
+            ints.extend((REF, self.node_id(value)))
+        elif isinstance(value, str):
+            ints.extend((STR, self.string_id(value)))
+        elif value is None:
+            ints.append(NONE)
+        elif value is True:
+            ints.append(TRUE)
+        elif value is False:
+            ints.append(FALSE)
+        elif isinstance(value, int):
+            ints.extend((INT, value))
+        elif isinstance(value, (list, tuple)):
+            ints.extend((LIST if isinstance(value, list) else TUPLE, len(value)))
+            for el in value:
+                self.write_value(el, ints)
+        elif isinstance(value, dict):
+            ints.extend((DICT, len(value)))
+            for k, v in value.items():
+                ints.append(self.string_id(k))
+                self.write_value(v, ints)
+        else:
+            raise TypeError(
+                "Can't serialize value of type {}".format(type(value).__name__)
+            )
+
+
+def get_attributes(node, fields, attrs=None):
+    """(name, value) of the attributes of node besides the NODE_ATTRIBUTES
+
+    The fields of the class of node come first, also for compact nodes.
+    attrs is the __dict__ of a node that isn't compact.
+    """
+    if isinstance(node, CompactNode):
+        attrs = {}
+        for name in type(node).__slots__:
+            if name not in NODE_SLOTS:
+                try:
+                    attrs[name] = object.__getattribute__(node, name)
+                except AttributeError:
+                    # not set
+                    pass
+        attrs.update(node._attrs or ())
+        others = len(attrs)
+    else:
+        if attrs is None:
+            attrs = node.__dict__
+        others = len(attrs) - len(NODE_ATTRIBUTES)
+    result = [
+        (name, attrs[name])
+        for name in fields
+        if name in attrs and name not in NODE_ATTRIBUTE_NAMES
+    ]
+    if others > len(result):
+        result.extend(
+            (name, value)
+            for name, value in attrs.items()
+            if name not in NODE_ATTRIBUTE_NAMES and name not in fields
+        )
+    return result
+
+
+def is_materialized(children_by_x, references, children):
+    """Check whether children_by_x is what materialize would create
+
+    Like marshalling.is_materialized, with the common cases first.
+    """
+    if len(children_by_x) != len(references):
+        return False
+    get = references.get
+    for key, value in children_by_x.items():
+        ref = get(key, MISSING)
+        if ref is None:
+            if value is not None:
+                return False
+        elif type(ref) is int:
+            if value is not children[ref]:
+                return False
+        elif type(ref) is list:
+            if type(value) is not list or len(value) != len(ref):
+                return False
+            if not all(map(is_, value, map(children.__getitem__, ref))):
+                return False
+        else:
+            return False
+    return True
+
+
+def is_same(value, default):
+    """Check whether value is default, or a list of the same elements"""
+    if value is default:
+        return True
+    if not isinstance(value, list) or not isinstance(default, list):
+        return False
+    return len(value) == len(default) and all(
+        el is default_el for el, default_el in zip(value, default)
+    )
+
+
+class BinaryReader:
+    def __init__(self, data, registry=None):
+        if len(data) < HEADER.size:
+            raise ValueError("Not a binary tree: too short")
+        magic, version, int_size, n_ints, blob_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a binary tree: {!r}".format(magic))
+        if version != VERSION:
+            raise ValueError("Unsupported binary tree version: {}".format(version))
+        ints_end = HEADER.size + int_size * n_ints
+        if int_size not in TYPECODES or len(data) != ints_end + blob_size:
+            raise ValueError("Not a binary tree: wrong size")
+
+        ints = array(TYPECODES[int_size])
+        ints.frombytes(data[HEADER.size : ints_end])
+        if sys.byteorder == "big":
+            ints.byteswap()
+        self.ints = ints.tolist()
+        self.pos = 0
+        self.blob = bytes(data[ints_end:]).decode("utf-8", "surrogatepass")
+        self.registry = registry or loaded_classes
+        self.strings = []
+        self.nodes = []
+
+    def read_int(self):
+        self.pos += 1
+        return self.ints[self.pos - 1]
+
+    def read_ints(self, n):
+        self.pos += n
+        return self.ints[self.pos - n : self.pos]
+
+    def read(self):
+        strings = self.strings = self.read_strings()
+        # None for a text (or string) id of -1
+        strings.append(None)
+
+        n_tokens = self.read_int()
+        table = self.read_ints(5 * n_tokens)
+        tokens = list(
+            map(
+                DetachedToken,
+                table[0::5],
+                table[1::5],
+                table[2::5],
+                table[3::5],
+                [strings[i] for i in table[4::5]],
+            )
+        )
+        table = self.read_ints(2 * self.read_int())
+        spans = [
+            (
+                DetachedTerminalNode(tokens[start])
+                if stop == -1
+                else DetachedContext(tokens[start], tokens[stop])
+            )
+            for start, stop in zip(table[0::2], table[1::2])
+        ]
+        # None for a span id of -1
+        spans.append(None)
+
+        alias_classes = get_alias_classes()
+        classes = [self.read_class(alias_classes) for _ in range(self.read_int())]
+        keys = [split_names(strings[i]) for i in self.read_ints(self.read_int())]
+        layouts = [self.read_layout(classes, keys) for _ in range(self.read_int())]
+
+        n_nodes, n_children, n_values = self.read_ints(3)
+        node_layouts = self.read_ints(n_nodes)
+        node_spans = self.read_ints(n_nodes)
+        children = self.read_ints(n_children)
+        values = self.read_ints(n_values)
+
+        # nodes can reference nodes that come later, so create them first
+        new = AST.__new__
+        nodes = self.nodes = [new(layouts[i][0]) for i in node_layouts]
+        # None for a child id of -1
+        targets = nodes + [None]
+        self.values = iter(values)
+        read_value = self.read_value
+        offset = 0
+        for node, layout_id, span_id in zip(nodes, node_layouts, node_spans):
+            layout = layouts[layout_id]
+            ctx = spans[span_id]
+            if len(layout) == 1:
+                value = read_value()
+                node.__dict__.update(
+                    children=[value],
+                    _field_references={"value": 0},
+                    children_by_field={"value": value},
+                    _label_references={},
+                    children_by_label={},
+                    _ctx=ctx,
+                    position=None,
+                )
+                continue
+
+            _, n, fields, labels, flags, names = layout
+            node_children = [targets[i] for i in children[offset : offset + n]]
+            offset += n
+            position = read_value() if flags & POSITION else None
+            if flags & CHILDREN_BY_FIELD:
+                children_by_field = read_value()
+            else:
+                children_by_field = materialize(fields, node_children)
+            if flags & CHILDREN_BY_LABEL:
+                children_by_label = read_value()
+            else:
+                children_by_label = materialize(labels, node_children)
+            node.__dict__.update(
+                children=node_children,
+                _field_references=copy_references(fields),
+                children_by_field=children_by_field,
+                _label_references=copy_references(labels),
+                children_by_label=children_by_label,
+                _ctx=ctx,
+                position=position,
+            )
+            if names:
+                node.__dict__.update((name, read_value()) for name in names)
+
+        self.values = iter(self.ints[self.pos :])
+        return read_value()
+
+    def read_strings(self):
+        lengths = self.read_ints(self.read_int())
+        strings = []
+        blob = self.blob
+        start = 0
+        for length in lengths:
+            strings.append(blob[start : start + length])
+            start += length
+        return strings
+
+    def read_class(self, alias_classes):
+        kind, name_id, fields_id = self.read_ints(3)
+        name = self.strings[name_id]
+        fields = split_names(self.strings[fields_id])
+        if kind == ALIAS:
+            return alias_classes[name], kind
+        elif kind == TERMINAL:
+            return Terminal, kind
+        return self.registry.get_cls(name, fields), kind
+
+    def read_layout(self, classes, keys):
+        """The class of a layout, with the shared state of its nodes
+
+        (cls,) for terminals, otherwise (cls, number of children,
+        the keys, (key, reference) pairs and references of the fields,
+        those of the labels, flags, attribute names)
+        """
+        cls, kind = classes[self.read_int()]
+        if kind == TERMINAL:
+            return (cls,)
+        layout = [cls, self.read_int()]
+        for _ in range(2):
+            keys_id, n_pairs = self.read_ints(2)
+            references = dict.fromkeys(keys[keys_id])
+            pairs = []
+            for _ in range(n_pairs):
+                i, ref = self.read_ints(2)
+                if ref < 0:
+                    ref = self.read_ints(-1 - ref)
+                key = keys[keys_id][i]
+                references[key] = ref
+                pairs.append((key, ref))
+            layout.append((keys[keys_id], pairs, references))
+        flags, n_names = self.read_ints(2)
+        layout.append(flags)
+        layout.append(tuple(self.strings[i] for i in self.read_ints(n_names)))
+        return tuple(layout)
+
+    def read_value(self):
+        read_int = self.values.__next__
+        tag = read_int()
+        if tag == REF:
+            return self.nodes[read_int()]
+        elif tag == STR:
+            return self.strings[read_int()]
+        elif tag == NONE:
+            return None
+        elif tag == TRUE:
+            return True
+        elif tag == FALSE:
+            return False
+        elif tag == INT:
+            return read_int()
+        elif tag == LIST:
+            return [self.read_value() for _ in range(read_int())]
+        elif tag == TUPLE:
+            return tuple([self.read_value() for _ in range(read_int())])
+        elif tag == DICT:
+            result = {}
+            for _ in range(read_int()):
+                key = self.strings[read_int()]
+                result[key] = self.read_value()
+            return result
+        raise ValueError("Invalid value tag: {}".format(tag))
+
+
+def split_names(names):
+    """The names (fields or keys) joined by BinaryWriter"""
+    return tuple(names.split(" ")) if names else ()
+
+
+def copy_references(references):
+    """_x_references of a node, from the keys, pairs and references of its layout
+
+    The layout is shared by many nodes, so every node gets a copy.
+    """
+    keys, pairs, result = references
+    result = result.copy()
+    for key, ref in pairs:
+        if type(ref) is list:
+            result[key] = ref[:]
+    return result
+
+
+def materialize(references, children):
+    """children_by_x of a node, from the keys and (key, reference) pairs of its layout"""
+    keys, pairs, _ = references
+    result = dict.fromkeys(keys)
+    for key, ref in pairs:
+        if type(ref) is int:
+            result[key] = children[ref]
+        else:
+            result[key] = [children[i] for i in ref]
+    return result
@@ -0,0 +1,125 @@
+from ast import AST
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+from antlr_ast.ast import BaseNode
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "maxbytes", "currsize", "currbytes"]
+)
+
+# node attributes that are never mutated by shaping, so copies can share them
+SHARED_ATTRIBUTES = {"_ctx", "_field_references", "_label_references"}
+
+
+class ParseCache:
+    """Bounded LRU cache for parse results
+
+    Entries are evicted (least recently used first) when there are more than
+    maxsize entries or when the combined length of the cached source texts
+    exceeds maxbytes. Every lookup returns a fresh copy of the cached tree,
+    so a consumer mutating its tree can't affect other consumers.
+    """
+
+    def __init__(self, maxsize=256, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.currbytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy_tree(entry[0])
+
+    def put(self, key, tree, nbytes=0):
+        if self.maxbytes is not None and nbytes > self.maxbytes:
+            return
+        tree = copy_tree(tree)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.currbytes -= old[1]
+            self._entries[key] = (tree, nbytes)
+            self.currbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (
+            (self.maxsize is not None and len(self._entries) > self.maxsize)
+            or (self.maxbytes is not None and self.currbytes > self.maxbytes)
+        ):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.currbytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.currbytes = 0
+
+    def info(self):
+        return CacheInfo(
+            self.hits,
+            self.misses,
+            self.maxsize,
+            self.maxbytes,
+            len(self._entries),
+            self.currbytes,
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def copy_tree(tree, memo=None):
+    """Copy the nodes, lists and dicts of a tree, sharing the ANTLR contexts
+
+    Identity is preserved within the copy: a node referenced by both
+    its parent's children and one of its fields is copied once.
+    """
+    if memo is None:
+        memo = {}
+    # copies are created empty when they're first reached and filled from
+    # a stack, so deep trees (e.g. long AND chains) don't need recursion
+    stack = []
+    result = copy_value(tree, memo, stack)
+    while stack:
+        value, clone = stack.pop()
+        if isinstance(clone, list):
+            clone.extend([copy_value(el, memo, stack) for el in value])
+        elif isinstance(clone, dict):
+            clone.update([(k, copy_value(v, memo, stack)) for k, v in value.items()])
+        else:
+            clone.__dict__.update(
+                [
+                    (k, v if k in SHARED_ATTRIBUTES else copy_value(v, memo, stack))
+                    for k, v in value.__dict__.items()
+                ]
+            )
+    return result
+
+
+def copy_value(value, memo, stack):
+    """The copy of value, which is pushed on stack to be filled when it's new"""
+    if not isinstance(value, (BaseNode, list, dict)):
+        return value
+    clone = memo.get(id(value))
+    if clone is None:
+        if isinstance(value, BaseNode):
+            # AST.__new__ skips Terminal.__new__, which registers debug instances
+            clone = AST.__new__(type(value))
+        elif isinstance(value, list):
+            clone = []
+        else:
+            clone = {}
+        memo[id(value)] = clone
+        stack.append((value, clone))
+    return clone
@@ -0,0 +1,268 @@
+from ast import AST
+
+from antlr_ast.ast import BaseNode, AliasNode, Terminal, materialize
+
+from antlr_plsql.marshalling import NODE_ATTRIBUTES, is_materialized, is_plain_terminal
+
+# Compact trees ---------------------------------------------------------------
+# Every node of a tree returned by parse has a __dict__ with its children,
+# and both the references to and the materialized children of every field of
+# its ANTLR rule (hundreds for e.g. regular_id, almost all None).
+# compact_tree converts a tree to nodes with __slots__, which only store
+# the references that aren't None, and materialize children_by_field on access.
+# The fields of alias nodes (derived from _fields_spec) get their own slot.
+#
+# Compact nodes are instances of (a subclass of) the class of the node they
+# replace, with the same attributes and repr. They're meant to be kept and
+# read: mutating them works, but attributes outside the fields of an alias
+# node end up in a __dict__ again. Use dump_tree and copy_tree on the
+# original tree, before compacting it.
+
+# slots of all compact nodes (besides those of alias fields)
+NODE_SLOTS = (
+    "children",
+    "_field_keys",
+    "_field_refs",
+    "_label_keys",
+    "_label_refs",
+    "_ctx",
+    "position",
+    "_attrs",
+    "_materialized",
+)
+
+# key tuples of field references, shared by all compact nodes
+shared_keys = {}
+
+# compact subclasses of node classes, by class for alias nodes and terminals,
+# and by name and fields for dynamic node classes (those differ between parses)
+compact_classes = {}
+
+EMPTY = {}
+MISSING = object()
+
+FIELDS, LABELS = "fields", "labels"
+
+
+class CompactNode:
+    """Mixin for BaseNode subclasses that store their state in __slots__"""
+
+    __slots__ = ()
+
+    @property
+    def _field_references(self):
+        return expand_references(self._field_keys, self._field_refs)
+
+    @property
+    def _label_references(self):
+        return expand_references(self._label_keys, self._label_refs)
+
+    @property
+    def children_by_field(self):
+        materialized = self._materialized
+        if materialized is not None and FIELDS in materialized:
+            return materialized[FIELDS]
+        return materialize(self._field_references, self.children)
+
+    @property
+    def children_by_label(self):
+        materialized = self._materialized
+        if materialized is not None and LABELS in materialized:
+            return materialized[LABELS]
+        return materialize(self._label_references, self.children)
+
+    def __getattr__(self, name):
+        # only called for names that aren't in a slot (or __dict__),
+        # returns the same as BaseNode.__getattr__
+        if name in NODE_SLOTS:
+            raise AttributeError(name)
+        attrs = self._attrs
+        if attrs is not None and name in attrs:
+            return attrs[name]
+        result = self.get_reference(name, LABELS)
+        if result is MISSING or not result:
+            result = self.get_reference(name, FIELDS)
+        if result is MISSING:
+            if self._strict:
+                raise AttributeError(
+                    "{}.{} is invalid.".format(self.__class__.__name__, name)
+                )
+            result = None
+        return result
+
+    def get_reference(self, name, kind):
+        """Get children_by_x[name] (MISSING if it isn't there), for kind FIELDS or LABELS"""
+        materialized = self._materialized
+        if materialized is not None and kind in materialized:
+            return materialized[kind].get(name, MISSING)
+        if kind == FIELDS:
+            keys, refs = self._field_keys, self._field_refs
+        else:
+            keys, refs = self._label_keys, self._label_refs
+        ref = refs.get(name)
+        if isinstance(ref, list):
+            return [self.children[i] for i in ref]
+        elif ref is not None:
+            return self.children[ref]
+        return None if name in keys else MISSING
+
+
+class CompactTerminal:
+    """Mixin for Terminal subclasses that store their value in __slots__"""
+
+    __slots__ = ()
+
+    position = None
+
+    @property
+    def children(self):
+        return [self.value]
+
+    @property
+    def _field_references(self):
+        return {"value": 0}
+
+    @property
+    def children_by_field(self):
+        return {"value": self.value}
+
+    @property
+    def _label_references(self):
+        return {}
+
+    @property
+    def children_by_label(self):
+        return {}
+
+
+def compact_tree(tree):
+    """Convert a tree returned by parse to compact nodes
+
+    Nodes referenced multiple times (e.g. as child and as field)
+    are converted once. The ANTLR contexts are shared with the original tree.
+    """
+    memo = {}
+    originals = collect_nodes(tree)
+    for node in originals:
+        terminal = type(node) is Terminal and is_plain_terminal(node)
+        memo[id(node)] = AST.__new__(get_compact_class(type(node), terminal))
+    for node in originals:
+        fill_node(memo[id(node)], node, memo)
+    return convert_value(tree, memo)
+
+
+def collect_nodes(tree):
+    """All distinct nodes in tree, without recursion"""
+    seen = set()
+    nodes = []
+    stack = [tree]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, BaseNode) and id(value) not in seen:
+            seen.add(id(value))
+            nodes.append(value)
+            stack.extend(value.__dict__.values())
+    return nodes
+
+
+def convert_value(value, memo):
+    if isinstance(value, BaseNode):
+        return memo[id(value)]
+    elif isinstance(value, list):
+        return [convert_value(el, memo) for el in value]
+    elif isinstance(value, dict):
+        return {k: convert_value(v, memo) for k, v in value.items()}
+    return value
+
+
+def fill_node(compact, node, memo):
+    attrs = node.__dict__
+    compact._ctx = attrs.get("_ctx")
+    if isinstance(compact, CompactTerminal):
+        compact.value = node.value
+        return
+
+    children = attrs["children"]
+    compact.children = convert_value(children, memo)
+    compact.position = attrs.get("position")
+    field_references = attrs["_field_references"]
+    label_references = attrs["_label_references"]
+    compact._field_keys, compact._field_refs = compact_references(field_references)
+    compact._label_keys, compact._label_refs = compact_references(label_references)
+
+    # in rare cases, children_by_x isn't what materializing the references gives
+    materialized = {}
+    if not is_materialized(attrs["children_by_field"], field_references, children):
+        materialized[FIELDS] = convert_value(attrs["children_by_field"], memo)
+    if not is_materialized(attrs["children_by_label"], label_references, children):
+        materialized[LABELS] = convert_value(attrs["children_by_label"], memo)
+    compact._materialized = materialized or None
+
+    slots = type(compact).__slots__
+    extra = {}
+    for name, value in attrs.items():
+        if name in NODE_ATTRIBUTES:
+            continue
+        if name in slots:
+            setattr(compact, name, convert_value(value, memo))
+            continue
+        # the transformer sets all fields, also when they don't change
+        # skip those that __getattr__ returns anyway
+        default = attrs["children_by_label"].get(name) or attrs[
+            "children_by_field"
+        ].get(name, MISSING)
+        if value is not default:
+            extra[name] = convert_value(value, memo)
+    compact._attrs = extra or None
+
+
+def compact_references(references):
+    keys = tuple(references)
+    keys = shared_keys.setdefault(keys, keys)
+    refs = {k: v for k, v in references.items() if v is not None}
+    return keys, refs or EMPTY
+
+
+def expand_references(keys, refs):
+    result = dict.fromkeys(keys)
+    result.update(refs)
+    return result
+
+
+def get_compact_class(cls, terminal=False):
+    if terminal or issubclass(cls, (AliasNode, Terminal)):
+        key = cls, terminal
+    else:
+        key = cls.__name__, tuple(cls._fields)
+    compact_cls = compact_classes.get(key)
+    if compact_cls is None:
+        compact_cls = compact_classes[key] = create_compact_class(cls, terminal)
+    return compact_cls
+
+
+def create_compact_class(cls, terminal=False):
+    namespace = {"__module__": cls.__module__, "__qualname__": cls.__qualname__}
+    if terminal:
+        bases = (cls, CompactTerminal)
+        namespace["__slots__"] = ("value", "_ctx")
+    elif issubclass(cls, AliasNode):
+        bases = (cls, CompactNode)
+        namespace["__slots__"] = NODE_SLOTS + tuple(cls._fields)
+    elif issubclass(cls, Terminal):
+        bases = (cls, CompactNode)
+        namespace["__slots__"] = NODE_SLOTS
+    else:
+        # dynamic node classes have one field per rule and token of the grammar
+        # rule, so these are stored in _attrs when set
+        bases = (BaseNode, CompactNode)
+        namespace["__slots__"] = NODE_SLOTS
+        namespace["_fields"] = tuple(cls._fields)
+    if not terminal:
+        # the mixin comes after the node class, so the node class determines
+        # the layout of instances, but its __getattr__ has to win
+        namespace["__getattr__"] = CompactNode.__getattr__
+    return type(cls)(cls.__name__, bases, namespace)
@@ -0,0 +1,294 @@
+import copyreg
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn.ATNConfig import ATNConfig, LexerATNConfig
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.LexerAction import LexerAction
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.dfa.DFAState import DFAState
+
+from antlr_plsql import ast
+
+# DFA warm-start cache --------------------------------------------------------
+# ANTLR builds the DFA used for prediction while parsing, so the first parses
+# in a process are a lot slower than later ones. save writes the DFA of the
+# current process to disk, load restores it in a new process.
+# A cache is only loaded for the grammar (and format) it was created with.
+# It's a pickle, and unpickling can run arbitrary code, so load only reads
+# the path it's given: only pass it caches you created.
+#
+#   python -m antlr_plsql.dfa tests/examples
+#
+# parses the given files (or directories of files) and saves the DFA.
+
+VERSION = 1
+
+ENV_PATH = "ANTLR_PLSQL_DFA_CACHE"
+
+logger = logging.getLogger(__name__)
+
+DFA_ATTRIBUTES = (
+    "isAcceptState",
+    "prediction",
+    "lexerActionExecutor",
+    "requiresFullContext",
+    "predicates",
+)
+
+
+def grammar_key():
+    """Hash of the serialized ATN of the generated lexer and parser"""
+    digest = hashlib.sha256(str(VERSION).encode())
+    for recognizer in (ast.grammar.Lexer, ast.grammar.Parser):
+        module = sys.modules[recognizer.__module__]
+        digest.update(repr(module.serializedATN()).encode())
+    return digest.hexdigest()
+
+
+def default_path():
+    """Path of the cache, from ANTLR_PLSQL_DFA_CACHE or in the user cache directory"""
+    path = os.environ.get(ENV_PATH)
+    if path:
+        return path
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(
+        cache_dir, "antlr_plsql", "dfa-{}.pickle".format(grammar_key()[:16])
+    )
+
+
+def save(path=None):
+    """Save the DFA of the lexer and parser in this process to path"""
+    path = path or default_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    header = {"version": VERSION, "key": grammar_key()}
+    state = {
+        "lexer": dump_dfa(ast.grammar.Lexer.decisionsToDFA),
+        "parser": dump_dfa(ast.grammar.Parser.decisionsToDFA),
+        "contexts": list(ast.grammar.Parser.sharedContextCache.cache),
+    }
+    # write to a temporary file first, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            create_pickler(f).dump(state)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def load(path):
+    """Load the DFA saved by save to path, returns whether it was loaded
+
+    Returns False (and logs a warning) if the cache at path can't be read,
+    or was created for another grammar. Only the DFA of decisions that
+    weren't used yet is replaced.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header != {"version": VERSION, "key": grammar_key()}:
+                logger.warning("DFA cache %s is for another grammar", path)
+                return False
+            state = create_unpickler(f).load()
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        logger.warning("Can't load DFA cache %s: %s", path, e)
+        return False
+
+    load_dfa(ast.grammar.Lexer.decisionsToDFA, state["lexer"])
+    load_dfa(ast.grammar.Parser.decisionsToDFA, state["parser"])
+    cache = ast.grammar.Parser.sharedContextCache
+    for context in state["contexts"]:
+        cache.add(context)
+    return True
+
+
+def build(texts, path=None, start="sql_script"):
+    """Parse texts to warm up the DFA and save it"""
+    for text in texts:
+        try:
+            ast.parse(text, start)
+        except ast.ParseError:
+            pass
+    return save(path)
+
+
+# DFA states refer to each other (edges) and to the ATN (configs).
+# States are stored in a table, with edges as indices into that table,
+# to prevent deep recursion. ATN states and singletons are stored by reference.
+
+
+def dump_dfa(decisions):
+    result = []
+    for dfa in decisions:
+        # the start state of a precedence DFA isn't in dfa._states
+        states = list(dfa._states) + [dfa.s0]
+        ids = {id(state): i for i, state in enumerate(states)}
+        ids[id(None)] = None
+        # the simulators check for their ERROR state by identity
+        ids.update((id(state), i) for i, state in get_error_states().items())
+        dumped_states = []
+        for state in states[:-1] if dfa.s0 is None else states:
+            if state.edges is not None:
+                edges = [ids[id(target)] for target in state.edges]
+            else:
+                edges = None
+            dumped_states.append(
+                (
+                    state.stateNumber,
+                    state.configs,
+                    edges,
+                    tuple(getattr(state, name) for name in DFA_ATTRIBUTES),
+                )
+            )
+        result.append((len(dfa._states), ids[id(dfa.s0)], dumped_states))
+    return result
+
+
+def load_dfa(decisions, dumped):
+    for dfa, (n_states, s0, dumped_states) in zip(decisions, dumped):
+        if dfa._states:
+            continue
+        states = []
+        for state_number, configs, _, attributes in dumped_states:
+            state = DFAState(state_number, configs)
+            for name, value in zip(DFA_ATTRIBUTES, attributes):
+                setattr(state, name, value)
+            states.append(state)
+        targets = dict(enumerate(states))
+        targets.update(get_error_states())
+        targets[None] = None
+        for state, (_, _, edges, _) in zip(states, dumped_states):
+            if edges is not None:
+                state.edges = [targets[i] for i in edges]
+        dfa._states = {state: state for state in states[:n_states]}
+        if s0 is not None:
+            dfa.s0 = states[s0]
+
+
+def get_error_states():
+    # negative, so they can't be confused with state indices
+    return {-1: ATNSimulator.ERROR, -2: LexerATNSimulator.ERROR}
+
+
+def get_singletons():
+    singletons = {
+        "semantic_none": SemanticContext.NONE,
+        "context_empty": PredictionContext.EMPTY,
+    }
+    for cls in LexerAction.__subclasses__():
+        if hasattr(cls, "INSTANCE"):
+            singletons["action_" + cls.__name__] = cls.INSTANCE
+    return singletons
+
+
+def create_pickler(f):
+    atns = {"lexer": ast.grammar.Lexer.atn, "parser": ast.grammar.Parser.atn}
+    singletons = {id(obj): name for name, obj in get_singletons().items()}
+
+    pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[ATNConfig] = reduce_config
+    pickler.dispatch_table[LexerATNConfig] = reduce_config
+
+    def persistent_id(obj):
+        if isinstance(obj, ATNState):
+            for name, atn in atns.items():
+                if obj.atn is atn:
+                    return "state", name, obj.stateNumber
+        return singletons.get(id(obj))
+
+    pickler.persistent_id = persistent_id
+    return pickler
+
+
+def create_unpickler(f):
+    atns = {"lexer": ast.grammar.Lexer.atn, "parser": ast.grammar.Parser.atn}
+    singletons = get_singletons()
+
+    unpickler = pickle.Unpickler(f)
+
+    def persistent_load(pid):
+        if isinstance(pid, tuple):
+            _, name, state_number = pid
+            return atns[name].states[state_number]
+        return singletons[pid]
+
+    unpickler.persistent_load = persistent_load
+    return unpickler
+
+
+# DFA states contain millions of configs, so they are stored as compact tuples
+# (with the default semantic context as None)
+
+
+def reduce_config(config):
+    semantic = config.semanticContext
+    if semantic is SemanticContext.NONE:
+        semantic = None
+    args = (
+        config.state.stateNumber,
+        config.alt,
+        config.context,
+        semantic,
+        config.reachesIntoOuterContext,
+        config.precedenceFilterSuppressed,
+    )
+    if isinstance(config, LexerATNConfig):
+        args += (config.lexerActionExecutor, config.passedThroughNonGreedyDecision)
+        return load_lexer_config, args
+    return load_config, args
+
+
+def load_config(
+    state_number, alt, context, semantic, reaches, suppressed, cls=ATNConfig
+):
+    config = cls.__new__(cls)
+    config.state = ast.grammar.Parser.atn.states[state_number]
+    config.alt = alt
+    config.context = context
+    config.semanticContext = SemanticContext.NONE if semantic is None else semantic
+    config.reachesIntoOuterContext = reaches
+    config.precedenceFilterSuppressed = suppressed
+    return config
+
+
+def load_lexer_config(
+    state_number, alt, context, semantic, reaches, suppressed, executor, non_greedy
+):
+    config = load_config(
+        state_number, alt, context, semantic, reaches, suppressed, LexerATNConfig
+    )
+    config.state = ast.grammar.Lexer.atn.states[state_number]
+    config.lexerActionExecutor = executor
+    config.passedThroughNonGreedyDecision = non_greedy
+    return config
+
+
+def main(paths):
+    texts = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, encoding="utf-8") as f:
+                texts.append(f.read())
+    print(build(texts))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,189 @@
+from collections import namedtuple
+from functools import lru_cache
+
+from antlr4 import Token
+
+from antlr_plsql import ast, grammar
+
+# Fingerprints ----------------------------------------------------------------
+# fingerprint normalizes a query to group queries that only differ in their
+# literals, formatting and case (e.g. in query logs). It only runs the lexer,
+# in a single pass over the tokens, so it's much faster than parsing.
+# Characters the lexer can't match are reported and skipped, like in parse.
+
+TokenTypes = namedtuple("TokenTypes", "literals list_tokens list_values sign_context")
+
+
+@lru_cache(maxsize=None)
+def token_types():
+    """The sets of token types fingerprint treats specially"""
+    # a function, as importing this module shouldn't load the grammar
+    Lexer = grammar.Lexer
+    literals = {
+        Lexer.CHAR_STRING,
+        Lexer.NATIONAL_CHAR_STRING_LIT,
+        Lexer.BIT_STRING_LIT,
+        Lexer.HEX_STRING_LIT,
+        Lexer.UNSIGNED_INTEGER,
+        Lexer.APPROXIMATE_NUM_LIT,
+    }
+
+    # tokens of a list that is collapsed, e.g. IN (1, -2, :x)
+    list_tokens = literals | {
+        Lexer.BINDVAR,
+        Lexer.COMMA,
+        Lexer.MINUS_SIGN,
+        Lexer.PLUS_SIGN,
+    }
+    list_values = literals | {Lexer.BINDVAR}
+
+    # tokens after which a minus is the sign of a literal, e.g. WHERE a > -1
+    sign_context = {
+        Lexer.LEFT_PAREN,
+        Lexer.COMMA,
+        Lexer.EQUALS_OP,
+        Lexer.NOT_EQUAL_OP,
+        Lexer.LESS_THAN_OP,
+        Lexer.LESS_THAN_OR_EQUALS_OP,
+        Lexer.GREATER_THAN_OP,
+        Lexer.GREATER_THAN_OR_EQUALS_OP,
+        Lexer.CARRET_OPERATOR_PART,
+        Lexer.TILDE_OPERATOR_PART,
+        Lexer.EXCLAMATION_OPERATOR_PART,
+        Lexer.ASSIGN_OP,
+        Lexer.PLUS_SIGN,
+        Lexer.MINUS_SIGN,
+        Lexer.ASTERISK,
+        Lexer.DOUBLE_ASTERISK,
+        Lexer.SOLIDUS,
+        Lexer.CONCATENATION_OP,
+        Lexer.SELECT,
+        Lexer.WHERE,
+        Lexer.HAVING,
+        Lexer.ON,
+        Lexer.AND,
+        Lexer.OR,
+        Lexer.NOT,
+        Lexer.BETWEEN,
+        Lexer.LIKE,
+        Lexer.CASE,
+        Lexer.WHEN,
+        Lexer.THEN,
+        Lexer.ELSE,
+        Lexer.BY,
+        Lexer.PRIOR,
+        Lexer.DEFAULT,
+        Lexer.RETURN,
+    }
+    return TokenTypes(literals, list_tokens, list_values, sign_context)
+
+
+PLACEHOLDER = "?"
+LIST_PLACEHOLDER = "?+"
+
+# no space after these, or before these
+OPENING = {"(", "."}
+CLOSING = {")", ",", ".", ";"}
+
+
+def fingerprint(sql_text, literals=False):
+    """Normalized text of sql_text
+
+    Comments and whitespace are dropped, literals (with their sign) are
+    replaced by ?, lists of literals and bind variables after IN by (?+),
+    and everything but quoted identifiers is lowercased.
+    With literals, returns a tuple of the fingerprint and a list of
+    the source text of the replaced literals.
+    """
+    Lexer = grammar.Lexer
+    types = token_types()
+    parts = []
+    values = []
+    # types of the tokens in parts
+    kinds = []
+    # tokens after IN (, while they can be a list to collapse
+    pending = None
+    previous = None
+    for token in iter_tokens(sql_text):
+        ttype = token.type
+        if pending is not None:
+            if ttype in types.list_tokens:
+                pending.append(token)
+                continue
+            if ttype == Lexer.RIGHT_PAREN and any(
+                el.type in types.list_values for el in pending
+            ):
+                parts.extend(("(", LIST_PLACEHOLDER, ")"))
+                values.extend(list_values(pending, types))
+                kinds.extend((Lexer.LEFT_PAREN, None, Lexer.RIGHT_PAREN))
+                pending = None
+                previous = ttype
+                continue
+            for el in pending:
+                add_token(el, parts, values, kinds, types)
+            pending = None
+
+        if ttype == Lexer.LEFT_PAREN and previous == Lexer.IN:
+            pending = [token]
+        else:
+            add_token(token, parts, values, kinds, types)
+        previous = ttype
+
+    for el in pending or ():
+        add_token(el, parts, values, kinds, types)
+
+    result = join_parts(parts)
+    return (result, values) if literals else result
+
+
+def iter_tokens(sql_text):
+    """Default channel tokens of sql_text, without EOF"""
+    lexer = ast.lex(sql_text).tokenSource
+    while True:
+        token = lexer.nextToken()
+        if token.type == Token.EOF:
+            return
+        if token.channel == Token.DEFAULT_CHANNEL:
+            yield token
+
+
+def add_token(token, parts, values, kinds, types):
+    if token.type in types.literals:
+        if kinds[-1:] == [grammar.Lexer.MINUS_SIGN] and (
+            len(kinds) == 1 or kinds[-2] in types.sign_context
+        ):
+            # a negative literal, not a subtraction
+            parts.pop()
+            values.append("-" + token.text)
+        else:
+            values.append(token.text)
+        parts.append(PLACEHOLDER)
+    elif token.type == grammar.Lexer.DELIMITED_ID:
+        parts.append(token.text)
+    else:
+        parts.append(token.text.lower())
+    kinds.append(token.type)
+
+
+def list_values(tokens, types):
+    """Source text of the literals in a collapsed list, with their sign"""
+    signs = (grammar.Lexer.MINUS_SIGN, grammar.Lexer.PLUS_SIGN)
+    sign = ""
+    for token in tokens:
+        if token.type in signs:
+            sign += token.text
+        else:
+            if token.type in types.literals:
+                yield sign + token.text
+            sign = ""
+
+
+def join_parts(parts):
+    result = []
+    glue = True
+    for part in parts:
+        if not glue and part not in CLOSING:
+            result.append(" ")
+        result.append(part)
+        glue = part in OPENING
+    return "".join(result)
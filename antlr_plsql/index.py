@@ -0,0 +1,173 @@
+import weakref
+from ast import AST
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from heapq import merge
+
+from antlr_plsql.ast import alias_fields
+
+# Node index ------------------------------------------------------------------
+# Checks that look up nodes over and over (all Identifiers, the SelectStmt a
+# node is in, ...) can use an index of the tree instead of walking it for every
+# lookup. get_index builds it in a single pass on first use:
+#
+#   index = get_index(tree)
+#   for call in index.find_all(ast.Call, within=select):
+#       index.enclosing(call, ast.SelectStmt)
+#       index.path(call)  # e.g. "body[0].target_list[1]"
+#
+# Nodes are numbered in preorder (in the order of their _fields), so the
+# descendants of a node are the nodes numbered from it to its end.
+# An index is a snapshot: after changing a tree, use get_index(tree, refresh=True).
+
+# by id of the root, as not all roots are hashable (e.g. a Terminal)
+indexes = {}
+
+
+def get_index(tree, refresh=False):
+    """NodeIndex of tree, built on first use and kept while tree is
+
+    Lists of nodes (which parse returns for some start rules) can't be
+    referenced weakly, so their index is built on every call and not kept.
+    """
+    if isinstance(tree, list):
+        return NodeIndex(tree)
+    key = id(tree)
+    index = None if refresh else indexes.get(key)
+    if index is None:
+        if key not in indexes:
+            # the id can only be reused once the entry is removed
+            weakref.finalize(tree, indexes.pop, key, None)
+        index = indexes[key] = NodeIndex(tree)
+    return index
+
+
+class NodeIndex:
+    """Preorder numbering of the nodes in a tree, with their parents and types
+
+    Nodes that occur more than once in the tree are indexed where they occur first.
+    """
+
+    def __init__(self, root):
+        # get_index keeps the index while the root is alive, so don't keep the root
+        # (unless it's a list, see get_index)
+        self.root = (lambda: root) if isinstance(root, list) else weakref.ref(root)
+        # per node number (the root is number 0)
+        self.nodes = []
+        self.parents = []
+        self.keys = []
+        self.ends = []
+        self.numbers = {}
+        self.by_type = defaultdict(list)
+        self.build(root)
+
+    def build(self, root):
+        nodes, parents, keys, ends = self.nodes, self.parents, self.keys, self.ends
+        numbers, by_type = self.numbers, self.by_type
+        # a None node marks the end of the descendants of parent
+        stack = [(root, None, "")]
+        while stack:
+            node, parent, key = stack.pop()
+            if node is None:
+                ends[parent] = len(nodes)
+                continue
+            if id(node) in numbers:
+                continue
+            number = numbers[id(node)] = len(nodes)
+            nodes.append(node if number else None)
+            parents.append(parent)
+            keys.append(key)
+            ends.append(None)
+            by_type[type(node)].append(number)
+            stack.append((None, number, None))
+            children = [(child, number, key) for child, key in iter_children(node)]
+            stack.extend(reversed(children))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return id(node) in self.numbers
+
+    def number(self, node):
+        """Preorder number of node, raises KeyError if it's not in the tree"""
+        return self.numbers[id(node)]
+
+    def parent(self, node):
+        """Node that has node in one of its fields (None for the root)"""
+        parent = self.parents[self.number(node)]
+        return None if parent is None else self.get_node(parent)
+
+    def ancestors(self, node):
+        """Nodes that node is in, from its parent up to the root"""
+        parent = self.parents[self.number(node)]
+        while parent is not None:
+            yield self.get_node(parent)
+            parent = self.parents[parent]
+
+    def enclosing(self, node, cls):
+        """Closest ancestor of node that is an instance of cls, or None"""
+        for ancestor in self.ancestors(node):
+            if isinstance(ancestor, cls):
+                return ancestor
+        return None
+
+    def is_within(self, node, ancestor):
+        """Whether node is a descendant of ancestor"""
+        number = self.number(node)
+        start = self.number(ancestor)
+        return start < number < self.ends[start]
+
+    def path(self, node):
+        """Fields from the root to node, e.g. "body[0].where_clause.left" """
+        keys = []
+        number = self.number(node)
+        while number is not None:
+            keys.append(self.keys[number])
+            number = self.parents[number]
+        return ".".join(reversed(keys[:-1]))
+
+    def find_all(self, cls, within=None):
+        """Instances of cls in the tree (or below within), in preorder"""
+        if within is None:
+            start, end = -1, len(self.nodes)
+        else:
+            start = self.number(within)
+            end = self.ends[start]
+        ranges = []
+        for node_cls, numbers in self.by_type.items():
+            if issubclass(node_cls, cls):
+                # numbers are sorted, so the descendants are a slice
+                lo = bisect_right(numbers, start)
+                hi = bisect_left(numbers, end, lo)
+                if lo < hi:
+                    ranges.append(numbers[lo:hi])
+        numbers = ranges[0] if len(ranges) == 1 else merge(*ranges)
+        return [self.get_node(number) for number in numbers]
+
+    def get_node(self, number):
+        return self.nodes[number] if number else self.root()
+
+
+def iter_children(node):
+    """Child nodes of node with their key (field name and list indices)"""
+    if isinstance(node, list):
+        # a list root
+        yield from iter_items(node, "")
+        return
+    for field in alias_fields.get(type(node)) or node._fields:
+        value = getattr(node, field, None)
+        if isinstance(value, AST):
+            yield value, field
+        elif isinstance(value, list):
+            yield from iter_items(value, field)
+
+
+def iter_items(items, key):
+    # lists can be nested (e.g. INSERT values), but not deeply
+    for i, item in enumerate(items):
+        item_key = "{}[{}]".format(key, i)
+        if isinstance(item, AST):
+            yield item, item_key
+        elif isinstance(item, list):
+            yield from iter_items(item, item_key)
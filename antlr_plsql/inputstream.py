@@ -0,0 +1,42 @@
+from antlr4 import InputStream, Token
+
+# Case insensitive input ------------------------------------------------------
+# The lexer grammar only matches uppercase keywords, so the lexer has to see
+# uppercased characters. CaseTransformInputStream stores an uppercased copy
+# of the whole text; these streams uppercase a character when it is read.
+
+
+class UpperCodes(dict):
+    """Maps characters to the code point of their uppercase, filled on demand"""
+
+    def __missing__(self, char):
+        upper = char.upper()
+        # e.g. the uppercase of "ß" is "SS"
+        code = ord(upper) if len(upper) == 1 else ord(char)
+        self[char] = code
+        return code
+
+
+upper_codes = UpperCodes()
+
+
+class CaseInsensitiveInputStream(InputStream):
+    """InputStream that returns uppercased characters to the lexer
+
+    Like CaseTransformInputStream.UPPER, without copying the text:
+    token texts are slices of the original text.
+    """
+
+    def _loadString(self):
+        self._index = 0
+        self._size = len(self.strdata)
+
+    def LA(self, offset):
+        if offset == 0:
+            return 0  # undefined
+        if offset < 0:
+            offset += 1  # e.g., translate LA(-1) to use offset=0
+        pos = self._index + offset - 1
+        if pos < 0 or pos >= self._size:
+            return Token.EOF
+        return upper_codes[self.strdata[pos]]
@@ -0,0 +1,417 @@
+from ast import AST
+
+from antlr4 import ParserRuleContext
+from antlr4.tree.Tree import TerminalNodeImpl
+
+from antlr_ast.ast import BaseNode, BaseNodeRegistry, AliasNode, Terminal
+
+# Detached trees ----------------------------------------------------------------
+# A tree returned by parse references the ANTLR parse tree (and through it the
+# parser and token stream) in the _ctx of every node.
+# dump_tree converts a tree to a state of plain tuples, lists, dicts, strings
+# and ints that is cheap to pickle. It keeps the token positions,
+# so the tree created by load_tree still supports get_text and get_position.
+
+VERSION = 1
+
+ALIAS, NODE, TERMINAL = range(3)
+
+# node attributes that are stored in a dedicated slot of the node state
+NODE_ATTRIBUTES = (
+    "children",
+    "_field_references",
+    "children_by_field",
+    "_label_references",
+    "children_by_label",
+    "_ctx",
+    "position",
+)
+
+
+MISSING = object()
+
+
+class NodeRef(int):
+    """Index of a node in the node table of a state"""
+
+
+class DetachedToken:
+    """Stands in for the ANTLR token a detached node starts or stops at"""
+
+    __slots__ = ("start", "stop", "line", "column", "text")
+
+    def __init__(self, start, stop, line, column, text=None):
+        self.start, self.stop = start, stop
+        self.line, self.column = line, column
+        self.text = text
+
+    def __repr__(self):
+        return "<{} {}:{} {}..{}>".format(
+            self.__class__.__name__, self.line, self.column, self.start, self.stop
+        )
+
+
+class DetachedContext(ParserRuleContext):
+    """Stands in for the ANTLR context of a detached node
+
+    The original text can only be retrieved using node.get_text(full_text).
+    """
+
+    def __init__(self, start, stop):
+        super().__init__()
+        self.start, self.stop = start, stop
+
+    def getText(self):
+        return None
+
+
+class DetachedTerminalNode(TerminalNodeImpl):
+    """Stands in for the ANTLR terminal node of a detached Terminal"""
+
+
+def dump_tree(tree):
+    """Create a detached state of a tree, which can be passed to load_tree"""
+    dumper = TreeDumper()
+    root = dumper.dump(tree)
+    return {
+        "version": VERSION,
+        "tokens": dumper.tokens,
+        "classes": dumper.classes,
+        "keys": dumper.keys,
+        "nodes": dumper.nodes,
+        "root": root,
+    }
+
+
+def load_tree(state, registry=None):
+    """Recreate a tree from a state created by dump_tree"""
+    if state["version"] != VERSION:
+        raise ValueError("Unsupported tree state version: {}".format(state["version"]))
+    return TreeLoader(state, registry).load()
+
+
+def shift_state(state, offset, lines=0, columns=0, first_line=1):
+    """Move the positions in a state, e.g. when the text was part of a larger text
+
+    offset and lines are added to all positions,
+    columns only to those on the first line of the text (or first_line).
+    """
+    tokens = state["tokens"]
+    for i, (start, stop, line, column, text) in enumerate(tokens):
+        if line == first_line:
+            column += columns
+        tokens[i] = (start + offset, stop + offset, line + lines, column, text)
+    return state
+
+
+class TreeDumper:
+    def __init__(self):
+        self.tokens = []
+        self.classes = []
+        self.keys = []
+        self.nodes = []
+        self._token_ids = {}
+        self._class_ids = {}
+        self._keys_ids = {}
+        self._node_ids = {}
+        # nodes that are numbered, in the order of the node table
+        self._pending = []
+
+    def dump(self, tree):
+        # nodes are numbered when they're first referenced and dumped in that
+        # order, so deep trees don't need recursion
+        root = self.dump_value(tree)
+        pending = self._pending
+        i = 0
+        while i < len(pending):
+            self.nodes[i] = self.dump_state(pending[i])
+            i += 1
+        return root
+
+    def dump_value(self, value):
+        if isinstance(value, BaseNode):
+            return self.dump_node(value)
+        elif isinstance(value, list):
+            return [self.dump_value(el) for el in value]
+        elif isinstance(value, dict):
+            return {k: self.dump_value(v) for k, v in value.items()}
+        else:
+            return value
+
+    def dump_node(self, node):
+        key = id(node)
+        if key in self._node_ids:
+            return self._node_ids[key]
+
+        ref = self._node_ids[key] = NodeRef(len(self.nodes))
+        self.nodes.append(None)
+        self._pending.append(node)
+        return ref
+
+    def dump_state(self, node):
+        cls = type(node)
+        attrs = node.__dict__
+        span = self.dump_span(attrs.get("_ctx"))
+
+        if cls is Terminal and is_plain_terminal(node):
+            state = (self.dump_class(TERMINAL, cls), span, node.value)
+        else:
+            if isinstance(node, AliasNode):
+                cls_id = self.dump_class(ALIAS, cls)
+            else:
+                cls_id = self.dump_class(NODE, cls)
+            # children are nodes (or None for error nodes), so store plain indices
+            children = [
+                None if child is None else int(self.dump_node(child))
+                for child in attrs["children"]
+            ]
+            field_references = attrs["_field_references"]
+            label_references = attrs["_label_references"]
+            state = (
+                cls_id,
+                span,
+                attrs.get("position"),
+                children,
+                self.dump_references(field_references),
+                self.dump_references(label_references),
+                self.dump_materialized(
+                    attrs["children_by_field"], field_references, attrs["children"]
+                ),
+                self.dump_materialized(
+                    attrs["children_by_label"], label_references, attrs["children"]
+                ),
+                self.dump_attributes(node),
+            )
+        return state
+
+    def dump_attributes(self, node):
+        attrs = node.__dict__
+        children_by_field = attrs["children_by_field"]
+        children_by_label = attrs["children_by_label"]
+        result = {}
+        for k, v in attrs.items():
+            if k in NODE_ATTRIBUTES:
+                continue
+            # the transformer sets all fields, also when they don't change
+            # skip those that BaseNode.__getattr__ would return anyway
+            default = children_by_label.get(k) or children_by_field.get(k, MISSING)
+            if v is not default:
+                result[k] = self.dump_value(v)
+        return result
+
+    def dump_references(self, references):
+        # most references of a node are None (e.g. all keyword tokens of regular_id)
+        # so only store the others, by their position in a shared tuple of keys
+        keys = tuple(references)
+        keys_id = self._keys_ids.get(keys)
+        if keys_id is None:
+            keys_id = self._keys_ids[keys] = len(self.keys)
+            self.keys.append(keys)
+        # flat list: keys id, followed by pairs of key position and reference
+        result = [keys_id]
+        for i, ref in enumerate(references.values()):
+            if ref is not None:
+                result += (i, ref)
+        return result
+
+    def dump_class(self, kind, cls):
+        key = (kind, cls.__name__)
+        cls_id = self._class_ids.get(key)
+        if cls_id is None:
+            cls_id = self._class_ids[key] = len(self.classes)
+            fields = tuple(cls._fields) if kind == NODE else ()
+            self.classes.append((kind, cls.__name__, fields))
+        return cls_id
+
+    def dump_materialized(self, children_by_x, references, children):
+        # None if it can be recreated from the references to children
+        if is_materialized(children_by_x, references, children):
+            return None
+        return self.dump_value(children_by_x)
+
+    def dump_span(self, ctx):
+        if ctx is None:
+            return None
+        if isinstance(ctx, TerminalNodeImpl):
+            return self.dump_token(ctx.symbol)
+        start, stop = getattr(ctx, "start", None), getattr(ctx, "stop", None)
+        if start is None or stop is None:
+            return None
+        return self.dump_token(start), self.dump_token(stop)
+
+    def dump_token(self, token):
+        key = id(token)
+        token_id = self._token_ids.get(key)
+        if token_id is None:
+            token_id = self._token_ids[key] = len(self.tokens)
+            self.tokens.append(
+                (token.start, token.stop, token.line, token.column, token.text)
+            )
+        return token_id
+
+
+# dynamic node classes are created once for all loaded trees
+# (they only depend on the grammar rule)
+loaded_classes = BaseNodeRegistry()
+
+
+class TreeLoader:
+    def __init__(self, state, registry=None):
+        self.state = state
+        self.registry = registry or loaded_classes
+        self.tokens = [DetachedToken(*token) for token in state["tokens"]]
+        alias_classes = get_alias_classes()
+        self.classes = [
+            self.load_class(alias_classes, *cls) for cls in state["classes"]
+        ]
+        self.keys = state["keys"]
+        self.nodes = []
+        # nodes with the same span share their context
+        self._spans = {}
+
+    def load(self):
+        states = self.state["nodes"]
+        # create all nodes first, so references can be resolved in any order
+        self.nodes = [AST.__new__(self.classes[state[0]][1]) for state in states]
+        for node, state in zip(self.nodes, states):
+            self.load_node(node, state)
+        return self.load_value(self.state["root"])
+
+    def load_class(self, alias_classes, kind, name, fields):
+        if kind == ALIAS:
+            cls = alias_classes[name]
+        elif kind == TERMINAL:
+            cls = Terminal
+        else:
+            cls = self.registry.get_cls(name, tuple(fields))
+        return kind, cls
+
+    def load_value(self, value):
+        if isinstance(value, NodeRef):
+            return self.nodes[value]
+        elif isinstance(value, list):
+            return [self.load_value(el) for el in value]
+        elif isinstance(value, dict):
+            return {k: self.load_value(v) for k, v in value.items()}
+        else:
+            return value
+
+    def load_node(self, node, state):
+        kind, cls = self.classes[state[0]]
+        ctx = self.load_span(state[1])
+        if kind == TERMINAL:
+            node.__dict__.update(
+                children=[state[2]],
+                _field_references={"value": 0},
+                children_by_field={"value": state[2]},
+                _label_references={},
+                children_by_label={},
+                _ctx=ctx,
+                position=None,
+            )
+            return
+
+        (
+            _,
+            _,
+            position,
+            children,
+            field_references,
+            label_references,
+            children_by_field,
+            children_by_label,
+            attrs,
+        ) = state
+        nodes = self.nodes
+        children = [None if child is None else nodes[child] for child in children]
+        field_references, materialized = self.load_references(
+            field_references, children
+        )
+        if children_by_field is None:
+            children_by_field = materialized
+        else:
+            children_by_field = self.load_value(children_by_field)
+        label_references, materialized = self.load_references(
+            label_references, children
+        )
+        if children_by_label is None:
+            children_by_label = materialized
+        else:
+            children_by_label = self.load_value(children_by_label)
+
+        node.__dict__.update(
+            children=children,
+            _field_references=field_references,
+            children_by_field=children_by_field,
+            _label_references=label_references,
+            children_by_label=children_by_label,
+            _ctx=ctx,
+            position=position,
+        )
+        if attrs:
+            node.__dict__.update((k, self.load_value(v)) for k, v in attrs.items())
+
+    def load_references(self, references, children):
+        """The references, and the children they refer to (like materialize)"""
+        keys = self.keys[references[0]]
+        result = dict.fromkeys(keys)
+        materialized = dict.fromkeys(keys)
+        if len(references) == 1:
+            return result, materialized
+        for i in range(1, len(references), 2):
+            key, reference = keys[references[i]], references[i + 1]
+            result[key] = reference
+            if isinstance(reference, list):
+                materialized[key] = [children[index] for index in reference]
+            else:
+                materialized[key] = children[reference]
+        return result, materialized
+
+    def load_span(self, span):
+        if span is None:
+            return None
+        ctx = self._spans.get(span)
+        if ctx is None:
+            if isinstance(span, int):
+                ctx = DetachedTerminalNode(self.tokens[span])
+            else:
+                start, stop = span
+                ctx = DetachedContext(self.tokens[start], self.tokens[stop])
+            self._spans[span] = ctx
+        return ctx
+
+
+def get_alias_classes():
+    from antlr_plsql import ast
+
+    return {cls.__name__: cls for cls in ast.alias_nodes}
+
+
+def is_plain_terminal(node):
+    attrs = node.__dict__
+    return (
+        len(attrs) == len(NODE_ATTRIBUTES)
+        and attrs["_field_references"] == {"value": 0}
+        and not attrs["_label_references"]
+        and attrs["position"] is None
+        and is_materialized(attrs["children_by_field"], {"value": 0}, attrs["children"])
+    )
+
+
+def is_materialized(children_by_x, references, children):
+    """Check whether children_by_x is what materialize(references, children) would create"""
+    if children_by_x.keys() != references.keys():
+        return False
+    for name, reference in references.items():
+        value = children_by_x[name]
+        if isinstance(reference, list):
+            if not isinstance(value, list) or len(value) != len(reference):
+                return False
+            if any(el is not children[i] for el, i in zip(value, reference)):
+                return False
+        elif reference is None:
+            if value is not None:
+                return False
+        elif value is not children[reference]:
+            return False
+    return True
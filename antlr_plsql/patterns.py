@@ -0,0 +1,485 @@
+import ast as pyast
+import sys
+from ast import AST
+from collections import defaultdict
+from functools import lru_cache
+
+from antlr_ast.ast import Terminal
+
+from antlr_plsql import ast
+from antlr_plsql.ast import alias_fields
+
+# Tree patterns ---------------------------------------------------------------
+# Patterns describe nodes of the AST by their class and fields, in Python syntax:
+#
+#   BinaryExpr(op="=", left="id") in JoinExpr.cond
+#
+# matches a BinaryExpr with op "=" and the identifier id as left operand,
+# that is in the cond of a JoinExpr. Patterns are made of
+#
+#   _                   any value
+#   Call                a node of an AST class (see ast.alias_nodes, and Terminal)
+#   Call(name="count")  a node of which the given fields match
+#   "count"             a terminal or identifier with this text (in any case)
+#   None                a field without value
+#   [_, Star]           a list of which the items match, ... matches any items
+#   p | q, ~p           a value matching p or q, a value not matching p
+#   has(p)              a value with a node matching p in it (or that matches p)
+#   p in Cls.field      a node matching p that is in field of a Cls node
+#   p in Cls(...)       a node matching p that is in a node matching Cls(...)
+#
+# Patterns are compiled once to matchers. A PatternSet finds the nodes of a tree
+# that match any of its patterns in a single traversal. Before that, it collects
+# the texts (of terminals and identifiers) in the tree, to leave out the patterns
+# that need a text the tree doesn't have. At every node, it only tries the
+# patterns that can match the node, by its class and the text of a field.
+
+
+class Pattern:
+    """Compiled pattern, see the pattern syntax above"""
+
+    def __init__(self, text):
+        self.text = text
+        node = parse_pattern(text)
+        context = None
+        negate = False
+        texts = set()
+        if isinstance(node, pyast.Compare):
+            compare = node
+            node, context, negate = compile_context(compare)
+            if not negate:
+                texts = get_texts(compare.comparators[0])
+        self.match = compile_node(node)
+        self.classes = get_classes(node)
+        self.key = get_key(node)
+        self.context = context
+        self.negate_context = negate
+        # texts that are in every tree the pattern matches in
+        self.texts = frozenset(texts | get_texts(node))
+
+    def __repr__(self):
+        return "Pattern({!r})".format(self.text)
+
+    def find_all(self, tree):
+        """Nodes of tree that match the pattern, in preorder"""
+        return PatternSet([self]).find_all(tree).get(0, [])
+
+    def match_context(self, path):
+        """Whether the ancestors in path, with the fields to the node, match"""
+        match, field = self.context
+        for ancestor, ancestor_field in reversed(path):
+            if (field is None or field == ancestor_field) and match(ancestor):
+                return not self.negate_context
+        return self.negate_context
+
+
+class PatternSet:
+    """Patterns to find in trees in a single traversal
+
+    patterns is a dict of names to patterns, or a list of patterns
+    (named by their position). Patterns can be Pattern instances or text.
+    """
+
+    def __init__(self, patterns):
+        if not isinstance(patterns, dict):
+            patterns = dict(enumerate(patterns))
+        self.patterns = {
+            name: pattern if isinstance(pattern, Pattern) else compile_pattern(pattern)
+            for name, pattern in patterns.items()
+        }
+        # patterns by one of the texts they need (the longest), and the others
+        self._by_text = defaultdict(list)
+        self._always = []
+        for name, pattern in self.patterns.items():
+            if pattern.texts:
+                text = max(pattern.texts, key=lambda text: (len(text), text))
+                self._by_text[text].append((name, pattern))
+            else:
+                self._always.append((name, pattern))
+        self._table = DispatchTable(self.patterns.items())
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find_all(self, tree):
+        """Nodes of tree matching each pattern, in preorder
+
+        Returns a dict of pattern names to nodes, without the patterns
+        that don't match.
+        """
+        if not self._by_text:
+            return find_all(tree, self._table)
+        texts = collect_texts(tree)
+        patterns = list(self._always)
+        for text in texts:
+            for name, pattern in self._by_text.get(text, ()):
+                if pattern.texts <= texts:
+                    patterns.append((name, pattern))
+        if len(patterns) == len(self.patterns):
+            return find_all(tree, self._table)
+        if not patterns:
+            return {}
+        return find_all(tree, DispatchTable(patterns))
+
+    def find_many(self, trees):
+        """find_all for each tree"""
+        return [self.find_all(tree) for tree in trees]
+
+
+class DispatchTable:
+    """The patterns to try on the nodes of a class"""
+
+    def __init__(self, patterns):
+        # patterns by the class they match, and those that match any node
+        self.by_class = defaultdict(list)
+        self.any = []
+        for name, pattern in patterns:
+            for cls in set(pattern.classes or ()) or (None,):
+                if cls is None:
+                    self.any.append((name, pattern))
+                else:
+                    self.by_class[cls].append((name, pattern))
+        self.tables = {}
+
+    def get(self, node_cls):
+        """Patterns that can match instances of node_cls
+
+        Returns (keyed, rest): the patterns by a field and its text
+        (None for the text of the node), and the others.
+        """
+        # by name and fields, as each parse creates its own node classes
+        key = node_cls.__name__, tuple(node_cls._fields)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = self.make_table(node_cls)
+        return table
+
+    def make_table(self, node_cls):
+        keyed = defaultdict(lambda: defaultdict(list))
+        rest = list(self.any)
+        for cls, patterns in self.by_class.items():
+            if issubclass(node_cls, cls):
+                for name, pattern in patterns:
+                    if pattern.key is None:
+                        rest.append((name, pattern))
+                    else:
+                        key_field, text = pattern.key
+                        keyed[key_field][text].append((name, pattern))
+        return dict(keyed), rest
+
+
+def find_all(tree, table):
+    matches = defaultdict(list)
+    # path holds the ancestors of a node, with the field to the node
+    path = []
+    seen = set()
+    stack = [(root, 0, None) for root in reversed(get_roots(tree))]
+    while stack:
+        node, depth, field = stack.pop()
+        del path[depth:]
+        if depth:
+            path[-1] = (path[-1][0], field)
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+
+        keyed, candidates = table.get(type(node))
+        if keyed:
+            candidates = list(candidates)
+            for key_field, by_text in keyed.items():
+                value = node if key_field is None else getattr(node, key_field, None)
+                candidates += by_text.get(get_text(value), ())
+        for name, pattern in candidates:
+            if pattern.match(node) and (
+                pattern.context is None or pattern.match_context(path)
+            ):
+                matches[name].append(node)
+
+        path.append((node, None))
+        children = list(iter_children(node))
+        for child, child_field in reversed(children):
+            stack.append((child, depth + 1, child_field))
+    return dict(matches)
+
+
+def get_roots(tree):
+    # parse can return a list of nodes
+    return list(iter_items(tree)) if isinstance(tree, list) else [tree]
+
+
+def collect_texts(tree):
+    """Texts of the terminals and identifiers in tree (see get_text)"""
+    texts = set()
+    seen = set()
+    stack = get_roots(tree)
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        text = get_text(node)
+        if text is not None:
+            texts.add(text)
+        for field in alias_fields.get(type(node)) or node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, AST):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(iter_items(value))
+            elif isinstance(value, str):
+                texts.add(value.lower())
+    return texts
+
+
+compile_pattern = lru_cache(maxsize=4096)(Pattern)
+
+
+def iter_children(node):
+    """Child nodes of node with the field they are in"""
+    for field in alias_fields.get(type(node)) or node._fields:
+        value = getattr(node, field, None)
+        if isinstance(value, AST):
+            yield value, field
+        elif isinstance(value, list):
+            for item in iter_items(value):
+                yield item, field
+
+
+def iter_items(items):
+    # lists can be nested (e.g. INSERT values), but not deeply
+    for item in items:
+        if isinstance(item, AST):
+            yield item
+        elif isinstance(item, list):
+            yield from iter_items(item)
+
+
+def get_text(value):
+    """Lowercase text of a terminal or identifier, or None"""
+    if isinstance(value, (str, Terminal)):
+        return str(value).lower()
+    if isinstance(value, ast.Identifier):
+        fields = value.fields
+        if isinstance(fields, list) and all(
+            isinstance(field, (str, Terminal)) for field in fields
+        ):
+            return ".".join(str(field) for field in fields).lower()
+    return None
+
+
+# Compiling -------------------------------------------------------------------
+
+CLASSES = dict({cls.__name__: cls for cls in ast.alias_nodes}, Terminal=Terminal)
+
+NOT_CONSTANT = object()
+
+
+def parse_pattern(text):
+    try:
+        return pyast.parse(text.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ValueError("Invalid pattern {!r}: {}".format(text, e.msg))
+
+
+def unsupported(node):
+    return ValueError("Unsupported pattern: {}".format(pyast.dump(node)))
+
+
+def compile_context(node):
+    """Split p in Cls.field into p, and (Cls matcher, field) and whether it's negated"""
+    if len(node.ops) != 1 or not isinstance(node.ops[0], (pyast.In, pyast.NotIn)):
+        raise unsupported(node)
+    context = node.comparators[0]
+    field = None
+    if isinstance(context, pyast.Attribute):
+        field = context.attr
+        check_fields(get_classes(context.value), [field], context)
+        context = context.value
+    negate = isinstance(node.ops[0], pyast.NotIn)
+    return node.left, (compile_node(context), field), negate
+
+
+def compile_node(node):
+    """Function that returns whether a value matches the pattern node"""
+    if isinstance(node, pyast.Name):
+        if node.id == "_":
+            return lambda value: True
+        cls = get_class(node)
+        return lambda value: isinstance(value, cls)
+
+    if isinstance(node, pyast.Call):
+        if isinstance(node.func, pyast.Name) and node.func.id == "has":
+            if len(node.args) != 1 or node.keywords:
+                raise unsupported(node)
+            return compile_has(compile_node(node.args[0]))
+        if node.args or not isinstance(node.func, pyast.Name):
+            raise unsupported(node)
+        cls = get_class(node.func)
+        names = [keyword.arg for keyword in node.keywords]
+        check_fields((cls,), names, node)
+        fields = [
+            (keyword.arg, compile_node(keyword.value)) for keyword in node.keywords
+        ]
+        return compile_fields(cls, fields)
+
+    constant = get_constant(node)
+    if constant is None:
+        return lambda value: value is None
+    if isinstance(constant, str):
+        text = constant.lower()
+        return lambda value: get_text(value) == text
+
+    if isinstance(node, pyast.List):
+        return compile_list(
+            [None if is_ellipsis(item) else compile_node(item) for item in node.elts]
+        )
+
+    if isinstance(node, pyast.BinOp) and isinstance(node.op, pyast.BitOr):
+        left, right = compile_node(node.left), compile_node(node.right)
+        return lambda value: left(value) or right(value)
+
+    if isinstance(node, pyast.UnaryOp) and isinstance(node.op, pyast.Invert):
+        operand = compile_node(node.operand)
+        return lambda value: not operand(value)
+
+    raise unsupported(node)
+
+
+def compile_fields(cls, fields):
+    def match(value):
+        if not isinstance(value, cls):
+            return False
+        for name, match_field in fields:
+            if not match_field(getattr(value, name, None)):
+                return False
+        return True
+
+    return match
+
+
+def compile_list(items):
+    """Match a list by its items, None items (...) match any items"""
+    if None not in items:
+
+        def match(value):
+            return (
+                isinstance(value, list)
+                and len(value) == len(items)
+                and all(match_item(item) for match_item, item in zip(items, value))
+            )
+
+        return match
+
+    def match_from(value, i, j):
+        if i == len(items):
+            return j == len(value)
+        if items[i] is None:
+            return any(match_from(value, i + 1, k) for k in range(j, len(value) + 1))
+        return j < len(value) and items[i](value[j]) and match_from(value, i + 1, j + 1)
+
+    return lambda value: isinstance(value, list) and match_from(value, 0, 0)
+
+
+def compile_has(match):
+    def has(value):
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if match(value):
+                return True
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, AST):
+                stack.extend(child for child, _ in iter_children(value))
+        return False
+
+    return has
+
+
+def is_ellipsis(node):
+    return get_constant(node) is Ellipsis
+
+
+def get_constant(node):
+    """Value of a constant pattern node, NOT_CONSTANT for other nodes"""
+    if sys.version_info >= (3, 8):
+        return node.value if isinstance(node, pyast.Constant) else NOT_CONSTANT
+    # before Python 3.8, constants are parsed to a node type per kind of value
+    if isinstance(node, pyast.Str):
+        return node.s
+    if isinstance(node, pyast.Num):
+        return node.n
+    if isinstance(node, pyast.NameConstant):
+        return node.value
+    if isinstance(node, pyast.Ellipsis):
+        return Ellipsis
+    return NOT_CONSTANT
+
+
+def get_class(node):
+    cls = CLASSES.get(node.id)
+    if cls is None:
+        raise ValueError("Unknown node class in pattern: {}".format(node.id))
+    return cls
+
+
+def check_fields(classes, names, node):
+    for cls in classes or ():
+        fields = alias_fields.get(cls) or cls._fields
+        for name in names:
+            if name not in fields:
+                raise ValueError(
+                    "Unknown field in pattern: {}.{}".format(cls.__name__, name)
+                )
+
+
+def get_classes(node):
+    """Classes of the nodes the pattern node can match, None for any value"""
+    if isinstance(node, pyast.Name):
+        return None if node.id == "_" else (get_class(node),)
+    if isinstance(node, pyast.Call) and not (
+        isinstance(node.func, pyast.Name) and node.func.id == "has"
+    ):
+        return (get_class(node.func),)
+    if is_text(node):
+        return (Terminal, ast.Identifier)
+    if isinstance(node, pyast.BinOp) and isinstance(node.op, pyast.BitOr):
+        left, right = get_classes(node.left), get_classes(node.right)
+        if left is None or right is None:
+            return None
+        return left + right
+    return None
+
+
+def get_key(node):
+    """A (field, text) the pattern node requires, to look patterns up by
+
+    The field is None for the text of the node itself.
+    """
+    if is_text(node):
+        return None, get_constant(node).lower()
+    if isinstance(node, pyast.Call):
+        for keyword in node.keywords:
+            if is_text(keyword.value):
+                return keyword.arg, get_constant(keyword.value).lower()
+    return None
+
+
+def get_texts(node):
+    """Texts that are in every value the pattern node matches"""
+    if is_text(node):
+        return {get_constant(node).lower()}
+    if isinstance(node, pyast.Attribute):
+        return get_texts(node.value)
+    if isinstance(node, pyast.Call):
+        values = node.args + [keyword.value for keyword in node.keywords]
+        return set().union(*map(get_texts, values))
+    if isinstance(node, pyast.List):
+        return set().union(*map(get_texts, node.elts))
+    if isinstance(node, pyast.BinOp) and isinstance(node.op, pyast.BitOr):
+        return get_texts(node.left) & get_texts(node.right)
+    return set()
+
+
+def is_text(node):
+    return isinstance(get_constant(node), str)
@@ -0,0 +1,675 @@
+import weakref
+from ast import AST
+from collections import deque
+
+from antlr4 import CommonTokenStream, Token
+from antlr4.ListTokenSource import ListTokenSource
+from antlr4.tree.Tree import TerminalNodeImpl
+from antlr4.Token import CommonToken
+
+from antlr_ast.ast import LexerErrorListener, materialize
+
+from antlr_plsql import ast
+from antlr_plsql.inputstream import CaseInsensitiveInputStream
+from antlr_plsql.marshalling import DetachedContext, dump_tree, load_tree, shift_state
+
+# Statement splitting ---------------------------------------------------------
+# Scripts are split on the SEMICOLON tokens that end a statement,
+# so strings, quoted identifiers and comments are handled by the lexer.
+# PL/SQL units contain semicolons, so they only end at a line with a single `/`
+# (which is parsed separately, as a sql_plus_command).
+# Without such a line, the rest of the script is kept together,
+# as each part is parsed using the sql_script rule, this is always safe.
+
+
+def split_script(sql_text):
+    """Split a script in (start, stop) character ranges of its statements
+
+    Every range includes the semicolon ending the statement,
+    and the whitespace and comments preceding the statement
+    (those at the end of the script are part of the last range).
+    """
+    token_stream = ast.lex(sql_text)
+    token_stream.fill()
+    return [
+        (char_start, len(sql_text) if char_stop is None else char_stop)
+        for _, char_start, char_stop in iter_split(token_stream.tokens)
+    ]
+
+
+def iter_split(tokens, char_start=0):
+    """Split tokens (an iterable ending in EOF) in statements
+
+    Yields (tokens, char_start, char_stop) for every statement.
+    The last statement includes the EOF token and has char_stop None.
+    Tokens are only consumed up to a few tokens after the statement.
+    char_start is where the tokens start (the start of a statement).
+    """
+    Lexer = ast.grammar.Lexer
+    semicolon, solidus = Lexer.SEMICOLON, Lexer.SOLIDUS
+    tokens = Lookahead(tokens)
+    statement = []
+    in_block = None
+    # last token on the default channel
+    previous = None
+    # a statement is only yielded when the next one starts,
+    # as trailing whitespace and comments are added to the last statement
+    finished = None
+
+    for token in tokens:
+        if token.type == Token.EOF:
+            break
+        if token.channel != Token.DEFAULT_CHANNEL:
+            statement.append(token)
+            continue
+        if finished is not None:
+            yield finished
+            finished = None
+        if in_block is None:
+            in_block = starts_block(token, tokens.peek(4))
+
+        if in_block:
+            if token.type == solidus and is_on_own_line(
+                token, previous, tokens.peek(1)
+            ):
+                yield statement, char_start, token.start
+                finished = [token], token.start, token.stop + 1
+                statement, char_start = [], token.stop + 1
+                in_block = None
+            else:
+                statement.append(token)
+        elif token.type == semicolon:
+            statement.append(token)
+            finished = statement, char_start, token.stop + 1
+            statement, char_start = [], token.stop + 1
+            in_block = None
+        else:
+            statement.append(token)
+        previous = token
+
+    if finished is not None:
+        if in_block is None:
+            # only whitespace and comments are left, add them to the last statement
+            yield finished[0] + statement + [token], finished[1], None
+            return
+        yield finished
+    yield statement + [token], char_start, None
+
+
+class Lookahead:
+    """Iterator over tokens that can look ahead on the default channel"""
+
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+        self._buffer = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._buffer:
+            return self._buffer.popleft()
+        return next(self._tokens)
+
+    def peek(self, n):
+        """Return the next n tokens on the default channel (or less, at EOF)"""
+        result = [
+            token for token in self._buffer if token.channel == Token.DEFAULT_CHANNEL
+        ][:n]
+        while len(result) < n and not (result and result[-1].type == Token.EOF):
+            token = next(self._tokens, None)
+            if token is None:
+                break
+            self._buffer.append(token)
+            if token.channel == Token.DEFAULT_CHANNEL:
+                result.append(token)
+        return result
+
+
+def starts_block(token, following):
+    """Check whether a statement starting at token is a PL/SQL unit"""
+    Lexer = ast.grammar.Lexer
+    if token.type in (Lexer.DECLARE, Lexer.BEGIN):
+        return True
+    if token.type == Lexer.CREATE:
+        # e.g. CREATE OR REPLACE FUNCTION
+        units = (
+            Lexer.FUNCTION,
+            Lexer.PROCEDURE,
+            Lexer.PACKAGE,
+            Lexer.TRIGGER,
+            Lexer.TYPE,
+        )
+        return any(token.type in units for token in following)
+    return False
+
+
+class ExtentInputStream(CaseInsensitiveInputStream):
+    """CaseInsensitiveInputStream that records how far the lexer looked ahead
+
+    The lexer reads ahead while a longer token can match (e.g. to the end of
+    the text for a `/*` without `*/`) and then seeks back to the end of the
+    token it matched. extent is the index of the furthest character read.
+    """
+
+    def _loadString(self):
+        super()._loadString()
+        self.extent = 0
+
+    def seek(self, index):
+        if self._index > self.extent:
+            self.extent = self._index
+        super().seek(index)
+
+
+def lex_from(sql_text, char_start, extents=None):
+    """Generate the tokens of sql_text from char_start, until and including EOF
+
+    char_start has to be the start of a token (e.g. of a statement), the tokens
+    have the same positions as when lexing all of sql_text. extents (a dict)
+    is filled with the extent of every token by id: the index of the furthest
+    character the lexer read for it (see ExtentInputStream).
+    """
+    input_stream = ExtentInputStream(sql_text)
+    lexer = ast.grammar.Lexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(LexerErrorListener())
+    input_stream.seek(char_start)
+    lexer.line = sql_text.count("\n", 0, char_start) + 1
+    lexer.column = get_column(sql_text, char_start)
+    while True:
+        input_stream.extent = input_stream.index
+        token = lexer.nextToken()
+        if extents is not None:
+            extents[id(token)] = max(input_stream.extent, input_stream.index)
+        yield token
+        if token.type == Token.EOF:
+            return
+
+
+def count_tokens(tokens):
+    """Number of tokens of a statement on the default channel (without EOF)"""
+    return sum(
+        1
+        for token in tokens
+        if token.channel == Token.DEFAULT_CHANNEL and token.type != Token.EOF
+    )
+
+
+def is_on_own_line(token, previous, following):
+    line = token.line
+    return (previous is None or end_line(previous) < line) and (
+        not following or following[0].type == Token.EOF or following[0].line > line
+    )
+
+
+def end_line(token):
+    return token.line + (token.text or "").count("\n")
+
+
+# Parsing ---------------------------------------------------------------------
+
+
+def parse_script(sql_text, strict=False, two_stage=False, pool=None):
+    """Parse a script statement by statement
+
+    For a script without syntax errors, the result is equivalent to
+    ast.parse(sql_text, "sql_script"). Like there, body has the unit statements
+    first and then the sql_plus commands (e.g. `/`), children has them in
+    source order. Positions are relative to sql_text, so get_text(sql_text)
+    works as usual.
+
+    A syntax error only affects the statement it occurs in (when not strict),
+    so the result differs from that of ast.parse for scripts with errors.
+    E.g. a statement after a `/` line without a semicolon in between is kept
+    (as in SQL*Plus), and a stray `*/` only breaks its own statement, while
+    ast.parse drops the statements after them.
+
+    Statements are parsed in this process, reusing the tokens of the splitter,
+    or in parallel by the workers of pool (a batch.ParsePool).
+    """
+    statements, ranges = split_statements(sql_text)
+
+    if pool is None:
+        scripts = [
+            parse_statement(tokens, strict, two_stage) for tokens, _, _ in statements
+        ]
+    else:
+        scripts = parse_statements_in_pool(
+            pool, sql_text, statements, strict, two_stage
+        )
+    result = merge_scripts(scripts)
+    keep_ranges(result, sql_text, ranges)
+    return result
+
+
+def parse_statement(tokens, strict=False, two_stage=False):
+    """Parse the tokens of a statement (see iter_split) to a Script node"""
+    if tokens[-1].type != Token.EOF:
+        tokens = tokens + [create_eof(tokens[-1])]
+    token_stream = CommonTokenStream(ListTokenSource(tokens))
+    antlr_tree, _ = ast.parse_tokens(
+        token_stream, "sql_script", strict=strict, two_stage=two_stage
+    )
+    return ast.shape(antlr_tree)
+
+
+def parse_statements_in_pool(pool, sql_text, statements, strict, two_stage):
+    from antlr_plsql.batch import load_result
+
+    texts = [sql_text[char_start:char_stop] for _, char_start, char_stop in statements]
+    results = pool.parse_detached_many(
+        texts, "sql_script", strict=strict, two_stage=two_stage
+    )
+    scripts = []
+    for (_, char_start, _), (ok, value) in zip(statements, results):
+        if ok:
+            line = sql_text.count("\n", 0, char_start) + 1
+            column = char_start - (sql_text.rfind("\n", 0, char_start) + 1)
+            shift_state(value, char_start, line - 1, column)
+        script = load_result((ok, value))
+        if isinstance(script, ast.ParseError):
+            raise script
+        scripts.append(script)
+    return scripts
+
+
+def create_eof(last_token):
+    eof = CommonToken(
+        last_token.source,
+        Token.EOF,
+        Token.DEFAULT_CHANNEL,
+        last_token.stop + 1,
+        last_token.stop,
+    )
+    eof.text = "<EOF>"
+    text = last_token.text or ""
+    eof.line = end_line(last_token)
+    if "\n" in text:
+        eof.column = len(text) - text.rindex("\n") - 1
+    else:
+        eof.column = last_token.column + len(text)
+    return eof
+
+
+def merge_scripts(scripts):
+    """Combine the Script nodes of consecutive parts of a script
+
+    The body has the unit statements of all parts before their sql_plus
+    commands, like the body of a Script parsed at once.
+    """
+    if len(scripts) == 1:
+        return scripts[0]
+
+    children, field_references, label_references = [], {}, {}
+    children_by_field, children_by_label = {}, {}
+    unit_statements, sql_plus_commands = [], []
+    for script in scripts:
+        is_last = script is scripts[-1]
+        eof = script._field_references.get("EOF")
+        offset = len(children)
+        children += [
+            child for i, child in enumerate(script.children) if is_last or i != eof
+        ]
+        merge_references(
+            field_references, script._field_references, offset, is_last, eof
+        )
+        merge_references(
+            label_references, script._label_references, offset, is_last, eof
+        )
+        merge_children(children_by_field, script.children_by_field, is_last)
+        merge_children(children_by_label, script.children_by_label, is_last)
+
+        # body combines the unit statements and sql_plus commands of each part
+        n_units = len(script.children_by_field.get("unit_statement") or [])
+        n_commands = len(script.children_by_field.get("sql_plus_command") or [])
+        if len(script.body) == n_units + n_commands:
+            unit_statements += script.body[:n_units]
+            sql_plus_commands += script.body[n_units:]
+        else:
+            unit_statements += script.body
+
+    # a part with only whitespace and comments has no stop token
+    first_ctx = scripts[0]._ctx
+    stop = next((s._ctx.stop for s in reversed(scripts) if s._ctx.stop), None)
+    merged = AST.__new__(ast.Script)
+    merged.__dict__.update(
+        children=children,
+        _field_references=field_references,
+        children_by_field=children_by_field,
+        _label_references=label_references,
+        children_by_label=children_by_label,
+        _ctx=DetachedContext(first_ctx.start, stop),
+        position=None,
+        body=unit_statements + sql_plus_commands,
+    )
+    return merged
+
+
+def merge_references(merged, references, offset, is_last, eof):
+    for name, ref in references.items():
+        if isinstance(ref, list):
+            merged.setdefault(name, []).extend(
+                i + offset - (eof is not None and i > eof and not is_last) for i in ref
+            )
+        elif is_last:
+            merged[name] = None if ref is None else ref + offset
+        else:
+            merged.setdefault(name, None)
+
+
+def merge_children(merged, children_by_x, is_last):
+    for name, value in children_by_x.items():
+        if isinstance(value, list):
+            merged.setdefault(name, []).extend(value)
+        elif is_last:
+            merged[name] = value
+        else:
+            merged.setdefault(name, None)
+
+
+# Incremental parsing ---------------------------------------------------------
+# An old statement is reused when the edited text has a statement with the
+# same range and text before the edit, or the same text at the moved range
+# after it: statements start and end at tokens that can't be extended by the
+# text around them, so they have the same tokens. Only the statements in
+# between are parsed, the ones after are copied with their positions moved.
+# This also covers edits that change where statements end, e.g. removing a
+# semicolon or the `/` after a PL/SQL unit.
+#
+# The statement ranges of the scripts returned by parse_script and
+# reparse_script are kept with the text they were split from (while the
+# script is), so only the text around the edit is lexed again. That starts at
+# the first statement the lexer read the edit for (usually the edited one,
+# but e.g. a `/*` without `*/` is read up to the end of the text), a few
+# tokens earlier (splitting looks ahead, see starts_block), and ends at the
+# first statement after the edit that starts where an old statement started.
+# The ranges of the statements before and after that are moved instead.
+# For other scripts, the old text is split first.
+
+# how many tokens (on the default channel) splitting looks ahead at most
+LOOKAHEAD = 4
+
+# (sql_text, ranges) of scripts by id, see keep_ranges
+statement_ranges = {}
+
+
+def reparse_script(
+    script, sql_text, offset, removed, inserted, strict=False, two_stage=False
+):
+    """Update a Script for an edit of the text it was parsed from
+
+    script is the result of parse_script for sql_text,
+    the edit replaces removed characters at offset with inserted.
+    The result is equivalent to parse_script for the edited text,
+    sql_text[:offset] + inserted + sql_text[offset + removed:].
+    (script can also be the result of ast.parse, for a script without
+    syntax errors, see parse_script.)
+    Nodes of statements before the edit are shared with script,
+    those after the edit are detached copies (see marshalling).
+    """
+    if offset < 0 or removed < 0 or offset + removed > len(sql_text):
+        raise ValueError("Edit out of range: {} + {}".format(offset, removed))
+    new_text = sql_text[:offset] + inserted + sql_text[offset + removed :]
+    old_text, old_ranges = statement_ranges.get(id(script), (None, None))
+    if old_text != sql_text:
+        _, old_ranges = split_statements(sql_text)
+    old_statements = [(None, start, stop) for start, stop, _, _ in old_ranges]
+    parts = get_parts(script, old_statements)
+    if parts is None:
+        statements, ranges = split_statements(new_text)
+        result = merge_scripts(
+            [parse_statement(tokens, strict, two_stage) for tokens, _, _ in statements]
+        )
+        keep_ranges(result, new_text, ranges)
+        return result
+    statements, ranges = resplit_statements(
+        new_text, old_ranges, offset, removed, inserted
+    )
+
+    # the ranges of reusable statements, with their children (start, stop)
+    reusable = {
+        (char_start, char_stop): children
+        for (_, char_start, char_stop), children in zip(old_statements, parts)
+        if children is not None
+    }
+    n_prefix = 0
+    for _, char_start, char_stop in statements:
+        if char_stop is None or char_stop > offset:
+            break
+        if (char_start, char_stop) not in reusable:
+            break
+        n_prefix += 1
+    delta = len(inserted) - removed
+    n_suffix, suffix_range = 0, None
+    for _, char_start, char_stop in reversed(statements[n_prefix:]):
+        if char_start < offset + len(inserted):
+            break
+        old_range = (
+            char_start - delta,
+            None if char_stop is None else char_stop - delta,
+        )
+        if old_range not in reusable:
+            break
+        n_suffix, suffix_range = n_suffix + 1, old_range
+    edited = statements[n_prefix : len(statements) - n_suffix]
+
+    scripts = []
+    if n_prefix:
+        _, char_start, char_stop = statements[n_prefix - 1]
+        scripts.append(slice_script(script, 0, reusable[char_start, char_stop][1]))
+    for tokens, char_start, char_stop in edited:
+        if tokens is None:
+            # a statement that wasn't lexed again, next to a syntax error
+            tokens = lex_statement(new_text, char_start, char_stop)
+        scripts.append(parse_statement(tokens, strict, two_stage))
+    if n_suffix:
+        _, char_start, _ = statements[len(statements) - n_suffix]
+        old_start = suffix_range[0]
+        suffix = slice_script(script, reusable[suffix_range][0], len(script.children))
+        lines = new_text.count("\n", 0, char_start) - sql_text.count("\n", 0, old_start)
+        columns = get_column(new_text, char_start) - get_column(sql_text, old_start)
+        if delta or lines or columns:
+            first_line = sql_text.count("\n", 0, old_start) + 1
+            state = shift_state(
+                dump_tree(suffix), delta, lines, columns, first_line=first_line
+            )
+            suffix = load_tree(state)
+        scripts.append(suffix)
+    result = merge_scripts(scripts)
+    keep_ranges(result, new_text, ranges)
+    return result
+
+
+def split_statements(sql_text):
+    """The statements of sql_text (see iter_split) and their ranges (see iter_ranges)"""
+    statements, ranges = zip(*iter_ranges(sql_text))
+    return list(statements), list(ranges)
+
+
+def iter_ranges(sql_text, char_start=0):
+    """Split sql_text from char_start in statements
+
+    Yields each statement (see iter_split) with its range: (char_start,
+    char_stop, number of tokens on the default channel, extent), where extent
+    is the furthest character the lexer read for its tokens (see lex_from).
+    """
+    extents = {}
+    tokens = lex_from(sql_text, char_start, extents)
+    for statement in iter_split(tokens, char_start):
+        tokens, char_start, char_stop = statement
+        extent = max(extents.pop(id(token)) for token in tokens)
+        yield statement, (char_start, char_stop, count_tokens(tokens), extent)
+
+
+def resplit_statements(sql_text, old_ranges, offset, removed, inserted):
+    """Split sql_text after an edit, lexing only the statements around it
+
+    old_ranges are the ranges of the text before the edit (see iter_ranges).
+    Returns the statements (see iter_split), with tokens None for those that
+    weren't lexed again, and their ranges.
+    """
+    # the statements before the first one the lexer read the edit for
+    # are lexed the same
+    first = 0
+    while old_ranges[first][3] < offset:
+        first += 1
+    # start where splitting those can't look ahead to the edit
+    n_tokens = 0
+    while first > 0 and (n_tokens < LOOKAHEAD or not starts_split(old_ranges[first])):
+        first -= 1
+        n_tokens += old_ranges[first][2]
+    delta = len(inserted) - removed
+    old_starts = {old_range[0]: i for i, old_range in enumerate(old_ranges)}
+
+    ranges = old_ranges[:first]
+    statements = [(None, old_range[0], old_range[1]) for old_range in ranges]
+    for statement, new_range in iter_ranges(sql_text, old_ranges[first][0]):
+        char_start = new_range[0]
+        old = old_starts.get(char_start - delta)
+        if (
+            char_start >= offset + len(inserted)
+            and old is not None
+            and starts_split(old_ranges[old])
+            and starts_split(new_range)
+        ):
+            # the rest of the text is the same, and split the same
+            for char_start, char_stop, n_tokens, extent in old_ranges[old:]:
+                if char_stop is not None:
+                    char_stop += delta
+                ranges.append((char_start + delta, char_stop, n_tokens, extent + delta))
+                statements.append((None, char_start + delta, char_stop))
+            break
+        ranges.append(new_range)
+        statements.append(statement)
+    return statements, ranges
+
+
+def starts_split(statement_range):
+    """Check whether splitting can start at a statement (see iter_ranges)
+
+    The `/` after a PL/SQL unit is only split off because of the unit before
+    it, so a statement that can be one (a single character) isn't a start.
+    """
+    char_start, char_stop, n_tokens, _ = statement_range
+    return not (n_tokens == 1 and (char_stop is None or char_stop == char_start + 1))
+
+
+def lex_statement(sql_text, char_start, char_stop):
+    """The tokens of the statement of sql_text at (char_start, char_stop)"""
+    tokens = []
+    for token in lex_from(sql_text, char_start):
+        if char_stop is not None and token.start >= char_stop:
+            break
+        tokens.append(token)
+    return tokens
+
+
+def keep_ranges(script, sql_text, ranges):
+    """Keep the statement ranges of a script parsed from sql_text, while it is"""
+    key = id(script)
+    if key not in statement_ranges:
+        # the id can only be reused once the entry is removed
+        weakref.finalize(script, statement_ranges.pop, key, None)
+    statement_ranges[key] = sql_text, ranges
+
+
+def get_parts(script, statements):
+    """Return the (start, stop) child indices of script for each statement
+
+    script is parsed from the text that was split in statements.
+    Statements next to a child that isn't a node (an error) have None.
+    Returns None if the children can't be matched to the statements.
+    """
+    stops = [
+        float("inf") if char_stop is None else char_stop
+        for _, _, char_stop in statements
+    ]
+    parts = [None] * len(statements)
+    invalid = set()
+    part = previous = 0
+    errors = False
+    for i, child in enumerate(script.children):
+        if child is None:
+            errors = True
+            continue
+        token = get_span(child)[0]
+        if token is None:
+            return None
+        while part < len(stops) and token.start >= stops[part]:
+            part += 1
+        if part == len(stops):
+            return None
+        if errors:
+            # the error can belong to either statement
+            invalid.update((previous, part))
+            errors = False
+        start = i if parts[part] is None else parts[part][0]
+        parts[part] = (start, i + 1)
+        previous = part
+    if errors:
+        invalid.add(previous)
+    for part in invalid:
+        parts[part] = None
+    return parts
+
+
+def get_column(sql_text, index):
+    return index - (sql_text.rfind("\n", 0, index) + 1)
+
+
+def slice_script(script, start, stop):
+    """Create a Script of children[start:stop] of a script (see get_parts)"""
+    children = script.children[start:stop]
+    field_references = slice_references(script._field_references, start, stop)
+    label_references = slice_references(script._label_references, start, stop)
+
+    n_units = len(script._field_references.get("unit_statement") or [])
+    body = []
+    for name, body_start in (("unit_statement", 0), ("sql_plus_command", n_units)):
+        refs = script._field_references.get(name) or []
+        body += [
+            script.body[body_start + j]
+            for j, ref in enumerate(refs)
+            if start <= ref < stop
+        ]
+
+    # slices start with a statement and end with a statement or its semicolon
+    first = script._ctx.start if start == 0 else get_span(children[0])[0]
+    if stop == len(script.children):
+        last = script._ctx.stop
+    else:
+        last = next(
+            get_span(child)[1] for child in reversed(children) if child is not None
+        )
+    result = AST.__new__(ast.Script)
+    result.__dict__.update(
+        children=children,
+        _field_references=field_references,
+        children_by_field=materialize(field_references, children),
+        _label_references=label_references,
+        children_by_label=materialize(label_references, children),
+        _ctx=DetachedContext(first, last),
+        position=None,
+        body=body,
+    )
+    return result
+
+
+def slice_references(references, start, stop):
+    result = {}
+    for name, ref in references.items():
+        if isinstance(ref, list):
+            result[name] = [i - start for i in ref if start <= i < stop]
+        elif ref is not None and start <= ref < stop:
+            result[name] = ref - start
+        else:
+            result[name] = None
+    return result
+
+
+def get_span(node):
+    ctx = node._ctx
+    if isinstance(ctx, TerminalNodeImpl):
+        return ctx.symbol, ctx.symbol
+    return ctx.start, ctx.stop
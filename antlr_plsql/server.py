@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+from time import perf_counter
+from urllib.parse import parse_qs, urlsplit
+
+from antlr_plsql import ast, grammar
+from antlr_plsql.aio import AsyncParser
+from antlr_plsql.batch import WARMUP_QUERIES, parse_or_error
+from antlr_plsql.binary import dumps_binary, loads_binary
+
+# Parse server ----------------------------------------------------------------
+# A long-lived process with a pool of warm parsers, so that every consumer
+# doesn't pay for importing the grammar and warming up the DFA:
+#
+#   python -m antlr_plsql.server --socket /tmp/antlr-plsql.sock
+#   python -m antlr_plsql.server --port 8765
+#
+# It speaks HTTP, on a Unix socket or on localhost:
+#
+#   POST /parse?format=binary  {"sql": "...", "start": "...", "strict": false}
+#       200 with the tree (binary: the complete tree, see binary.py,
+#           json: dump_node as JSON, e.g. for other languages)
+#       400 with {"error": message} if the request is invalid
+#           or the SQL can't be parsed
+#       500 with {"error": message} if answering the request failed
+#   GET /stats
+#       requests, throughput and latency percentiles
+#
+# server.parse is a drop-in for ast.parse that parses with the server at the
+# address in ANTLR_PLSQL_SERVER ("unix:/path/to/socket" or "host:port"):
+#
+#   from antlr_plsql import server
+#   tree = server.parse("SELECT a FROM b")
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+FORMATS = {"binary": "application/octet-stream", "json": "application/json"}
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    504: "Gateway Timeout",
+}
+
+MAX_BODY = 16 * 1024 * 1024
+
+
+def parse_encoded(sql_text, start, strict, two_stage, fmt):
+    """Parse sql_text to (True, encoded tree) or (False, error message)
+
+    Runs in the workers, so the tree doesn't have to be sent back first.
+    """
+    # workers parse for the life of the server
+    with ast.untracked_terminals():
+        result = parse_or_error(sql_text, start, strict, two_stage)
+    if isinstance(result, ast.ParseError):
+        return False, result.msg
+    if fmt == "binary":
+        return True, dumps_binary(result)
+    return True, json.dumps(ast.dump_node(result)).encode("utf-8")
+
+
+# Server ----------------------------------------------------------------------
+
+
+class ParseServer:
+    """Answers parse requests with the workers of an AsyncParser"""
+
+    def __init__(self, parser, timeout=None):
+        self.parser = parser
+        self.timeout = timeout
+        self.started = perf_counter()
+        self.requests = 0
+        self.parse_errors = 0
+        self.bad_requests = 0
+        self.server_errors = 0
+
+    async def start(self, address):
+        """Listen at address ("unix:path" or "host:port"), returns the asyncio server"""
+        path, host, port = split_address(address)
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                try:
+                    response = await self.respond(method, target, body)
+                except Exception as e:
+                    # answer, instead of dropping the connection
+                    self.server_errors += 1
+                    response = error_response(500, "{}: {}".format(type(e).__name__, e))
+                status, content_type, content = response
+                keep_alive = headers.get("connection", "").lower() != "close"
+                write_response(writer, status, content_type, content, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method, target, body):
+        """(status, content type, content) for a request"""
+        url = urlsplit(target)
+        if url.path == "/stats":
+            if method != "GET":
+                return error_response(405, "use GET")
+            return json_response(200, self.get_stats())
+        if url.path != "/parse":
+            return error_response(404, "unknown path {}".format(url.path))
+        if method != "POST":
+            return error_response(405, "use POST")
+
+        self.requests += 1
+        try:
+            args = get_parse_args(url.query, body)
+        except (ValueError, KeyError, TypeError) as e:
+            self.bad_requests += 1
+            return error_response(400, "invalid request: {}".format(e))
+        try:
+            ok, content = await self.parser.call(parse_encoded, args, self.timeout)
+        except asyncio.TimeoutError:
+            return error_response(504, "timed out")
+        if not ok:
+            self.parse_errors += 1
+            return error_response(400, content)
+        return 200, FORMATS[args[-1]], content
+
+    def get_stats(self):
+        """Request counts, throughput and latency percentiles"""
+        uptime = perf_counter() - self.started
+        metrics = self.parser.metrics.as_dict()
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "parse_errors": self.parse_errors,
+            "bad_requests": self.bad_requests,
+            "server_errors": self.server_errors,
+            "throughput": metrics["completed"] / uptime if uptime else 0.0,
+            "workers": self.parser.workers,
+            "parser": metrics,
+        }
+
+
+def get_parse_args(query, body):
+    """Arguments of parse_encoded for a parse request, raises ValueError if invalid"""
+    fmt = parse_qs(query).get("format", ["json"])[0]
+    if fmt not in FORMATS:
+        raise ValueError("no format {!r}".format(fmt))
+    request = json.loads(body.decode("utf-8"))
+    sql_text = request["sql"]
+    if not isinstance(sql_text, str):
+        raise ValueError("sql is not a string")
+    start = request.get("start", "sql_script")
+    # the start rule is called on the parser, so only allow rules
+    if start not in grammar.Parser.ruleNames:
+        raise ValueError("no rule {!r}".format(start))
+    strict = request.get("strict", False)
+    two_stage = request.get("two_stage", False)
+    for name, value in (("strict", strict), ("two_stage", two_stage)):
+        if not isinstance(value, bool):
+            raise ValueError("{} is not a boolean".format(name))
+    return sql_text, start, strict, two_stage, fmt
+
+
+async def read_request(reader):
+    """(method, target, headers, body) of the next request, None at the end"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def write_response(writer, status, content_type, content, keep_alive=True):
+    head = "HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n".format(
+        status, REASONS.get(status, ""), content_type, len(content)
+    )
+    if not keep_alive:
+        head += "Connection: close\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + content)
+
+
+def json_response(status, value):
+    return status, FORMATS["json"], json.dumps(value).encode("utf-8")
+
+
+def error_response(status, message):
+    return json_response(status, {"error": message})
+
+
+def split_address(address):
+    """(path, None, None) for "unix:path", or (None, host, port) for "host:port" """
+    if address.startswith("unix:"):
+        return address[len("unix:") :], None, None
+    host, _, port = address.rpartition(":")
+    return None, host or "127.0.0.1", int(port)
+
+
+async def serve(address, parser, timeout=None, ready=None):
+    """Run a ParseServer at address until cancelled"""
+    parse_server = ParseServer(parser, timeout)
+    server = await parse_server.start(address)
+    if ready is not None:
+        ready(parse_server)
+    try:
+        # wait until cancelled (Server.serve_forever needs Python 3.7)
+        await asyncio.get_event_loop().create_future()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def cancel_remaining_tasks(loop):
+    """Cancel the tasks left on loop (connections, parser workers) and wait for them
+
+    Like asyncio.run does before closing the loop (it needs Python 3.7).
+    """
+    # asyncio.all_tasks is new in Python 3.7, Task.all_tasks is gone in 3.9
+    all_tasks = getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks
+    tasks = [task for task in all_tasks(loop) if not task.done()]
+    if not tasks:
+        return
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+
+# Client ----------------------------------------------------------------------
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection to a server on a Unix socket"""
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class Client:
+    """Parses SQL with a parse server, over a kept-alive connection
+
+    Clients aren't thread-safe, use one per thread.
+    """
+
+    def __init__(self, address=None, timeout=None):
+        self.address = address or os.environ.get("ANTLR_PLSQL_SERVER", DEFAULT_ADDRESS)
+        self.timeout = timeout
+        self._connection = None
+
+    def parse(self, sql_text, start="sql_script", strict=False, two_stage=False):
+        """Parse sql_text like ast.parse, raises ast.ParseError if it can't
+
+        The tree has the same classes, fields and positions as that of
+        ast.parse, with a detached context (see binary.loads_binary).
+        """
+        content = self.request_parse("binary", sql_text, start, strict, two_stage)
+        return loads_binary(content)
+
+    def parse_json(self, sql_text, start="sql_script", strict=False, two_stage=False):
+        """ast.dump_node of the tree of sql_text, as sent in the json format"""
+        content = self.request_parse("json", sql_text, start, strict, two_stage)
+        return json.loads(content.decode("utf-8"))
+
+    def request_parse(self, fmt, sql_text, start, strict, two_stage):
+        body = json.dumps(
+            {"sql": sql_text, "start": start, "strict": strict, "two_stage": two_stage}
+        )
+        status, content = self.request(
+            "POST", "/parse?format={}".format(fmt), body.encode("utf-8")
+        )
+        if status == 400:
+            raise ast.ParseError(json.loads(content.decode("utf-8"))["error"], None)
+        if status != 200:
+            raise RuntimeError(
+                "parse server error {}: {}".format(status, content.decode("utf-8"))
+            )
+        return content
+
+    def stats(self):
+        _, content = self.request("GET", "/stats")
+        return json.loads(content.decode("utf-8"))
+
+    def request(self, method, url, body=None):
+        # a kept-alive connection can be closed by the server: retry once
+        for retry in (False, True):
+            connection = self.connect()
+            try:
+                connection.request(method, url, body)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if retry:
+                    raise
+
+    def connect(self):
+        if self._connection is None:
+            path, host, port = split_address(self.address)
+            if path is not None:
+                self._connection = UnixHTTPConnection(path, self.timeout)
+            else:
+                self._connection = http.client.HTTPConnection(
+                    host, port, timeout=self.timeout
+                )
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+clients = threading.local()
+
+
+def parse(sql_text, start="sql_script", strict=False, two_stage=False):
+    """ast.parse with the parse server at ANTLR_PLSQL_SERVER (or DEFAULT_ADDRESS)"""
+    client = getattr(clients, "client", None)
+    if client is None:
+        client = clients.client = Client()
+    return client.parse(sql_text, start, strict, two_stage)
+
+
+# Command line ----------------------------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve parse requests")
+    parser.add_argument("--socket", help="listen on a Unix socket at this path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, help="number of parse workers")
+    parser.add_argument("--max-queue", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, help="seconds per request")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--dfa-path", help="DFA cache to start from (see dfa.save)")
+    args = parser.parse_args(argv)
+
+    if args.socket:
+        address = "unix:" + args.socket
+    else:
+        address = "{}:{}".format(args.host, args.port)
+    async_parser = AsyncParser(
+        args.workers,
+        args.max_queue,
+        args.executor,
+        WARMUP_QUERIES,
+        args.dfa_path,
+    )
+
+    def ready(parse_server):
+        print(
+            "Parsing at {} with {} workers".format(address, async_parser.workers),
+            flush=True,
+        )
+
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(serve(address, async_parser, args.timeout, ready))
+    try:
+        loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        # let serve close the server
+        task.cancel()
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    finally:
+        cancel_remaining_tasks(loop)
+        async_parser.close()
+        loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
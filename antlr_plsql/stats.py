@@ -0,0 +1,116 @@
+from ast import AST
+from collections import Counter, OrderedDict
+
+from antlr4.error.ErrorListener import ErrorListener
+
+# Parse statistics -------------------------------------------------------------
+# Pass stats to ast.parse to find out where the time of a parse goes:
+#
+#   stats = ParseStats()
+#   tree = ast.parse(sql_text, stats=stats)
+#   stats.full_context.most_common(5)
+#
+# or pass a callable, which is called with the ParseStats after every parse
+# (also when parsing fails).
+#
+# Full context (LL) prediction isn't cached in the DFA, so rules that often
+# need it are usually the ones that make a query slow.
+
+
+class ParseStats:
+    """Statistics of a single parse
+
+    times: wall time in seconds of each stage (lex, parse, visit, transform)
+    tokens: number of tokens, including EOF
+    full_context: number of full context predictions per rule
+    context_sensitivity: number of full context predictions per rule that
+        predicted another alternative than SLL would have
+    ambiguities: number of ambiguities reported per rule
+    syntax_errors: (line, column, message) of the syntax errors the parser
+        recovered from (or raised, in strict mode)
+    nodes: number of nodes in the AST
+    stage: prediction stage that produced the tree (see ast.parse_antlr)
+    cached: whether the tree was taken from the parse cache
+    """
+
+    def __init__(self):
+        self.times = OrderedDict()
+        self.tokens = 0
+        self.full_context = Counter()
+        self.context_sensitivity = Counter()
+        self.ambiguities = Counter()
+        self.syntax_errors = []
+        self.nodes = 0
+        self.stage = None
+        self.cached = False
+
+    @property
+    def total_time(self):
+        return sum(self.times.values())
+
+    def as_dict(self):
+        return {
+            "times": dict(self.times),
+            "total_time": self.total_time,
+            "tokens": self.tokens,
+            "full_context": dict(self.full_context),
+            "context_sensitivity": dict(self.context_sensitivity),
+            "ambiguities": dict(self.ambiguities),
+            "syntax_errors": list(self.syntax_errors),
+            "nodes": self.nodes,
+            "stage": self.stage,
+            "cached": self.cached,
+        }
+
+    def __repr__(self):
+        return "<{} {} tokens, {} nodes, {:.4f}s, {} full context, {} errors>".format(
+            self.__class__.__name__,
+            self.tokens,
+            self.nodes,
+            self.total_time,
+            sum(self.full_context.values()),
+            len(self.syntax_errors),
+        )
+
+
+class StatsListener(ErrorListener):
+    """Error listener that records prediction and error events in a ParseStats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.stats.syntax_errors.append((line, column, msg))
+
+    def reportAmbiguity(
+        self, recognizer, dfa, startIndex, stopIndex, exact, ambigAlts, configs
+    ):
+        self.stats.ambiguities[get_rule_name(recognizer, dfa)] += 1
+
+    def reportAttemptingFullContext(
+        self, recognizer, dfa, startIndex, stopIndex, conflictingAlts, configs
+    ):
+        self.stats.full_context[get_rule_name(recognizer, dfa)] += 1
+
+    def reportContextSensitivity(
+        self, recognizer, dfa, startIndex, stopIndex, prediction, configs
+    ):
+        self.stats.context_sensitivity[get_rule_name(recognizer, dfa)] += 1
+
+
+def get_rule_name(recognizer, dfa):
+    return recognizer.ruleNames[dfa.atnStartState.ruleIndex]
+
+
+def count_nodes(tree):
+    """Number of distinct nodes in an AST (without recursion)"""
+    seen = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, AST) and id(node) not in seen:
+            seen.add(id(node))
+            stack.extend(getattr(node, field, None) for field in node._fields)
+    return len(seen)
@@ -0,0 +1,201 @@
+import codecs
+import mmap
+from collections import namedtuple
+
+from antlr4 import InputStream, Token
+from antlr4.tree.Tree import TerminalNodeImpl
+
+from antlr_ast.ast import LexerErrorListener
+
+from antlr_plsql import ast
+from antlr_plsql.inputstream import upper_codes
+from antlr_plsql.script import iter_split, parse_statement
+
+# Streaming -------------------------------------------------------------------
+# iter_statements lexes a file through a sliding window of its text,
+# splits the tokens in statements (like parse_script) and parses them one by one.
+# Only the text of the current statement is kept in memory
+# (and the trees of the statements the caller keeps).
+
+BLOCK_SIZE = 1 << 20
+
+
+class Statement(
+    namedtuple(
+        "Statement", ["tree", "text", "byte_start", "byte_stop", "char_start", "line"]
+    )
+):
+    """A statement of a streamed file
+
+    tree is the AST of the statement (a Script node), text its source text.
+    Positions in the tree are relative to the file,
+    use statement.get_text(node) instead of node.get_text(full_text).
+    """
+
+    __slots__ = ()
+
+    def get_text(self, node):
+        ctx = node._ctx
+        if isinstance(ctx, TerminalNodeImpl):
+            start = stop = ctx.symbol
+        else:
+            start, stop = ctx.start, ctx.stop
+        return self.text[
+            start.start - self.char_start : stop.stop - self.char_start + 1
+        ]
+
+
+def iter_statements(
+    source, strict=False, two_stage=False, encoding="utf-8", block_size=BLOCK_SIZE
+):
+    """Parse the statements of a file one at a time
+
+    source is a path or a file object. Binary files are memory mapped and decoded
+    using encoding (files that can't be mapped are read in blocks).
+    Yields a Statement for each statement (see split_script),
+    in the same way parse_script parses them.
+    """
+    # os.PathLike is new in Python 3.6, path objects have __fspath__ from then on
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, "rb") as f:
+            yield from iter_statements(f, strict, two_stage, encoding, block_size)
+        return
+
+    input_stream = StreamInputStream(read_text(source, encoding, block_size))
+    lexer = ast.grammar.Lexer(input_stream)
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(LexerErrorListener())
+
+    byte_start = 0
+    for tokens, char_start, char_stop in iter_split(iter_tokens(lexer, input_stream)):
+        if char_stop is None:
+            char_stop = input_stream.index
+        text = input_stream.getText(char_start, char_stop - 1)
+        byte_stop = byte_start + len(text.encode(encoding))
+        with ast.untracked_terminals():
+            tree = parse_statement(tokens, strict, two_stage)
+        line = tokens[0].line - text.count("\n", 0, tokens[0].start - char_start)
+        yield Statement(tree, text, byte_start, byte_stop, char_start, line)
+        byte_start = byte_stop
+        # the text before the next statement is no longer needed
+        input_stream.release(char_stop)
+
+
+def iter_tokens(lexer, input_stream):
+    """Generate the tokens of a lexer, until and including EOF
+
+    Their text is set while it is available in the window of input_stream.
+    """
+    while True:
+        token = lexer.nextToken()
+        if token.type == Token.EOF:
+            token.text = "<EOF>"
+            yield token
+            return
+        token.text = input_stream.getText(token.start, token.stop)
+        yield token
+
+
+def read_text(f, encoding="utf-8", block_size=BLOCK_SIZE):
+    """Generate the text of a file in blocks"""
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        # not a regular file (or empty, which can't be mapped)
+        blocks = iter(lambda: f.read(block_size), f.read(0))
+    else:
+        blocks = (data[i : i + block_size] for i in range(0, len(data), block_size))
+
+    decoder = None
+    for block in blocks:
+        if isinstance(block, str):
+            yield block
+            continue
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(encoding)()
+        yield decoder.decode(block)
+    if decoder is not None:
+        yield decoder.decode(b"", final=True)
+
+
+class StreamInputStream(InputStream):
+    """InputStream over a sliding window of text blocks
+
+    The lexer only looks ahead and seeks back within the current token,
+    so text before the current token can be dropped using release(index).
+    Like CaseInsensitiveInputStream, the lexer sees uppercased characters.
+    """
+
+    def __init__(self, blocks):
+        self.name = "<stream>"
+        self._blocks = iter(blocks)
+        self._window = ""
+        # absolute index of the first character in the window
+        self._offset = 0
+        self._index = 0
+        self._exhausted = False
+
+    @property
+    def size(self):
+        # as long as input is left, the size is unknown
+        while not self._exhausted:
+            self._read_block()
+        return self._offset + len(self._window)
+
+    def _read_block(self):
+        block = next(self._blocks, None)
+        if block is None:
+            self._exhausted = True
+        else:
+            self._window += block
+
+    def _fill(self, index):
+        """Make sure the character at index is in the window, if it exists"""
+        while index >= self._offset + len(self._window) and not self._exhausted:
+            self._read_block()
+        return index < self._offset + len(self._window)
+
+    def reset(self):
+        self.seek(self._offset)
+
+    def consume(self):
+        if not self._fill(self._index):
+            raise Exception("cannot consume EOF")
+        self._index += 1
+
+    def LA(self, offset):
+        if offset == 0:
+            return 0  # undefined
+        if offset < 0:
+            offset += 1  # e.g., translate LA(-1) to use offset=0
+        pos = self._index + offset - 1
+        if pos < self._offset or not self._fill(pos):
+            return Token.EOF
+        return upper_codes[self._window[pos - self._offset]]
+
+    def mark(self):
+        return -1
+
+    def release(self, marker):
+        """Allow dropping the text before marker (an index), unless marker is -1"""
+        marker = min(marker, self._index)
+        # only drop text once it's a large part of the window, to limit copying
+        if marker - self._offset > len(self._window) // 2:
+            self._window = self._window[marker - self._offset :]
+            self._offset = marker
+
+    def seek(self, index):
+        if index < self._offset:
+            raise ValueError("cannot seek before the start of the window")
+        if index > self._index:
+            self._fill(index - 1)
+            index = min(index, self._offset + len(self._window))
+        self._index = index
+
+    def getText(self, start, stop):
+        start = max(start, self._offset)
+        self._fill(stop)
+        return self._window[start - self._offset : stop - self._offset + 1]
+
+    def __str__(self):
+        return self._window
@@ -0,0 +1,99 @@
+from array import array
+from functools import lru_cache
+
+from antlr4 import Token
+
+from antlr_plsql import ast, grammar
+
+# Token tables ----------------------------------------------------------------
+# tokenize lexes a text to a TokenTable: the type, position and channel of
+# every token in parallel arrays, without keeping a CommonToken per token.
+# The arrays support the buffer protocol, e.g. for NumPy:
+#
+#   types = numpy.frombuffer(table.types, dtype=numpy.int32)
+#   keywords = numpy.isin(types, keyword_types)
+#
+# Skipped tokens (whitespace) aren't in the table, hidden ones (comments) are.
+
+TYPECODE = "i"
+
+COLUMNS = ("types", "starts", "stops", "lines", "columns", "channels")
+
+# returned by the lexer instead of the tokens it adds to a table
+EMITTED = Token()
+
+
+class TokenTable:
+    """Tokens of text as parallel arrays
+
+    starts and stops are the offsets of the first and last character of a token
+    in text, lines start at 1 and columns at 0 (like in ANTLR tokens).
+    """
+
+    __slots__ = ("text",) + COLUMNS
+
+    def __init__(self, text):
+        self.text = text
+        for name in COLUMNS:
+            setattr(self, name, array(TYPECODE))
+
+    def __len__(self):
+        return len(self.types)
+
+    @property
+    def names(self):
+        """Symbolic names of the token types (indexed by type)"""
+        return token_names()
+
+    def get_name(self, i):
+        return token_names()[self.types[i]]
+
+    def get_text(self, i):
+        return self.text[self.starts[i] : self.stops[i] + 1]
+
+    @staticmethod
+    def get_type(name):
+        """Token type for a symbolic name, e.g. "SELECT" """
+        return getattr(grammar.Lexer, name)
+
+
+@lru_cache(maxsize=None)
+def token_names():
+    """Symbolic names of the token types of the lexer, indexed by type"""
+    # Lexer.symbolicNames of the generated lexer doesn't line up with the types
+    types = {
+        value: name
+        for name, value in vars(grammar.Lexer).items()
+        if isinstance(value, int) and name.isupper()
+    }
+    return tuple(types.get(i, "<INVALID>") for i in range(max(types) + 1))
+
+
+def tokenize(text):
+    """Lex text to a TokenTable"""
+    table = TokenTable(text)
+    lexer = ast.lex(text).tokenSource
+    (
+        append_type,
+        append_start,
+        append_stop,
+        append_line,
+        append_column,
+        append_channel,
+    ) = (getattr(table, name).append for name in COLUMNS)
+    source = lexer._input
+
+    def emit():
+        append_type(lexer._type)
+        append_start(lexer._tokenStartCharIndex)
+        append_stop(source.index - 1)
+        append_line(lexer._tokenStartLine)
+        append_column(lexer._tokenStartColumn)
+        append_channel(lexer._channel)
+        lexer._token = EMITTED
+
+    lexer.emit = emit
+    next_token = lexer.nextToken
+    while next_token() is EMITTED:
+        pass
+    return table
@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tracemalloc
+
+import yaml
+
+from antlr_plsql import ast
+from antlr_plsql.stats import ParseStats
+
+# Corpus benchmark ------------------------------------------------------------
+# Parses tests/examples and the cases in tests/v0.*.yml and reports the time
+# spent in each stage of ast.parse, tokens per second and peak memory.
+#
+#   python -m benchmarks.corpus --save    # save a baseline
+#   python -m benchmarks.corpus --check   # compare against the baseline
+#
+# (or make benchmark-baseline and make benchmark). Timings depend on the
+# machine and the versions of Python and the ANTLR runtime, so the baseline
+# (baseline.json) isn't committed: save it on the machine that checks.
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "tests")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+STAGES = ("lex", "parse", "visit", "transform")
+
+
+def load_corpus(tests_dir=TESTS_DIR):
+    """Return (name, start rule, text) for all examples and yml cases"""
+    corpus = []
+    examples_dir = os.path.join(tests_dir, "examples")
+    for fname in sorted(os.listdir(examples_dir)):
+        with open(os.path.join(examples_dir, fname), encoding="utf-8") as f:
+            corpus.append((fname, "sql_script", f.read()))
+    for fname in sorted(os.listdir(tests_dir)):
+        if fname.startswith("v0.") and fname.endswith(".yml"):
+            with open(os.path.join(tests_dir, fname), encoding="utf-8") as f:
+                cases = yaml.safe_load(f)["code"]
+            for start, texts in cases.items():
+                for i, text in enumerate(texts):
+                    corpus.append(("{}:{}:{}".format(fname, start, i), start, text))
+    return corpus
+
+
+def run_stages(text, start="sql_script"):
+    """Parse text like ast.parse, returning the time of each stage and the number of tokens"""
+    stats = ParseStats()
+    antlr_tree, _ = ast.parse_antlr(text, start, error_listener=False, stats=stats)
+    ast.shape(antlr_tree, stats)
+    return dict(stats.times), stats.tokens
+
+
+def run_corpus(corpus, repeat=1, warmup=True, memory=False):
+    """Benchmark parsing the corpus
+
+    Stage times are the fastest of repeat passes over the corpus,
+    after a pass to warm up the DFA (unless warmup is False).
+    With memory, an extra pass measures the peak memory of a single parse.
+    """
+    if warmup:
+        for _, start, text in corpus:
+            run_stages(text, start)
+
+    passes = []
+    for _ in range(repeat):
+        stages = dict.fromkeys(STAGES, 0.0)
+        tokens = 0
+        for _, start, text in corpus:
+            times, n_tokens = run_stages(text, start)
+            for stage, seconds in times.items():
+                stages[stage] += seconds
+            tokens += n_tokens
+        passes.append(stages)
+
+    stages = {stage: min(p[stage] for p in passes) for stage in STAGES}
+    total = sum(stages.values())
+    result = {
+        "queries": len(corpus),
+        "tokens": tokens,
+        "stages": stages,
+        "total": total,
+        "tokens_per_second": tokens / total if total else 0.0,
+        "peak_memory": measure_peak_memory(corpus) if memory else None,
+        "python": platform.python_version(),
+    }
+    return result
+
+
+def measure_peak_memory(corpus):
+    peak = 0
+    for _, start, text in corpus:
+        tracemalloc.start()
+        try:
+            run_stages(text, start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+def check(result, baseline, threshold=0.1):
+    """Return a message for every metric that is worse than the baseline by more than threshold"""
+    regressions = []
+    metrics = [("stages." + stage, result["stages"][stage]) for stage in STAGES]
+    metrics += [("total", result["total"]), ("peak_memory", result["peak_memory"])]
+    for name, value in metrics:
+        base = get_metric(baseline, name)
+        if value is not None and base and value > base * (1 + threshold):
+            regressions.append(
+                "{}: {:.4g} > {:.4g} (+{:.0%})".format(
+                    name, value, base, value / base - 1
+                )
+            )
+    value, base = result["tokens_per_second"], baseline.get("tokens_per_second")
+    if base and value < base * (1 - threshold):
+        regressions.append(
+            "tokens_per_second: {:.4g} < {:.4g} ({:.0%})".format(
+                value, base, value / base - 1
+            )
+        )
+    return regressions
+
+
+def get_metric(result, name):
+    value = result
+    for key in name.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def format_result(result):
+    lines = ["{} queries, {} tokens".format(result["queries"], result["tokens"])]
+    for stage in STAGES:
+        seconds = result["stages"][stage]
+        share = seconds / result["total"] if result["total"] else 0
+        lines.append("{:<10} {:8.3f}s {:6.1%}".format(stage, seconds, share))
+    lines.append("{:<10} {:8.3f}s".format("total", result["total"]))
+    lines.append("{:.0f} tokens/s".format(result["tokens_per_second"]))
+    if result["peak_memory"] is not None:
+        lines.append("peak memory {:.1f} MB".format(result["peak_memory"] / 2**20))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing the test corpus")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="save as baseline")
+    parser.add_argument("--check", action="store_true", help="compare to baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--memory", action="store_true", help="measure peak memory")
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.check:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(
+                "No baseline at {}, save one on this machine first with --save "
+                "(make benchmark-baseline)".format(args.baseline),
+                file=sys.stderr,
+            )
+            return 2
+
+    corpus = load_corpus()[: args.limit]
+    result = run_corpus(corpus, args.repeat, args.warmup, args.memory)
+    print(format_result(result))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+    if baseline is not None:
+        if baseline["queries"] != result["queries"]:
+            print(
+                "The baseline is for {} queries, not {}".format(
+                    baseline["queries"], result["queries"]
+                ),
+                file=sys.stderr,
+            )
+            return 2
+        regressions = check(result, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import sys
+import time
+
+from antlr4.tree.Tree import ParseTreeVisitor
+from antlr_ast.ast import BaseAstVisitor, BaseNodeRegistry, BaseNodeTransformer
+from antlr_ast.ast import simplify_tree
+
+from antlr_plsql import ast
+from benchmarks.corpus import load_corpus
+
+# Dispatch benchmark ----------------------------------------------------------
+# Compares shaping (visiting and transforming) the parse trees of the corpus
+# using the dispatch tables of ast.AstVisitor and ast.Transformer to
+# looking up the visit methods by name, like antlr_ast does:
+#
+#   python -m benchmarks.dispatch
+
+
+class NameAstVisitor(ast.AstVisitor):
+    visit = ParseTreeVisitor.visit
+    visitChildren = BaseAstVisitor.visitChildren
+
+
+class NameTransformer(ast.Transformer):
+    visit = BaseNodeTransformer.visit
+    generic_visit = BaseNodeTransformer.generic_visit
+
+
+# the methods of antlr_ast, which check the signature of alias methods per call
+BaseNodeTransformer.bind_alias_nodes.__func__(NameTransformer, ast.alias_nodes)
+
+VISITORS = (
+    ("name", NameAstVisitor, NameTransformer),
+    ("table", ast.AstVisitor, ast.Transformer),
+)
+
+
+def shape(antlr_tree, visitor_cls, transformer_cls):
+    registry = BaseNodeRegistry()
+    start = time.perf_counter()
+    tree = visitor_cls(registry).visit(antlr_tree)
+    visited = time.perf_counter()
+    tree = transformer_cls(registry).visit(tree)
+    tree = simplify_tree(tree, unpack_lists=False)
+    return tree, visited - start, time.perf_counter() - visited
+
+
+def run_dispatch(corpus, repeat=1):
+    """Time shaping the parsed corpus with each kind of dispatch
+
+    Times are the fastest of repeat passes.
+    """
+    antlr_trees = [
+        ast.parse_antlr(text, start, error_listener=False)[0]
+        for _, start, text in corpus
+    ]
+    results = {}
+    for name, visitor_cls, transformer_cls in VISITORS:
+        visit_times, transform_times = [], []
+        for _ in range(repeat):
+            visit_time = transform_time = 0
+            for antlr_tree in antlr_trees:
+                _, visit, transform = shape(antlr_tree, visitor_cls, transformer_cls)
+                visit_time += visit
+                transform_time += transform
+            visit_times.append(visit_time)
+            transform_times.append(transform_time)
+        results[name] = {"visit": min(visit_times), "transform": min(transform_times)}
+    return {"queries": len(corpus), "dispatch": results}
+
+
+def format_result(result):
+    lines = ["{} queries".format(result["queries"])]
+    lines.append("{:<6} {:>9} {:>10}".format("", "visit", "transform"))
+    for name, times in result["dispatch"].items():
+        lines.append(
+            "{:<6} {:8.3f}s {:9.3f}s".format(name, times["visit"], times["transform"])
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare visit method dispatch")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+    print(format_result(run_dispatch(load_corpus()[: args.limit], args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import argparse
+import sys
+import time
+
+from antlr_plsql import ast
+from antlr_plsql.fingerprint import fingerprint
+from benchmarks.corpus import load_corpus
+
+# Fingerprint benchmark -------------------------------------------------------
+# Compares fingerprinting the corpus (see antlr_plsql.fingerprint)
+# to parsing it:
+#
+#   python -m benchmarks.fingerprint
+
+
+def run_fingerprint(corpus, repeat=1):
+    """Time fingerprint and parse over the corpus, after a pass to warm up the DFA
+
+    Times are the fastest of repeat passes.
+    """
+    tasks = (
+        ("fingerprint", lambda start, text: fingerprint(text)),
+        ("parse", lambda start, text: ast.parse(text, start)),
+    )
+    results = {}
+    for name, task in tasks:
+        times = []
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            for _, start_rule, text in corpus:
+                task(start_rule, text)
+            if i:
+                times.append(time.perf_counter() - start)
+        results[name] = min(times)
+    return {"queries": len(corpus), "times": results}
+
+
+def format_result(result):
+    times = result["times"]
+    return "{} queries\nfingerprint {:.3f}s, parse {:.3f}s ({:.0f}x)".format(
+        result["queries"],
+        times["fingerprint"],
+        times["parse"],
+        times["parse"] / times["fingerprint"],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare fingerprint to parse")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+    print(format_result(run_fingerprint(load_corpus()[: args.limit], args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import argparse
+import os
+import sys
+from time import perf_counter
+
+from antlr4 import PredictionMode, Token
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+from antlr4.error.ErrorStrategy import BailErrorStrategy
+from antlr4.error.Errors import ParseCancellationException, RecognitionException
+
+from antlr_plsql import ast
+from benchmarks.corpus import load_corpus
+
+# Grammar profile -------------------------------------------------------------
+# Profiles the prediction of the parser over the corpus, like ANTLR's
+# ProfilingATNSimulator (which the Python runtime doesn't have), and ranks the
+# decisions of the grammar by lookahead depth and full context (LL) fallbacks.
+# It also checks that the corpus parses in SLL mode, to the same ASTs as in LL:
+#
+#   python -m benchmarks.grammar          # print the report
+#   python -m benchmarks.grammar --save   # update grammar_profile.txt
+#
+# Lookahead is the number of tokens prediction looked at, "DFA misses" the
+# prediction steps that weren't cached in the DFA yet (these depend on the
+# parses before, so run on a fresh process to compare reports).
+#
+# The expression rules of plsql.g4 aren't refactored yet: 86 of the 243
+# queries still fail in SLL mode (see grammar_profile.txt).
+
+REPORT_PATH = os.path.join(os.path.dirname(__file__), "grammar_profile.txt")
+
+
+class DecisionInfo:
+    """Prediction statistics of a decision of the parser"""
+
+    def __init__(self, decision, rule):
+        self.decision = decision
+        self.rule = rule
+        self.invocations = 0
+        self.time = 0.0
+        self.sll_total_look = 0
+        self.sll_max_look = 0
+        self.dfa_misses = 0
+        self.ll_fallbacks = 0
+        self.ll_total_look = 0
+        self.ll_max_look = 0
+        self.ambiguities = 0
+        self.context_sensitivities = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class ProfilingATNSimulator(ParserATNSimulator):
+    """Parser ATN simulator that records a DecisionInfo per decision in decisions"""
+
+    def __init__(self, parser, decisions):
+        super().__init__(
+            parser, parser.atn, parser.decisionsToDFA, parser.sharedContextCache
+        )
+        self.decisions = decisions
+        self.info = None
+        self.sll_stop = -1
+        self.ll_stop = -1
+
+    def adaptivePredict(self, input, decision, outerContext):
+        info = self.decisions.get(decision)
+        if info is None:
+            rule_index = self.atn.decisionToState[decision].ruleIndex
+            info = DecisionInfo(decision, self.parser.ruleNames[rule_index])
+            self.decisions[decision] = info
+        self.info = info
+        self.sll_stop = self.ll_stop = -1
+        start = perf_counter()
+        try:
+            return super().adaptivePredict(input, decision, outerContext)
+        finally:
+            info.time += perf_counter() - start
+            info.invocations += 1
+            if self.sll_stop >= 0:
+                look = self.sll_stop - self._startIndex + 1
+                info.sll_total_look += look
+                info.sll_max_look = max(info.sll_max_look, look)
+            if self.ll_stop >= 0:
+                look = self.ll_stop - self._startIndex + 1
+                info.ll_fallbacks += 1
+                info.ll_total_look += look
+                info.ll_max_look = max(info.ll_max_look, look)
+
+    def getExistingTargetState(self, previousD, t):
+        self.sll_stop = self._input.index
+        return super().getExistingTargetState(previousD, t)
+
+    def computeTargetState(self, dfa, previousD, t):
+        self.info.dfa_misses += 1
+        return super().computeTargetState(dfa, previousD, t)
+
+    def computeReachSet(self, closure, t, fullCtx):
+        if fullCtx:
+            self.ll_stop = self._input.index
+        return super().computeReachSet(closure, t, fullCtx)
+
+    def reportAmbiguity(self, dfa, D, startIndex, stopIndex, exact, ambigAlts, configs):
+        self.info.ambiguities += 1
+        super().reportAmbiguity(
+            dfa, D, startIndex, stopIndex, exact, ambigAlts, configs
+        )
+
+    def reportContextSensitivity(self, dfa, prediction, configs, startIndex, stopIndex):
+        self.info.context_sensitivities += 1
+        super().reportContextSensitivity(
+            dfa, prediction, configs, startIndex, stopIndex
+        )
+
+
+def profile_parse(text, start, decisions):
+    """Parse text with LL prediction, recording the decisions it makes
+
+    Returns the number of tokens.
+    """
+    token_stream = ast.lex(text)
+    parser = ast.grammar.Parser(token_stream)
+    parser._interp = ProfilingATNSimulator(parser, decisions)
+    parser._interp.predictionMode = PredictionMode.LL
+    parser.removeErrorListeners()
+    getattr(parser, start)()
+    return len(token_stream.tokens)
+
+
+def check_sll(text, start):
+    """Why text doesn't parse in SLL mode to the same AST as in LL mode, or None
+
+    The reason is the rule and token where SLL prediction failed,
+    or that the ASTs differ.
+    """
+    parser = ast.grammar.Parser(ast.lex(text))
+    parser._interp.predictionMode = PredictionMode.SLL
+    parser._errHandler = BailErrorStrategy()
+    parser.removeErrorListeners()
+    try:
+        sll_tree = getattr(parser, start)()
+    except ParseCancellationException as e:
+        error = e.args[0] if e.args else None
+        if not isinstance(error, RecognitionException):
+            return "SLL failed"
+        return "SLL failed in {} at {}:{} {!r}".format(
+            parser.ruleNames[error.ctx.getRuleIndex()],
+            *get_position(error.offendingToken)
+        )
+    if parser.getTokenStream().LA(1) != Token.EOF:
+        # like in ast.predict, SLL results have to consume all input
+        return "SLL stopped at {}:{} {!r}".format(
+            *get_position(parser.getCurrentToken())
+        )
+    ll_tree, _ = ast.parse_antlr(text, start, error_listener=False)
+    if ast.dump_node(ast.shape(sll_tree)) != ast.dump_node(ast.shape(ll_tree)):
+        return "different AST"
+    return None
+
+
+def get_position(token):
+    return token.line, token.column, token.text
+
+
+def run_grammar_profile(corpus):
+    """Profile the prediction of the corpus and check its SLL conformance"""
+    decisions = {}
+    tokens = 0
+    start_time = perf_counter()
+    for _, start, text in corpus:
+        tokens += profile_parse(text, start, decisions)
+    parse_time = perf_counter() - start_time
+    not_sll = []
+    for name, start, text in corpus:
+        reason = check_sll(text, start)
+        if reason is not None:
+            not_sll.append((name, reason))
+    return {
+        "queries": len(corpus),
+        "tokens": tokens,
+        "parse_time": parse_time,
+        "decisions": [info.as_dict() for info in decisions.values()],
+        "not_sll": not_sll,
+    }
+
+
+def rank_decisions(decisions, key, limit=20):
+    ranked = sorted(decisions, key=lambda info: (-key(info), info["decision"]))
+    return [info for info in ranked[:limit] if key(info)]
+
+
+def rank_rules(decisions, limit=20):
+    """Decision statistics summed per rule, by prediction time"""
+    rules = {}
+    for info in decisions:
+        rule = rules.setdefault(
+            info["rule"],
+            {"rule": info["rule"], "invocations": 0, "time": 0.0, "ll_fallbacks": 0},
+        )
+        rule["invocations"] += info["invocations"]
+        rule["time"] += info["time"]
+        rule["ll_fallbacks"] += info["ll_fallbacks"]
+    return sorted(rules.values(), key=lambda rule: -rule["time"])[:limit]
+
+
+DECISION_HEADER = "{:>8} {:<28} {:>7} {:>8} {:>7} {:>7} {:>7} {:>6} {:>6} {:>6}".format(
+    "decision",
+    "rule",
+    "calls",
+    "time",
+    "misses",
+    "sll max",
+    "sll avg",
+    "ll",
+    "ll max",
+    "ambig",
+)
+
+
+def format_decision(info):
+    return "{:>8} {:<28} {:>7} {:>7.3f}s {:>7} {:>7} {:>7.2f} {:>6} {:>6} {:>6}".format(
+        info["decision"],
+        info["rule"],
+        info["invocations"],
+        info["time"],
+        info["dfa_misses"],
+        info["sll_max_look"],
+        info["sll_total_look"] / info["invocations"],
+        info["ll_fallbacks"],
+        info["ll_max_look"],
+        info["ambiguities"],
+    )
+
+
+def format_result(result):
+    decisions = result["decisions"]
+    prediction_time = sum(info["time"] for info in decisions)
+    sll = result["queries"] - len(result["not_sll"])
+    lines = [
+        "{} queries, {} tokens, {} decisions used".format(
+            result["queries"], result["tokens"], len(decisions)
+        ),
+        "{:.1%} of LL parse time in prediction".format(
+            prediction_time / result["parse_time"] if result["parse_time"] else 0
+        ),
+        "{} of {} queries parse in SLL mode to the same AST".format(
+            sll, result["queries"]
+        ),
+    ]
+    lines += ["  {}: {}".format(name, reason) for name, reason in result["not_sll"]]
+
+    sections = (
+        ("Decisions by max lookahead", lambda info: info["sll_max_look"]),
+        ("Decisions by LL fallbacks", lambda info: info["ll_fallbacks"]),
+        ("Decisions by prediction time", lambda info: info["time"]),
+    )
+    for title, key in sections:
+        lines += ["", title, DECISION_HEADER]
+        lines += [format_decision(info) for info in rank_decisions(decisions, key)]
+
+    lines += ["", "Rules by prediction time"]
+    lines.append("{:<32} {:>8} {:>8} {:>8}".format("rule", "calls", "time", "ll"))
+    for rule in rank_rules(decisions):
+        lines.append(
+            "{:<32} {:>8} {:>7.3f}s {:>8}".format(
+                rule["rule"], rule["invocations"], rule["time"], rule["ll_fallbacks"]
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile grammar prediction")
+    parser.add_argument("--save", action="store_true", help="save the report")
+    parser.add_argument("--report", default=REPORT_PATH)
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+
+    report = format_result(run_grammar_profile(load_corpus()[: args.limit]))
+    print(report)
+    if args.save:
+        with open(args.report, "w") as f:
+            f.write(report + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
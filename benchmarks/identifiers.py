@@ -0,0 +1,99 @@
+import argparse
+import sys
+import time
+
+from antlr_plsql import ast
+from benchmarks.dispatch import shape
+
+# Identifier benchmark --------------------------------------------------------
+# Compares shaping queries that use keywords as identifiers (e.g. date, size)
+# with ast.AstVisitor, which visits regular_id and id_expression contexts with
+# a single token straight to their terminal, to visiting them generically:
+#
+#   python -m benchmarks.identifiers
+#
+# Parsing (prediction) is timed separately, it's the same for both.
+
+KEYWORDS = (
+    "date",
+    "size",
+    "type",
+    "level",
+    "comment",
+    "name",
+    "value",
+    "status",
+    "year",
+    "month",
+    "day",
+    "hour",
+    "data",
+    "text",
+    "length",
+    "number",
+    "result",
+)
+
+
+class GenericIdVisitor(ast.AstVisitor):
+    visitRegular_id = ast.AstVisitor.visitChildren
+    visitId_expression = ast.AstVisitor.visitChildren
+
+
+VISITORS = (("generic", GenericIdVisitor), ("terminal", ast.AstVisitor))
+
+
+def make_query(i):
+    columns = ", ".join(
+        "t.{} AS {}".format(KEYWORDS[(i + j) % len(KEYWORDS)], KEYWORDS[j])
+        for j in range(len(KEYWORDS))
+    )
+    return "SELECT {} FROM t WHERE t.{} > {} ORDER BY level".format(
+        columns, KEYWORDS[i % len(KEYWORDS)], i
+    )
+
+
+def run_identifiers(queries=20, repeat=1):
+    """Time parsing and shaping queries with keyword identifiers
+
+    Times are the fastest of repeat passes.
+    """
+    texts = [make_query(i) for i in range(queries)]
+    parse_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        antlr_trees = [ast.parse_antlr(text)[0] for text in texts]
+        parse_times.append(time.perf_counter() - start)
+    results = {}
+    for name, visitor_cls in VISITORS:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for antlr_tree in antlr_trees:
+                shape(antlr_tree, visitor_cls, ast.Transformer)
+            times.append(time.perf_counter() - start)
+        results[name] = {"shape": min(times), "total": min(times) + min(parse_times)}
+    return {"queries": queries, "parse": min(parse_times), "visitors": results}
+
+
+def format_result(result):
+    lines = ["{} queries, parsing {:.3f}s".format(result["queries"], result["parse"])]
+    lines.append("{:<9} {:>9} {:>9}".format("", "shape", "total"))
+    for name, times in result["visitors"].items():
+        lines.append(
+            "{:<9} {:8.3f}s {:8.3f}s".format(name, times["shape"], times["total"])
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare visiting identifiers")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    print(format_result(run_identifiers(args.queries, args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+from antlr_ast.ast import Terminal
+
+from antlr_plsql import ast
+
+# Literal list benchmark ------------------------------------------------------
+# Compares parsing statements with long lists of literals as usual
+# and with the lists collapsed to LiteralList nodes (see ast.LiteralList):
+#
+#   python -m benchmarks.literal_lists
+#
+# "retained" is the memory held by keeping the tree.
+
+MODES = (("usual", False), ("collapsed", True))
+
+
+def make_in_list(size):
+    values = ", ".join(str(i) for i in range(size))
+    return "SELECT a FROM b WHERE c IN ({})".format(values)
+
+
+def make_insert(size):
+    rows = ", ".join("({0}, 'v{0}', -{0}.5)".format(i) for i in range(size // 3))
+    return "INSERT INTO t (a, b, c) VALUES {}".format(rows)
+
+
+STATEMENTS = (("in", make_in_list), ("insert", make_insert))
+
+
+def run_literal_lists(size=3000, repeat=1):
+    """Time and measure parsing statements with size literals, both ways
+
+    Times are the fastest of repeat parses, after one to warm up the DFA.
+    """
+    results = {}
+    for name, make_statement in STATEMENTS:
+        text = make_statement(size)
+        for mode, literal_lists in MODES:
+            parse = lambda: ast.parse(text, two_stage=True, literal_lists=literal_lists)
+            times = []
+            for i in range(repeat + 1):
+                start = time.perf_counter()
+                parse()
+                if i:
+                    times.append(time.perf_counter() - start)
+            results[name, mode] = {
+                "time": min(times),
+                "retained": measure_retained(parse),
+            }
+    return {"size": size, "statements": results}
+
+
+def measure_retained(parse):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        tree = parse()
+        # antlr_ast keeps every Terminal it creates in debug mode
+        del Terminal.DEBUG_INSTANCES[:]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del tree
+    return retained
+
+
+def format_result(result):
+    lines = ["{} literals".format(result["size"])]
+    statements = result["statements"]
+    for name, _ in STATEMENTS:
+        usual = statements[name, "usual"]
+        collapsed = statements[name, "collapsed"]
+        lines.append(
+            "{}: usual {:.3f}s {:.1f}MB, collapsed {:.3f}s {:.1f}MB "
+            "({:.0f}x faster, {:.0f}x smaller)".format(
+                name,
+                usual["time"],
+                usual["retained"] / 1e6,
+                collapsed["time"],
+                collapsed["retained"] / 1e6,
+                usual["time"] / collapsed["time"],
+                usual["retained"] / collapsed["retained"],
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare parsing long literal lists as usual and collapsed"
+    )
+    parser.add_argument("--size", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    print(format_result(run_literal_lists(args.size, args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from antlr_ast.ast import BaseNode, Terminal
+
+from antlr_plsql import ast
+from antlr_plsql.compact import EMPTY, CompactNode, compact_tree, shared_keys
+from benchmarks.corpus import load_corpus
+
+# Memory benchmark ------------------------------------------------------------
+# Compares the memory used by the trees of the corpus with regular nodes
+# and with compact nodes (see antlr_plsql.compact):
+#
+#   python -m benchmarks.memory
+#
+# "owned" is the size of the nodes and the dicts and lists that only they use,
+# "retained" the memory held by keeping the trees, which includes the ANTLR
+# parse trees and tokens (shared by regular and compact trees).
+
+
+def run_memory(corpus):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        trees = [ast.parse(text, start_rule) for _, start_rule, text in corpus]
+        # antlr_ast keeps every Terminal it creates in debug mode
+        del Terminal.DEBUG_INSTANCES[:]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - start
+        nodes, owned = measure_nodes(trees)
+
+        compact_trees = [compact_tree(tree) for tree in trees]
+        del trees
+        gc.collect()
+        compact_retained = tracemalloc.get_traced_memory()[0] - start
+        compact_nodes, compact_owned = measure_nodes(compact_trees)
+    finally:
+        tracemalloc.stop()
+
+    assert nodes == compact_nodes
+    return {
+        "queries": len(corpus),
+        "nodes": nodes,
+        "owned": owned,
+        "compact_owned": compact_owned,
+        "retained": retained,
+        "compact_retained": compact_retained,
+    }
+
+
+def measure_nodes(trees):
+    """Number of nodes in trees and the memory they own"""
+    seen = set()
+    shared = {id(EMPTY)} | {id(keys) for keys in shared_keys}
+    size = 0
+    stack = list(trees)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, BaseNode) and id(value) not in seen:
+            seen.add(id(value))
+            state = get_state(value)
+            size += sys.getsizeof(value) + owned_size(state, shared)
+            stack.extend(get_nodes(state))
+    return len(seen), size
+
+
+def get_state(node):
+    if isinstance(node, CompactNode) or not hasattr(node, "__dict__"):
+        cls = type(node)
+        names = [name for c in cls.__mro__ for name in getattr(c, "__slots__", ())]
+        # don't touch __dict__, that would create it
+        return [getattr(node, name, None) for name in names]
+    return [node.__dict__]
+
+
+def owned_size(state, shared):
+    """Size of the containers in state, without nodes and shared containers"""
+    size = 0
+    stack = list(state)
+    seen = set()
+    while stack:
+        value = stack.pop()
+        if not isinstance(value, (dict, list, tuple)):
+            continue
+        if id(value) in shared or id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        stack.extend(value.values() if isinstance(value, dict) else value)
+    return size
+
+
+def get_nodes(state):
+    stack = list(state)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, BaseNode):
+            yield value
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+
+
+def format_result(result):
+    nodes = result["nodes"]
+    lines = ["{} queries, {} nodes".format(result["queries"], nodes)]
+    for name in ("owned", "retained"):
+        regular, compact = result[name], result["compact_" + name]
+        lines.append(
+            "{:<9} {:8.1f} MB -> {:8.1f} MB ({:.0f} -> {:.0f} bytes per node, {:.0%})".format(
+                name,
+                regular / 2**20,
+                compact / 2**20,
+                regular / nodes,
+                compact / nodes,
+                compact / regular - 1,
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare memory of compact trees")
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+    print(format_result(run_memory(load_corpus()[: args.limit])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
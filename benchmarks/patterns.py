@@ -0,0 +1,102 @@
+import argparse
+import sys
+import time
+
+from antlr_plsql import ast
+from antlr_plsql.patterns import PatternSet, get_text
+from benchmarks.corpus import load_corpus
+
+# Pattern benchmark -----------------------------------------------------------
+# Finds generated patterns (about the identifiers in the corpus) in the corpus
+# trees with a PatternSet, in a single traversal per tree, and with a traversal
+# per pattern, like checks that loop over the tree for each pattern:
+#
+#   python -m benchmarks.patterns --patterns 1000
+#
+# Traversing per pattern is slow, so it's timed on the first --sample trees.
+
+TEMPLATES = (
+    'BinaryExpr(op="=", left="{}")',
+    '"{}" in SelectStmt.where_clause',
+    'Call(args=[..., "{}", ...])',
+    'SelectStmt(target_list=has("{}"))',
+    '"{}" in JoinExpr.cond',
+)
+
+
+def make_patterns(trees, count):
+    """count patterns about the identifiers in trees"""
+    names = []
+    identifiers = PatternSet({"identifier": "Identifier"})
+    for result in identifiers.find_many(trees):
+        for node in result.get("identifier", []):
+            text = get_text(node)
+            if text and '"' not in text and text not in names:
+                names.append(text)
+    patterns = []
+    while len(patterns) < count:
+        for name in names:
+            template = TEMPLATES[len(patterns) % len(TEMPLATES)]
+            patterns.append(template.format(name))
+        names = [name + "_" for name in names]
+    return patterns[:count]
+
+
+def run_patterns(corpus, count=1000, sample=10):
+    trees = [ast.parse(text, start) for _, start, text in corpus]
+    texts = make_patterns(trees, count)
+
+    start = time.perf_counter()
+    pattern_set = PatternSet(texts)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = pattern_set.find_many(trees)
+    set_time = time.perf_counter() - start
+
+    patterns = list(pattern_set.patterns.values())
+    start = time.perf_counter()
+    for tree, result in zip(trees[:sample], results):
+        for name, pattern in enumerate(patterns):
+            assert pattern.find_all(tree) == result.get(name, [])
+    each_time = time.perf_counter() - start
+    return {
+        "trees": len(trees),
+        "patterns": count,
+        "compile_time": compile_time,
+        "set_time": set_time / len(trees),
+        "each_time": each_time / min(sample, len(trees)),
+        "matches": sum(len(nodes) for result in results for nodes in result.values()),
+    }
+
+
+def format_result(result):
+    return "\n".join(
+        [
+            "{} patterns, compiled in {:.3f}s".format(
+                result["patterns"], result["compile_time"]
+            ),
+            "{} trees, {} matches".format(result["trees"], result["matches"]),
+            "per tree: pattern set {:.2f}ms, traversal per pattern {:.2f}ms "
+            "({:.0f}x faster)".format(
+                result["set_time"] * 1000,
+                result["each_time"] * 1000,
+                result["each_time"] / result["set_time"],
+            ),
+        ]
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time finding patterns in trees")
+    parser.add_argument("--patterns", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=10)
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+    result = run_patterns(load_corpus()[: args.limit], args.patterns, args.sample)
+    print(format_result(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+import json
+import pickle
+import sys
+import time
+import zlib
+
+from antlr_plsql import ast
+from antlr_plsql.binary import dumps_binary, loads_binary
+from antlr_plsql.marshalling import dump_tree, load_tree
+from benchmarks.corpus import load_corpus
+
+# Serialization benchmark -----------------------------------------------------
+# Compares serializing the trees of the corpus with dump_node and json,
+# with dump_tree and pickle, and with dumps_binary (also compressed with zlib),
+# and loading them back:
+#
+#   python -m benchmarks.serialization
+#
+# json.loads only returns dicts (of the dump_node fields), load_tree and
+# loads_binary recreate the complete nodes.
+
+
+def dump_json(tree):
+    return json.dumps(ast.dump_node(tree)).encode("utf-8")
+
+
+def compressed(dumps, loads):
+    """dumps and loads functions for the zlib compressed format"""
+    return (
+        lambda tree: zlib.compress(dumps(tree)),
+        lambda data: loads(zlib.decompress(data)),
+    )
+
+
+def dump_pickle(tree):
+    return pickle.dumps(dump_tree(tree), pickle.HIGHEST_PROTOCOL)
+
+
+def load_pickle(data):
+    return load_tree(pickle.loads(data))
+
+
+FORMATS = (
+    ("json", dump_json, json.loads),
+    ("json+zlib", *compressed(dump_json, json.loads)),
+    ("pickle", dump_pickle, load_pickle),
+    ("binary", dumps_binary, loads_binary),
+    ("binary+zlib", *compressed(dumps_binary, loads_binary)),
+)
+
+
+def run_serialization(corpus, repeat=1):
+    """Time dumping and loading the parsed corpus in each format
+
+    Times are the fastest of repeat passes.
+    """
+    trees = [ast.parse(text, start) for _, start, text in corpus]
+    results = {}
+    for name, dumps, loads in FORMATS:
+        dump_times, load_times = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = [dumps(tree) for tree in trees]
+            dump_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for el in data:
+                loads(el)
+            load_times.append(time.perf_counter() - start)
+        results[name] = {
+            "dump": min(dump_times),
+            "load": min(load_times),
+            "size": sum(len(el) for el in data),
+        }
+    return {"queries": len(corpus), "formats": results}
+
+
+def format_result(result):
+    lines = ["{} queries".format(result["queries"])]
+    lines.append("{:<11} {:>9} {:>9} {:>10}".format("", "dump", "load", "size"))
+    for name, times in result["formats"].items():
+        lines.append(
+            "{:<11} {:8.3f}s {:8.3f}s {:7.1f} KB".format(
+                name, times["dump"], times["load"], times["size"] / 2**10
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare tree serialization formats")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, help="only use the first queries")
+    args = parser.parse_args(argv)
+    result = run_serialization(load_corpus()[: args.limit], args.repeat)
+    print(format_result(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
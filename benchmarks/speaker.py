@@ -0,0 +1,101 @@
+import argparse
+import pkgutil
+import sys
+import time
+from ast import AST
+
+import yaml
+from antlr_ast.ast import Speaker
+
+from antlr_plsql import ast
+
+# Speaker benchmark -----------------------------------------------------------
+# Times describing all nodes and their fields in the trees of the
+# test_print_speaker cases (tests/test_speaker.py), with antlr_ast's Speaker and
+# ast.CompiledSpeaker, one by one (walking the trees) and with a describe_many
+# call per tree:
+#
+#   python -m benchmarks.speaker
+
+CASES = [
+    ("selected_element", "id as id2"),
+    ("binary_expression", "1 + 2"),
+    ("standard_function", "COUNT(*)"),
+    ("selected_element", "id"),
+    ("order_by_clause", "ORDER BY id"),
+    ("subquery", "SELECT x FROM y"),
+    ("order_by_elements", "id ASC"),
+    ("selected_element", "*"),
+    ("unary_expression", "-1"),
+    ("subquery", "SELECT x FROM y UNION SELECT m FROM n"),
+]
+
+FIELD_FMT = "The {field_name} of the {node_name}"
+
+
+def describe_each(speaker, trees):
+    """Describe the nodes of trees and their fields one by one"""
+    messages = []
+    stack = list(reversed(trees))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, AST):
+            messages.append(speaker.describe(node))
+            for field in node._fields:
+                messages.append(speaker.describe(node, field=field, fmt=FIELD_FMT))
+            stack.extend([getattr(node, field, None) for field in node._fields[::-1]])
+    return messages
+
+
+def describe_many(speaker, trees):
+    messages = []
+    for tree in trees:
+        for _, _, message in speaker.describe_many(tree, field_fmt=FIELD_FMT):
+            messages.append(message)
+    return messages
+
+
+def run_speaker(cases=CASES, repeat=1000):
+    """Time describing all nodes and fields of the trees of cases"""
+    cfg = yaml.safe_load(pkgutil.get_data("antlr_plsql", "speaker.yml"))
+    trees = [ast.parse(code, start=start) for start, code in cases]
+    runs = (
+        ("speaker", Speaker(**cfg), describe_each),
+        ("compiled", ast.CompiledSpeaker(**cfg), describe_each),
+        ("describe_many", ast.CompiledSpeaker(**cfg), describe_many),
+    )
+    expected = describe_each(runs[0][1], trees)
+    times = {}
+    for name, speaker, describe in runs:
+        assert describe(speaker, trees) == expected
+        start = time.perf_counter()
+        for _ in range(repeat):
+            describe(speaker, trees)
+        times[name] = (time.perf_counter() - start) / repeat
+    return {"trees": len(trees), "messages": len(expected), "times": times}
+
+
+def format_result(result):
+    lines = ["{} trees, {} messages".format(result["trees"], result["messages"])]
+    base = result["times"]["speaker"]
+    for name, seconds in result["times"].items():
+        lines.append(
+            "{:<14} {:>8.1f}us per message ({:.1f}x)".format(
+                name, seconds / result["messages"] * 1e6, base / seconds
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time describing nodes")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args(argv)
+    print(format_result(run_speaker(repeat=args.repeat)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
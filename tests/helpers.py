@@ -0,0 +1,12 @@
+CHAINS = {
+    "and": ("SELECT a FROM b WHERE ", " AND ", "c{0} = {0}", ""),
+    "or": ("SELECT a FROM b WHERE ", " OR ", "c{0} = {0}", ""),
+    "concat": ("SELECT ", " || ", "c{0}", " FROM b"),
+    "union": ("", " UNION ALL ", "SELECT c{0} FROM b", ""),
+}
+
+
+def make_chain(kind, n):
+    """SQL with a chain of n operands of the given kind (see CHAINS)"""
+    prefix, sep, term, suffix = CHAINS[kind]
+    return prefix + sep.join(term.format(i) for i in range(n)) + suffix
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from antlr_plsql import aio, ast
+from antlr_plsql.aio import AsyncParser, get_percentiles
+
+texts = [
+    "SELECT a FROM b",
+    "SELECT x FROM ____",
+    "SELECT a, b FROM c WHERE a > 1",
+    "UPDATE a SET b = 1",
+]
+
+long_text = "SELECT a FROM b WHERE " + " AND ".join(
+    "a{} = 1".format(i) for i in range(1000)
+)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parse(executor):
+    async def parse():
+        async with AsyncParser(2, executor=executor, warmup=texts[:1]) as parser:
+            tree = await parser.parse(texts[2])
+            trees = await parser.parse_many(texts, strict=True)
+            return tree, trees, parser.metrics
+
+    tree, trees, metrics = run(parse())
+    assert ast.dump_node(tree) == ast.dump_node(ast.parse(texts[2]))
+    assert isinstance(trees[1], ast.ParseError)
+    assert [ast.dump_node(tree) for tree in trees[2:]] == [
+        ast.dump_node(ast.parse(text)) for text in texts[2:]
+    ]
+    assert metrics.completed == 5
+    assert metrics.parse_errors == 1
+    assert metrics.queue_depth == metrics.running == 0
+    assert len(metrics.latencies) == 5
+
+
+def test_parse_error():
+    async def parse():
+        async with AsyncParser(1, executor="thread", warmup=()) as parser:
+            await parser.parse(texts[1], strict=True)
+
+    with pytest.raises(ast.ParseError):
+        run(parse())
+
+
+def test_backpressure():
+    async def parse():
+        async with AsyncParser(1, max_queue=2, executor="thread") as parser:
+            await parser.parse_many(texts * 5)
+            return parser.metrics
+
+    metrics = run(parse())
+    assert metrics.completed == 20
+    assert metrics.max_queue_depth == 2
+
+
+def test_timeout():
+    async def parse():
+        async with AsyncParser(1, executor="thread", warmup=()) as parser:
+            with pytest.raises(asyncio.TimeoutError):
+                await parser.parse(long_text, two_stage=True, timeout=0.01)
+            # queued behind the parse that timed out
+            results = await parser.parse_many(
+                [long_text, texts[0]], two_stage=True, timeout=0.01
+            )
+            return results, parser.metrics
+
+    results, metrics = run(parse())
+    assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+    assert metrics.timeouts == 3
+
+
+def test_cancel():
+    async def parse():
+        async with AsyncParser(1, executor="thread", warmup=()) as parser:
+            first = asyncio.ensure_future(parser.parse(long_text, two_stage=True))
+            second = asyncio.ensure_future(parser.parse(texts[0]))
+            await asyncio.sleep(0)
+            second.cancel()
+            tree = await first
+            with pytest.raises(asyncio.CancelledError):
+                await second
+            return tree, parser.metrics
+
+    tree, metrics = run(parse())
+    assert isinstance(tree, ast.Script)
+    assert metrics.cancelled == 1
+    assert metrics.completed == 1
+
+
+def test_parse_async():
+    async def parse():
+        parser = AsyncParser(2, executor="thread", warmup=())
+        aio.set_default_parser(parser)
+        try:
+            tree = await aio.parse_async(texts[0])
+            trees = await aio.parse_many_async(texts[2:])
+        finally:
+            aio.set_default_parser(None)
+            parser.close()
+        return tree, trees
+
+    tree, trees = run(parse())
+    assert isinstance(tree, ast.Script)
+    assert len(trees) == 2
+
+
+def test_get_percentiles():
+    assert get_percentiles([]) == {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+    assert get_percentiles(range(1, 101)) == {"p50": 50, "p90": 90, "p99": 99}
+    assert get_percentiles([3, 1, 2], (50, 100)) == {"p50": 2, "p100": 3}
@@ -182,3 +182,159 @@ def test_case_insensitivity(stu):
 def test_case_sensitivity(stu):
     lowercase = "select \"Preserve\" from b where b.name = 'Casing'"
     assert repr(ast.parse(lowercase, strict=True)) != repr(ast.parse(stu, strict=True))
+
+
+@pytest.mark.parametrize(
+    "sql_text, strict, stage",
+    [
+        ("SELECT a FROM b WHERE a < 10", False, ast.SLL),
+        ("SELECT a FROM b WHERE a < 10", True, ast.SLL),
+        ("SELECT x FROM ____", False, ast.RECOVERY),
+    ],
+)
+def test_parse_antlr_two_stage(sql_text, strict, stage):
+    _, result_stage = ast.parse_antlr(sql_text, strict=strict, two_stage=True)
+    assert result_stage == stage
+
+
+def test_parse_two_stage_strict():
+    with pytest.raises(ast.ParseError):
+        ast.parse("SELECT x FROM ____", strict=True, two_stage=True)
+
+
+def test_parse_two_stage_counts():
+    ast.stage_counts.clear()
+    ast.parse("SELECT a FROM b", two_stage=True)
+    ast.parse("SELECT a FROM b")
+    assert ast.stage_counts == {ast.SLL: 1}
+
+
+def test_normalize_terminal():
+    names = [ast.normalize_terminal(text) for text in ["Foo", "foo", "FOO", "foo"]]
+    assert names == ["foo"] * 4
+    assert len({id(name) for name in names}) == 1
+    assert ast.normalize_terminal("'Foo'") == "'Foo'"
+    assert ast.normalize_terminal('"Foo"') == '"Foo"'
+
+
+def test_lex_keeps_original_text():
+    tokens = ast.lex("select 'Straße' from b")
+    tokens.fill()
+    assert [token.text for token in tokens.tokens] == [
+        "select",
+        "'Straße'",
+        "from",
+        "b",
+        "<EOF>",
+    ]
+
+
+def test_transformer_dispatch():
+    transformer = ast.Transformer(ast.BaseNodeRegistry())
+    assert transformer.dispatch["Where_clause"] == transformer.visit_Where_clause
+    # alias node methods, bound by bind_alias_nodes
+    assert transformer.dispatch["Query_block"] == transformer.visit_Query_block
+    assert "InExpr" in transformer.dispatch
+
+
+def test_visitor_dispatch():
+    sql_text = "SELECT a FROM b WHERE c IN (1, 2) AND d = 'e'"
+    tree = ast.parse(sql_text, "subquery")
+    visitor = ast.AstVisitor(ast.BaseNodeRegistry())
+    visitor.visit(ast.parse_antlr(sql_text, "subquery")[0])
+    ctx_names = {ctx_cls.__name__ for ctx_cls in visitor.methods}
+    assert {"AndExprContext", "InExprContext", "TerminalNodeImpl"} <= ctx_names
+    assert isinstance(tree.where_clause, ast.BinaryExpr)
+
+
+@pytest.fixture
+def short_literal_lists(monkeypatch):
+    monkeypatch.setattr(ast, "LITERAL_LIST_MIN", 3)
+
+
+@pytest.mark.parametrize(
+    "sql_text, values",
+    [
+        ("SELECT a FROM b WHERE c IN (1, -2, 'x', NULL)", ["1", "-2", "'x'", "NULL"]),
+        ("SELECT a FROM b WHERE c NOT IN (1, /* d */ 2.5, 3)", ["1", "2.5", "3"]),
+    ],
+)
+def test_literal_list_in(short_literal_lists, sql_text, values):
+    where = ast.parse(sql_text, literal_lists=True).body[0].where_clause
+    expected = ast.parse(sql_text).body[0].where_clause
+    if isinstance(where, ast.UnaryExpr):
+        where, expected = where.expr, expected.expr
+    assert isinstance(where.right, ast.LiteralList)
+    assert where.right.values == values
+    assert where.right.get_text(sql_text) == sql_text[sql_text.index("(") :]
+    assert ast.dump_node(where.right.items) == ast.dump_node(expected.right)
+    assert_same_positions(where.right.items, expected.right, sql_text)
+
+
+def test_literal_list_insert_rows(short_literal_lists):
+    sql_text = "INSERT INTO t VALUES (1, 'a'),\n  (-2, 'b')"
+    values = ast.parse(sql_text, literal_lists=True).body[0].values
+    expected = ast.parse(sql_text).body[0].values
+    assert len(values) == 1
+    assert values[0].values == ["1", "'a'", "-2", "'b'"]
+    assert ast.dump_node(values[0].items) == ast.dump_node(expected)
+    assert_same_positions(values[0].items, expected, sql_text)
+
+
+def assert_same_positions(items, expected, sql_text):
+    def get_positions(items):
+        # quoted strings are lists of terminals
+        nodes = []
+        for item in items:
+            nodes.extend(item if isinstance(item, list) else [item])
+        return [(node.get_position(), node.get_text(sql_text)) for node in nodes]
+
+    assert get_positions(items) == get_positions(expected)
+
+
+def test_literal_list_is_opt_in(short_literal_lists):
+    tree = ast.parse("SELECT a FROM b WHERE c IN (1, 2, 3)")
+    assert isinstance(tree.body[0].where_clause.right, list)
+
+
+@pytest.mark.parametrize(
+    "sql_text",
+    [
+        "SELECT a FROM b WHERE c IN (1, 2)",
+        "SELECT a FROM b WHERE c IN (1, 2, d)",
+        "SELECT a FROM b WHERE c IN (1, 2, f(3))",
+        "SELECT a FROM b WHERE c IN (1, 2, - - 3)",
+        "SELECT a FROM b WHERE (c, d) IN ((1, 2), (3, 4), (5, 6))",
+        "SELECT a FROM b WHERE c IN (SELECT 1 FROM d)",
+        "INSERT INTO t VALUES (1, 2, 3), (4, d)",
+        "SELECT f(1, 2, 3) FROM b",
+    ],
+)
+def test_literal_list_not_collapsed(short_literal_lists, sql_text):
+    tree = ast.parse(sql_text, literal_lists=True)
+    expected = ast.parse(sql_text)
+    assert ast.dump_node(tree) == ast.dump_node(expected)
+
+
+class GenericIdVisitor(ast.AstVisitor):
+    visitRegular_id = ast.AstVisitor.visitChildren
+    visitId_expression = ast.AstVisitor.visitChildren
+
+
+@pytest.mark.parametrize(
+    "sql_text",
+    [
+        "SELECT date, size, a.b FROM t",
+        'SELECT "Date", "a".comment FROM t AS x',
+        "SELECT count(id) OVER (PARTITION BY type) FROM t WHERE level > 1",
+    ],
+)
+def test_visit_identifiers(monkeypatch, sql_text):
+    antlr_tree, _ = ast.parse_antlr(sql_text, "sql_script")
+    tree = ast.AstVisitor(ast.BaseNodeRegistry()).visit(antlr_tree)
+    generic_tree = GenericIdVisitor(ast.BaseNodeRegistry()).visit(antlr_tree)
+    assert ast.count_nodes(tree) < ast.count_nodes(generic_tree)
+
+    expected = ast.parse(sql_text)
+    monkeypatch.setattr(ast, "AstVisitor", GenericIdVisitor)
+    assert ast.dump_node(ast.parse(sql_text)) == ast.dump_node(expected)
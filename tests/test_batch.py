@@ -0,0 +1,55 @@
+import pytest
+from antlr_plsql import ast
+from antlr_plsql.batch import ParsePool, parse_many
+from tests.helpers import make_chain
+
+texts = [
+    "SELECT a FROM b",
+    "SELECT x FROM ____",
+    "SELECT a, b FROM c WHERE a > 1",
+    "UPDATE a SET b = 1",
+]
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with ParsePool(workers=2, warmup=texts[:1]) as pool:
+        yield pool
+
+
+def test_parse_many_in_order(pool):
+    trees = pool.parse_many(texts, chunksize=2)
+    assert [ast.dump_node(tree) for tree in trees] == [
+        ast.dump_node(ast.parse(text)) for text in texts
+    ]
+
+
+def test_parse_many_reports_errors(pool):
+    trees = pool.parse_many(texts, strict=True)
+    assert isinstance(trees[1], ast.ParseError)
+    assert trees[1].msg.startswith("line 1:")
+    assert ast.dump_node(trees[2]) == ast.dump_node(ast.parse(texts[2]))
+
+
+def test_parse_many_start(pool):
+    trees = pool.parse_many(["a < 1", "b = 2"], start="expression")
+    assert [tree.op for tree in trees] == ["<", "="]
+
+
+def test_parse_many_deep_chain(pool):
+    sql_text = make_chain("and", 1500)
+    (tree,) = pool.parse_many([sql_text], two_stage=True)
+    flat = ast.dump_node(ast.flatten_chains(ast.parse(sql_text, two_stage=True)))
+    assert ast.dump_node(ast.flatten_chains(tree)) == flat
+
+
+def test_parse_many_in_process():
+    trees = parse_many(texts, strict=True, workers=0)
+    assert isinstance(trees[1], ast.ParseError)
+    assert repr(trees[0]) == repr(ast.parse(texts[0]))
+
+
+def test_parse_many_untracked_terminals():
+    instances = len(ast.Terminal.DEBUG_INSTANCES)
+    parse_many(texts, workers=0)
+    assert len(ast.Terminal.DEBUG_INSTANCES) == instances
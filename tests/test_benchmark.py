@@ -0,0 +1,242 @@
+import pkgutil
+
+import yaml
+from antlr_ast.ast import Speaker
+
+from antlr_plsql import ast
+from antlr_plsql.compact import compact_tree
+from antlr_plsql.fingerprint import fingerprint
+from antlr_plsql.patterns import PatternSet
+from benchmarks import dispatch, identifiers, literal_lists, serialization
+from benchmarks.corpus import STAGES, check, load_corpus, main, run_corpus
+from benchmarks.dispatch import run_dispatch, shape
+from benchmarks.fingerprint import run_fingerprint
+from benchmarks.grammar import format_result, run_grammar_profile
+from benchmarks.identifiers import run_identifiers
+from benchmarks.literal_lists import run_literal_lists
+from benchmarks.memory import measure_nodes, run_memory
+from benchmarks.patterns import make_patterns, run_patterns
+from benchmarks.serialization import run_serialization
+from benchmarks.speaker import describe_each, describe_many, run_speaker
+
+
+def test_load_corpus():
+    corpus = load_corpus()
+    starts = {start for _, start, _ in corpus}
+    assert len(corpus) > 187
+    assert {"sql_script", "subquery"} <= starts
+
+
+def test_run_corpus():
+    corpus = [
+        ("a", "sql_script", "SELECT a FROM b"),
+        ("b", "subquery", "SELECT c FROM d"),
+    ]
+    result = run_corpus(corpus, warmup=False, memory=True)
+
+    assert set(result["stages"]) == set(STAGES)
+    assert result["queries"] == 2
+    assert result["tokens"] == 2 * 5  # including EOF
+    assert result["tokens_per_second"] > 0
+    assert result["peak_memory"] > 0
+    assert check(result, result) == []
+
+
+def test_check():
+    baseline = {
+        "stages": dict.fromkeys(STAGES, 1.0),
+        "total": 4.0,
+        "tokens_per_second": 100,
+        "peak_memory": 1000,
+    }
+    result = dict(baseline, stages=dict(baseline["stages"], parse=1.05))
+    assert check(result, baseline, threshold=0.1) == []
+
+    result = dict(result, stages=dict(baseline["stages"], parse=1.5), total=4.5)
+    result["tokens_per_second"] = 80
+    regressions = check(result, baseline, threshold=0.1)
+    assert [regression.split(":")[0] for regression in regressions] == [
+        "stages.parse",
+        "total",
+        "tokens_per_second",
+    ]
+
+
+def test_check_missing_baseline(tmpdir, capsys):
+    baseline = str(tmpdir.join("baseline.json"))
+    assert main(["--check", "--baseline", baseline, "--limit", "1"]) == 2
+    err = capsys.readouterr().err
+    assert "No baseline at {}".format(baseline) in err
+    assert "make benchmark-baseline" in err
+
+    assert main(["--save", "--baseline", baseline, "--limit", "1"]) == 0
+    assert main(["--check", "--baseline", baseline, "--limit", "2"]) == 2
+    assert "The baseline is for 1 queries, not 2" in capsys.readouterr().err
+
+
+def test_run_memory():
+    corpus = [
+        ("a", "sql_script", "SELECT a FROM b WHERE c = 1"),
+        ("b", "subquery", "SELECT c FROM d"),
+    ]
+    result = run_memory(corpus)
+    assert result["queries"] == 2
+    assert 0 < result["compact_owned"] < result["owned"]
+
+    trees = [ast.parse(text, start) for _, start, text in corpus]
+    compact_trees = [compact_tree(tree) for tree in trees]
+    assert [repr(tree) for tree in compact_trees] == [repr(tree) for tree in trees]
+    assert [ast.dump_node(tree) for tree in compact_trees] == [
+        ast.dump_node(tree) for tree in trees
+    ]
+    assert measure_nodes(compact_trees)[0] == measure_nodes(trees)[0]
+
+
+def test_run_serialization():
+    corpus = [("a", "sql_script", "SELECT a FROM b WHERE c = 1")]
+    result = run_serialization(corpus)
+    assert result["queries"] == 1
+    assert set(result["formats"]) == {name for name, _, _ in serialization.FORMATS}
+
+    tree = ast.parse(corpus[0][2])
+    for name, dumps, loads in serialization.FORMATS:
+        loaded = loads(dumps(tree))
+        if name.startswith("json"):
+            # json only loads the dicts of dump_node
+            assert loaded == ast.dump_node(tree)
+        else:
+            assert repr(loaded) == repr(tree)
+            assert ast.dump_node(loaded) == ast.dump_node(tree)
+
+
+def mask_literals(node, literals):
+    """dump_node output with the terminals of literals replaced by ?"""
+    if isinstance(node, list):
+        return [mask_literals(el, literals) for el in node]
+    if not isinstance(node, dict):
+        return node
+    if node["type"] == "Terminal" and node["data"]["value"] in literals:
+        return "?"
+    data = {key: mask_literals(value, literals) for key, value in node["data"].items()}
+    return {"type": node["type"], "data": data}
+
+
+def test_run_fingerprint():
+    corpus = [
+        ("a", "sql_script", "SELECT a FROM b WHERE c > 1 AND d = 'x'"),
+        ("b", "sql_script", "select a\n  from b where c > 2.5 and d = 'y'"),
+        ("c", "sql_script", "SELECT a FROM b WHERE c > 1 OR d = 'x'"),
+        ("d", "sql_script", "SELECT a FROM b WHERE c > e AND d = 'x'"),
+    ]
+    result = run_fingerprint(corpus)
+    assert result["queries"] == 4
+
+    # queries have the same fingerprint if they parse to the same tree,
+    # besides their literals
+    fingerprints, trees = [], []
+    for _, start, text in corpus:
+        result, literals = fingerprint(text, literals=True)
+        fingerprints.append(result)
+        trees.append(mask_literals(ast.dump_node(ast.parse(text, start)), literals))
+    assert [[other == result for other in fingerprints] for result in fingerprints] == [
+        [other == tree for other in trees] for tree in trees
+    ]
+    assert fingerprints[0] == fingerprints[1] != fingerprints[2]
+
+
+def test_run_dispatch():
+    corpus = [("a", "sql_script", "SELECT a FROM b WHERE c IN (1, 2)")]
+    result = run_dispatch(corpus)
+    assert result["queries"] == 1
+    assert set(result["dispatch"]) == {name for name, _, _ in dispatch.VISITORS}
+
+    antlr_tree = ast.parse_antlr(corpus[0][2], error_listener=False)[0]
+    expected = ast.parse(corpus[0][2])
+    for _, visitor_cls, transformer_cls in dispatch.VISITORS:
+        tree = shape(antlr_tree, visitor_cls, transformer_cls)[0]
+        assert repr(tree) == repr(expected)
+        assert ast.dump_node(tree) == ast.dump_node(expected)
+
+
+def test_run_identifiers():
+    result = run_identifiers(queries=2)
+    assert result["queries"] == 2
+    assert set(result["visitors"]) == {name for name, _ in identifiers.VISITORS}
+
+    for i in range(2):
+        antlr_tree = ast.parse_antlr(identifiers.make_query(i))[0]
+        generic, terminal = [
+            shape(antlr_tree, visitor_cls, ast.Transformer)[0]
+            for _, visitor_cls in identifiers.VISITORS
+        ]
+        assert ast.dump_node(terminal) == ast.dump_node(generic)
+
+
+def test_run_literal_lists():
+    result = run_literal_lists(size=150)
+    assert result["size"] == 150
+    assert set(result["statements"]) == {
+        (name, mode)
+        for name, _ in literal_lists.STATEMENTS
+        for mode, _ in literal_lists.MODES
+    }
+
+    text = literal_lists.make_in_list(150)
+    usual = ast.parse(text, two_stage=True).body[0].where_clause.right
+    collapsed = ast.parse(text, two_stage=True, literal_lists=True)
+    collapsed = collapsed.body[0].where_clause.right
+    assert isinstance(collapsed, ast.LiteralList)
+    assert ast.dump_node(collapsed.items) == ast.dump_node(usual)
+
+    text = literal_lists.make_insert(150)
+    usual = ast.parse(text, two_stage=True).body[0].values
+    collapsed = ast.parse(text, two_stage=True, literal_lists=True).body[0].values
+    assert isinstance(collapsed[0], ast.LiteralList)
+    assert ast.dump_node(collapsed[0].items) == ast.dump_node(usual)
+
+
+def test_run_grammar_profile():
+    corpus = [
+        ("a", "sql_script", "SELECT a FROM b WHERE c IN (1, 2)"),
+        ("b", "sql_script", "SELECT a AS b FROM c"),
+    ]
+    result = run_grammar_profile(corpus)
+
+    assert result["queries"] == 2
+    assert result["not_sll"] == [("b", "SLL failed in sql_script at 1:9 'AS'")]
+    rules = {info["rule"] for info in result["decisions"]}
+    assert {"expression", "selected_element"} <= rules
+    assert all(info["invocations"] for info in result["decisions"])
+    assert "1 of 2 queries parse in SLL mode" in format_result(result)
+
+
+def test_run_patterns():
+    corpus = [
+        ("a", "sql_script", "SELECT a FROM b JOIN c ON b.id = c.id WHERE d = 1"),
+        ("b", "sql_script", "SELECT f(a) FROM b WHERE a IN (SELECT e FROM g)"),
+    ]
+    result = run_patterns(corpus, count=20)
+    assert result["trees"] == 2
+    assert result["patterns"] == 20
+
+    trees = [ast.parse(text, start) for _, start, text in corpus]
+    pattern_set = PatternSet(make_patterns(trees, 20))
+    results = pattern_set.find_many(trees)
+    for tree, found in zip(trees, results):
+        for name, pattern in enumerate(pattern_set.patterns.values()):
+            assert found.get(name, []) == pattern.find_all(tree)
+    matches = sum(len(nodes) for found in results for nodes in found.values())
+    assert result["matches"] == matches > 0
+
+
+def test_run_speaker():
+    cases = [("subquery", "SELECT x FROM y"), ("binary_expression", "1 + 2")]
+    result = run_speaker(cases=cases, repeat=1)
+    assert result["trees"] == 2
+
+    cfg = yaml.safe_load(pkgutil.get_data("antlr_plsql", "speaker.yml"))
+    trees = [ast.parse(code, start=start) for start, code in cases]
+    expected = describe_each(Speaker(**cfg), trees)
+    assert describe_each(ast.CompiledSpeaker(**cfg), trees) == expected
+    assert describe_many(ast.CompiledSpeaker(**cfg), trees) == expected
+    assert result["messages"] == len(expected)
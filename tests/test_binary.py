@@ -0,0 +1,83 @@
+import pytest
+
+from antlr_plsql import ast
+from antlr_plsql.binary import dumps_binary, loads_binary
+from antlr_plsql.compact import compact_tree
+from antlr_plsql.marshalling import DetachedContext
+from tests.test_marshalling import walk
+
+
+@pytest.mark.parametrize(
+    "sql_text, start",
+    [
+        ("SELECT a, b FROM x WHERE a < 10;", "sql_script"),
+        ("SELECT CURSOR (SELECT a FROM b) FROM c", "sql_script"),
+        ("SELECT a FROM x UNION SELECT b FROM y ORDER BY 1", "subquery"),
+        ("CREATE TABLE a (b INTEGER PRIMARY KEY, c VARCHAR(10))", "sql_script"),
+        ("SELECT 'Straße', \"Quoted\" FROM y", "sql_script"),
+        ("x IN (1, 'a', y)", "expression"),
+        ("-1", "unary_expression"),
+        ("WHERE (1, 2, 3)", "where_clause"),
+    ],
+)
+def test_round_trip(sql_text, start):
+    tree = ast.parse(sql_text, start)
+    loaded = loads_binary(dumps_binary(tree))
+
+    assert repr(loaded) == repr(tree)
+    assert ast.dump_node(loaded) == ast.dump_node(tree)
+    nodes, loaded_nodes = list(walk(tree)), list(walk(loaded))
+    # dynamic node classes are created per registry, so compare their names
+    assert [type(node).__name__ for node in loaded_nodes] == [
+        type(node).__name__ for node in nodes
+    ]
+    assert [node.get_position() for node in loaded_nodes] == [
+        node.get_position() for node in nodes
+    ]
+    assert [node.get_text(sql_text) for node in loaded_nodes] == [
+        node.get_text(sql_text) for node in nodes
+    ]
+
+
+def test_loaded_nodes():
+    tree = ast.parse("SELECT a FROM b WHERE c > 1")
+    loaded = loads_binary(dumps_binary(tree))
+    select = loaded.body[0]
+    assert isinstance(select, ast.SelectStmt)
+    assert isinstance(select._ctx, DetachedContext)
+    assert select.where_clause.op == ">"
+    assert repr(select.children_by_field) == repr(tree.body[0].children_by_field)
+    assert (
+        select.children_by_field["from_clause"]
+        is select.children[select._field_references["from_clause"]]
+    )
+    assert ast.speaker.describe(select) == "`SELECT` statement"
+
+
+def test_compact_tree():
+    tree = ast.parse("SELECT a, b.c AS d FROM e ORDER BY a")
+    data = dumps_binary(compact_tree(tree))
+    assert data == dumps_binary(tree)
+
+
+def test_invalid_data():
+    data = dumps_binary(ast.parse("SELECT a FROM b"))
+    with pytest.raises(ValueError):
+        loads_binary(b"JSON" + data[4:])
+    with pytest.raises(ValueError):
+        loads_binary(data[:-1])
+
+
+def test_references_per_node():
+    tree = ast.parse("SELECT a, b FROM x; SELECT c, d FROM y")
+    loaded = loads_binary(dumps_binary(tree))
+    first, second = loaded.body
+    assert type(first) is type(second)
+    assert first._field_references == second._field_references
+    assert first._field_references is not second._field_references
+    for key, ref in first._field_references.items():
+        if isinstance(ref, list):
+            assert ref is not second._field_references[key]
+
+    first._field_references.clear()
+    assert second._field_references == tree.body[1]._field_references
@@ -0,0 +1,82 @@
+import pytest
+from antlr_plsql import ast
+from tests.helpers import make_chain
+
+
+@pytest.fixture
+def cache():
+    yield ast.enable_cache(maxsize=2)
+    ast.disable_cache()
+
+
+def test_cache_disabled_by_default():
+    assert ast.parse_cache is None
+
+
+def test_cache_hit_miss(cache):
+    first = ast.parse("SELECT a FROM b")
+    second = ast.parse("SELECT a FROM b")
+    ast.parse("SELECT a FROM b", "subquery")
+    info = cache.info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+    assert repr(first) == repr(second)
+    assert ast.dump_node(first) == ast.dump_node(second)
+
+
+def test_cache_returns_isolated_trees(cache):
+    sql_txt = "SELECT a FROM b WHERE a > 1"
+    tree = ast.parse(sql_txt)
+    tree.body[0].where_clause = None
+    tree.body[0].target_list.append("c")
+
+    cached = ast.parse(sql_txt)
+    assert cached.body[0].where_clause is not None
+    assert len(cached.body[0].target_list) == 1
+    assert cached.body[0].get_text(sql_txt) == sql_txt
+
+
+def test_cache_key_strict(cache):
+    ast.parse("SELECT x FROM ____")
+    with pytest.raises(ast.ParseError):
+        ast.parse("SELECT x FROM ____", strict=True)
+
+
+def test_cache_evicts_lru(cache):
+    for sql_txt in ["SELECT a FROM b", "SELECT c FROM d", "SELECT a FROM b"]:
+        ast.parse(sql_txt)
+    ast.parse("SELECT e FROM f")
+    assert len(cache) == 2
+    assert ("SELECT c FROM d", "sql_script", False) not in cache._entries
+    assert ("SELECT a FROM b", "sql_script", False) in cache._entries
+
+
+def test_cache_evicts_on_bytes():
+    cache = ast.enable_cache(maxsize=None, maxbytes=30)
+    try:
+        ast.parse("SELECT a FROM b")
+        ast.parse("SELECT c FROM d")
+        assert len(cache) == 2
+        ast.parse("SELECT e FROM f")
+        assert len(cache) == 2
+        assert cache.info().currbytes == 30
+        ast.parse("SELECT a, b, c, d, e, f, g, h, i, j, k FROM l")
+        assert len(cache) == 2
+    finally:
+        ast.disable_cache()
+
+
+def test_cache_deep_chain(cache):
+    sql_txt = make_chain("and", 1500)
+    tree = ast.parse(sql_txt, two_stage=True)
+    cached = ast.parse(sql_txt, two_stage=True)
+    assert cache.info().hits == 1
+    assert cached is not tree
+    flat = ast.dump_node(ast.flatten_chains(tree))
+    assert ast.dump_node(ast.flatten_chains(cached)) == flat
+
+
+def test_cache_untracked_terminals(cache):
+    instances = len(ast.Terminal.DEBUG_INSTANCES)
+    ast.parse("SELECT a FROM b WHERE c = 1")
+    ast.parse("SELECT a FROM b WHERE c = 1")
+    assert len(ast.Terminal.DEBUG_INSTANCES) == instances
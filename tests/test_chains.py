@@ -0,0 +1,115 @@
+import sys
+import threading
+
+import pytest
+
+from antlr_plsql import ast
+from tests.helpers import CHAINS, make_chain
+
+
+def get_chain(tree, kind):
+    stmt = tree.body[0]
+    if kind == "union":
+        return stmt
+    if kind == "concat":
+        return stmt.target_list[0]
+    return stmt.where_clause
+
+
+def chain_length(node, kind):
+    """Number of operands in a nested chain, without recursion"""
+    n = 1
+    if kind == "union":
+        while isinstance(node, ast.Union):
+            node, n = node.right, n + 1
+    else:
+        op = node.op
+        while isinstance(node, ast.BinaryExpr) and node.op == op:
+            node, n = node.left, n + 1
+    return n
+
+
+# 1000 operands already hit the default recursion limit before chains were
+# handled without recursion, and are parsed in the deep worker thread
+@pytest.mark.parametrize("n", [10, 100, 1000])
+@pytest.mark.parametrize("kind", list(CHAINS))
+def test_long_chain(kind, n):
+    tree = ast.parse(make_chain(kind, n), two_stage=True)
+    assert chain_length(get_chain(tree, kind), kind) == n
+    assert ast.dump_node(tree)["type"] == "Script"
+
+    chain = get_chain(ast.flatten_chains(tree), kind)
+    assert isinstance(chain, ast.NaryUnion if kind == "union" else ast.NaryExpr)
+    assert len(chain.args) == n
+
+
+def test_flatten_chains_mixed_ops():
+    tree = ast.parse(
+        "SELECT a FROM b WHERE c = 1 AND d = 2 AND (e = 3 OR f = 4 OR g = 5)"
+    )
+    where = ast.flatten_chains(tree).body[0].where_clause
+    assert isinstance(where, ast.NaryExpr)
+    assert where.op == "and"
+    assert len(where.args) == 3
+    # parenthesized expressions are lists
+    assert isinstance(where.args[2][0], ast.NaryExpr)
+    assert where.args[2][0].op == "or"
+    assert len(where.args[2][0].args) == 3
+
+
+def test_flatten_chains_union_order_by():
+    tree = ast.parse(
+        "SELECT a FROM b UNION SELECT a FROM c UNION SELECT a FROM d ORDER BY a"
+    )
+    union = ast.flatten_chains(tree).body[0]
+    assert isinstance(union, ast.NaryUnion)
+    assert [arg.from_clause[0].fields for arg in union.args] == [["b"], ["c"], ["d"]]
+    assert union.order_by_clause is not None
+
+
+def test_flatten_chains_keeps_mixed_unions():
+    tree = ast.parse("SELECT a FROM b UNION SELECT a FROM c UNION ALL SELECT a FROM d")
+    union = ast.flatten_chains(tree).body[0]
+    assert isinstance(union, ast.Union)
+    assert isinstance(union.right, ast.Union)
+
+
+def test_flatten_chains_single():
+    tree = ast.parse("SELECT a + 1 FROM b WHERE c = 1 AND d = 2")
+    flat = ast.flatten_chains(tree)
+    assert ast.dump_node(flat) == ast.dump_node(
+        ast.parse("SELECT a + 1 FROM b WHERE c = 1 AND d = 2")
+    )
+
+
+def test_deep_parses_share_a_worker():
+    limit = sys.getrecursionlimit()
+    texts = [make_chain("union", 300), make_chain("union", 400)]
+    results = {}
+
+    def parse(text):
+        results[text] = ast.parse(text, two_stage=True)
+
+    threads = [threading.Thread(target=parse, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    worker = ast.deep_worker.thread
+    parse(make_chain("union", 500))
+
+    assert [len(ast.flatten_chains(results[text]).body[0].args) for text in texts] == [
+        300,
+        400,
+    ]
+    assert ast.deep_worker.thread is worker
+    assert worker.is_alive()
+    assert sys.getrecursionlimit() == limit
+
+
+def test_deep_parse_error():
+    limit = sys.getrecursionlimit()
+    with pytest.raises(ast.ParseError):
+        # the error is near the start, finding one at the end takes a minute
+        ast.parse("SELECT FROM b UNION ALL " + make_chain("union", 300), strict=True)
+    assert sys.getrecursionlimit() == limit
@@ -0,0 +1,68 @@
+import pytest
+
+from antlr_plsql import ast
+from antlr_plsql.compact import CompactNode, compact_tree
+from tests.test_examples import load_dump
+from tests.test_ast import ast_examples_parse
+
+query = "SELECT a, b.c AS d FROM e WHERE f > 1 ORDER BY a"
+
+
+@pytest.mark.parametrize(
+    "start,cmd,res", load_dump(ast_examples_parse("v0.5.yml"))[::4]
+)
+def test_compact_repr(start, cmd, res):
+    tree = compact_tree(ast.parse(cmd, start, strict=True))
+    assert repr(tree) == res
+
+
+def test_compact_tree():
+    tree = ast.parse(query)
+    compact = compact_tree(tree)
+    assert ast.dump_node(compact) == ast.dump_node(tree)
+
+    select = compact.body[0]
+    assert isinstance(select, ast.SelectStmt)
+    assert isinstance(select, CompactNode)
+    assert repr(select.where_clause) == repr(tree.body[0].where_clause)
+    assert repr(select.target_list[1].alias) == repr(tree.body[0].target_list[1].alias)
+    assert compact.get_text(query) == query
+    assert (
+        select.where_clause.get_position() == tree.body[0].where_clause.get_position()
+    )
+    assert ast.speaker.describe(select) == "`SELECT` statement"
+
+
+def test_compact_no_dict():
+    select = compact_tree(ast.parse(query)).body[0]
+    for node in [select, select.where_clause, select.from_clause]:
+        assert not hasattr(node, "__dict__") or not vars(node)
+
+
+def test_compact_attributes():
+    tree = ast.parse(query)
+    compact = compact_tree(tree)
+    nodes = [(tree, compact)]
+    while nodes:
+        node, compact_node = nodes.pop()
+        assert type(compact_node).__name__ == type(node).__name__
+        assert compact_node.children_by_field.keys() == node.children_by_field.keys()
+        for field in node._fields:
+            value = getattr(node, field)
+            compact_value = getattr(compact_node, field)
+            if isinstance(value, ast.AstNode):
+                nodes.append((value, compact_value))
+            elif isinstance(value, list):
+                nodes.extend(zip(value, compact_value))
+            else:
+                assert compact_value == value
+
+    with pytest.raises(AttributeError):
+        compact.body[0].not_a_field
+
+
+def test_compact_shared_nodes():
+    tree = compact_tree(ast.parse("SELECT a FROM b WHERE c = 1", "subquery"))
+    # the where clause is both a child and a field of the select statement
+    where_clause = tree.children_by_field["where_clause"]
+    assert where_clause is tree.children[tree._field_references["where_clause"]]
@@ -0,0 +1,74 @@
+import pickle
+import subprocess
+import sys
+
+from antlr_plsql import dfa
+
+query = "SELECT a, b FROM c WHERE d > 1 ORDER BY a"
+
+
+# run in new processes, as the DFA is shared by all parsers in a process
+script = """
+import sys
+from antlr_plsql import ast, dfa
+
+def count_states():
+    return [
+        sum(len(decision._states) for decision in cls.decisionsToDFA)
+        for cls in (ast.grammar.Lexer, ast.grammar.Parser)
+    ]
+
+mode, path, query = sys.argv[1:]
+if mode == "save":
+    tree = ast.parse(query)
+    dfa.save(path)
+    states = count_states()
+else:
+    assert dfa.load(path)
+    states = count_states()
+    tree = ast.parse(query)
+    # a warm DFA doesn't need new states for the same query
+    assert count_states() == states
+print(states, repr(tree))
+"""
+
+
+def run_script(*args):
+    return subprocess.check_output([sys.executable, "-c", script] + list(args))
+
+
+def test_save_load(tmpdir):
+    path = str(tmpdir.join("dfa.pickle"))
+    saved = run_script("save", path, query)
+    assert run_script("load", path, query) == saved
+
+
+def test_load_missing(tmpdir, caplog):
+    assert not dfa.load(str(tmpdir.join("missing.pickle")))
+    assert "Can't load DFA cache" in caplog.text
+
+
+def test_load_other_grammar(tmpdir, caplog):
+    path = tmpdir.join("dfa.pickle")
+    path.write_binary(pickle.dumps({"version": dfa.VERSION, "key": "other"}))
+    assert not dfa.load(str(path))
+    assert "is for another grammar" in caplog.text
+
+
+def test_load_invalid(tmpdir, caplog):
+    path = tmpdir.join("dfa.pickle")
+    path.write_binary(b"")
+    assert not dfa.load(str(path))
+    path.write_binary(b"not a pickle")
+    assert not dfa.load(str(path))
+    assert caplog.text.count("Can't load DFA cache") == 2
+
+
+def test_default_path(monkeypatch, tmpdir):
+    monkeypatch.delenv(dfa.ENV_PATH, raising=False)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmpdir))
+    assert dfa.default_path().startswith(str(tmpdir))
+    assert dfa.grammar_key()[:16] in dfa.default_path()
+
+    monkeypatch.setenv(dfa.ENV_PATH, "dfa.pickle")
+    assert dfa.default_path() == "dfa.pickle"
@@ -49,3 +49,19 @@ def load_dump(fname):
 )
 def test_dump(start, cmd, res):
     assert repr(ast.parse(cmd, start, strict=True)) == res
+
+
+@pytest.mark.parametrize(
+    "start, query",
+    [("sql_script", query) for _, query in load_examples(examples)]
+    + [
+        (start, cmd)
+        for fname in ["v0.2.yml", "v0.3.yml", "v0.5.yml"]
+        for start, cmd, _ in load_dump(ast_examples_parse(fname))
+    ],
+)
+def test_examples_two_stage(start, query):
+    tree = ast.parse(query, start, two_stage=True)
+    expected = ast.parse(query, start)
+    assert repr(tree) == repr(expected)
+    assert ast.dump_node(tree) == ast.dump_node(expected)
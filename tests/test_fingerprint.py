@@ -0,0 +1,70 @@
+import pytest
+
+from antlr_plsql import grammar
+from antlr_plsql.fingerprint import fingerprint, iter_tokens, token_types
+from tests.test_examples import examples, load_examples
+
+
+@pytest.mark.parametrize(
+    "sql_text, result",
+    [
+        ("SELECT a FROM b", "select a from b"),
+        ("select A\n  from   B -- comment", "select a from b"),
+        ('SELECT "Mixed" FROM b.c', 'select "Mixed" from b.c'),
+        ("SELECT 'a' FROM b WHERE c = 1.5e3", "select ? from b where c = ?"),
+        ("SELECT a FROM b WHERE c IN (1, -2, :x)", "select a from b where c in (?+)"),
+        ("SELECT a FROM b WHERE c NOT IN ('d')", "select a from b where c not in (?+)"),
+        (
+            "SELECT a FROM b WHERE c IN (SELECT d FROM e WHERE f IN (1, 2))",
+            "select a from b where c in (select d from e where f in (?+))",
+        ),
+        ("SELECT a FROM b WHERE c IN (d, 1)", "select a from b where c in (d, ?)"),
+        ("SELECT f(1, a) FROM b; /* c */ COMMIT", "select f (?, a) from b; commit"),
+        (
+            "SELECT -1, a - 1 FROM b WHERE c > -2.5",
+            "select ?, a - ? from b where c > ?",
+        ),
+        ("SELECT a FROM b WHERE c IN (d, -1)", "select a from b where c in (d, ?)"),
+    ],
+)
+def test_fingerprint(sql_text, result):
+    assert fingerprint(sql_text) == result
+
+
+def test_fingerprint_negative_literals():
+    sql_text = "SELECT f(-1), a - 2, a - -3 FROM b"
+    assert fingerprint(sql_text, literals=True) == (
+        "select f (?), a - ?, a - ? from b",
+        ["-1", "2", "-3"],
+    )
+
+
+def test_fingerprint_literals():
+    sql_text = "SELECT 'it''s' FROM b WHERE c IN (1, -2, :x) AND d > N'e'"
+    assert fingerprint(sql_text, literals=True) == (
+        "select ? from b where c in (?+) and d > ?",
+        ["'it''s'", "1", "-2", "N'e'"],
+    )
+
+
+def reformat(sql_text):
+    """Same tokens with other whitespace, case and literals, without comments"""
+    Lexer = grammar.Lexer
+    texts = []
+    for token in iter_tokens(sql_text):
+        if token.type == Lexer.UNSIGNED_INTEGER:
+            texts.append("42")
+        elif token.type == Lexer.CHAR_STRING:
+            texts.append("'other'")
+        elif token.type in token_types().literals or token.type == Lexer.DELIMITED_ID:
+            texts.append(token.text)
+        else:
+            texts.append(token.text.upper())
+    return "\n  ".join(texts)
+
+
+@pytest.mark.parametrize("name, query", load_examples(examples))
+def test_fingerprint_examples(name, query):
+    result = fingerprint(query)
+    assert fingerprint(query) == result
+    assert fingerprint(reformat(query)) == result
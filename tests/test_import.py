@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+from antlr_plsql import ast
+
+
+def run_python(code):
+    return subprocess.check_output([sys.executable, "-c", code]).decode().split()
+
+
+def test_import_is_lazy():
+    loaded = run_python(
+        "import sys, antlr_plsql.ast; "
+        "print(*[name for name in ('antlr_plsql.antlr_py.plsqlParser', "
+        "'antlr_plsql.antlr_py.plsqlLexer', 'pkg_resources', 'yaml') "
+        "if name in sys.modules])"
+    )
+    assert loaded == []
+
+
+def test_import_fingerprint_is_lazy():
+    loaded = run_python(
+        "import sys, antlr_plsql.fingerprint; "
+        "print(*[name for name in ('antlr_plsql.antlr_py.plsqlParser', "
+        "'antlr_plsql.antlr_py.plsqlLexer') if name in sys.modules])"
+    )
+    assert loaded == []
+
+
+def test_import_time():
+    # importing the module should take a fraction of loading the grammar
+    import_time, grammar_time = map(
+        float,
+        run_python(
+            "from time import perf_counter; start = perf_counter(); "
+            "import antlr_plsql.ast as ast; imported = perf_counter(); "
+            "ast.grammar.Parser; ast.grammar.Lexer; "
+            "print(imported - start, perf_counter() - imported)"
+        ),
+    )
+    assert import_time < grammar_time / 2
+
+
+def test_lazy_speaker():
+    select = ast.parse("SELECT a FROM b").body[0]
+    assert ast.speaker.describe(select) == "`SELECT` statement"
+    assert ast.speaker.field_names["target_list"]
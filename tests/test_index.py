@@ -0,0 +1,112 @@
+import gc
+
+from antlr_plsql import ast
+from antlr_plsql.index import get_index, indexes
+
+SQL = "SELECT a, f(b) FROM c WHERE d IN (SELECT e FROM g WHERE h(i) > 1)"
+
+
+def test_index_find_all():
+    tree = ast.parse(SQL)
+    index = get_index(tree)
+    identifiers = index.find_all(ast.Identifier)
+    assert [index.path(node) for node in identifiers] == [
+        "body[0].target_list[0]",
+        "body[0].target_list[1].name",
+        "body[0].target_list[1].args[0]",
+        "body[0].from_clause[0]",
+        "body[0].where_clause.left",
+        "body[0].where_clause.right.target_list[0]",
+        "body[0].where_clause.right.from_clause[0]",
+        "body[0].where_clause.right.where_clause.left.name",
+        "body[0].where_clause.right.where_clause.left.args[0]",
+    ]
+    assert index.find_all(ast.Script) == [tree]
+
+
+def test_index_within():
+    tree = ast.parse(SQL)
+    index = get_index(tree)
+    outer, inner = index.find_all(ast.SelectStmt)
+    assert index.find_all(ast.Call, within=inner) == [inner.where_clause.left]
+    assert len(index.find_all(ast.Call, within=outer)) == 2
+    assert index.find_all(ast.SelectStmt, within=inner) == []
+    for node in index.find_all(ast.Identifier, within=inner):
+        assert index.is_within(node, inner)
+        assert index.is_within(node, outer)
+        assert index.enclosing(node, ast.SelectStmt) is inner
+    assert not index.is_within(outer, inner)
+    assert not index.is_within(inner, inner)
+
+
+def test_index_parents():
+    tree = ast.parse(SQL)
+    index = get_index(tree)
+    outer, inner = index.find_all(ast.SelectStmt)
+    call = inner.where_clause.left
+    assert index.parent(call) is inner.where_clause
+    assert list(index.ancestors(call)) == [
+        inner.where_clause,
+        inner,
+        outer.where_clause,
+        outer,
+        tree,
+    ]
+    assert index.parent(tree) is None
+    assert index.path(call) == "body[0].where_clause.right.where_clause.left"
+    assert index.path(tree) == ""
+
+
+def test_index_refresh():
+    tree = ast.parse(SQL)
+    index = get_index(tree)
+    assert get_index(tree) is index
+    tree.body.append(ast.parse("SELECT x FROM y").body[0])
+    assert len(get_index(tree).find_all(ast.SelectStmt)) == 2
+    assert len(get_index(tree, refresh=True).find_all(ast.SelectStmt)) == 3
+
+
+def test_index_freed():
+    tree = ast.parse(SQL)
+    get_index(tree)
+    assert id(tree) in indexes
+    del tree
+    gc.collect()
+    assert len(indexes) == 0
+
+
+def test_index_terminal_root():
+    # Terminal.DEBUG_INSTANCES would keep the tree alive
+    with ast.untracked_terminals():
+        tree = ast.parse("a", "regular_id")
+    assert isinstance(tree, ast.Terminal)
+    index = get_index(tree)
+    assert get_index(tree) is index
+    assert index.find_all(ast.Terminal) == [tree]
+    del tree, index
+    gc.collect()
+    assert len(indexes) == 0
+
+
+def test_index_list_root():
+    tree = ast.parse("(1, f(a))", "expression_list")
+    assert isinstance(tree, list)
+    index = get_index(tree)
+    call = tree[1]
+    assert index.find_all(ast.Call) == [call]
+    assert index.path(call.args[0]) == "[1].args[0]"
+    assert list(index.ancestors(call.args[0])) == [call, tree]
+    assert id(tree) not in indexes
+
+
+def test_index_long_chain():
+    terms = ["a{} = 1".format(i) for i in range(2000)]
+    sql_text = "SELECT a FROM b WHERE " + " AND ".join(terms)
+    tree = ast.parse(sql_text, two_stage=True)
+    index = get_index(tree)
+    binary_exprs = index.find_all(ast.BinaryExpr)
+    assert len(binary_exprs) == 2 * len(terms) - 1
+    assert index.enclosing(binary_exprs[-1], ast.SelectStmt) is tree.body[0]
+    # the ANDs come first in preorder, then the first term
+    first = binary_exprs[len(terms) - 1]
+    assert index.path(first) == "body[0].where_clause" + ".left" * (len(terms) - 1)
@@ -0,0 +1,68 @@
+import pickle
+import pytest
+from antlr_plsql import ast
+from antlr_plsql.marshalling import dump_tree, load_tree, DetachedContext
+from tests.helpers import make_chain
+
+
+def walk(node):
+    if isinstance(node, ast.AstNode):
+        yield node
+        for field in node._fields:
+            yield from walk(getattr(node, field, None))
+    elif isinstance(node, list):
+        for el in node:
+            yield from walk(el)
+
+
+@pytest.mark.parametrize(
+    "sql_text, start",
+    [
+        ("SELECT a, b FROM x WHERE a < 10;", "sql_script"),
+        ("SELECT CURSOR (SELECT a FROM b) FROM c", "sql_script"),
+        ("SELECT a FROM x UNION SELECT b FROM y ORDER BY 1", "subquery"),
+        ("CREATE TABLE a (b INTEGER PRIMARY KEY, c VARCHAR(10))", "sql_script"),
+        ("x IN (1, 'a', y)", "expression"),
+        ("-1", "unary_expression"),
+    ],
+)
+def test_round_trip(sql_text, start):
+    tree = ast.parse(sql_text, start)
+    state = pickle.loads(pickle.dumps(dump_tree(tree)))
+    loaded = load_tree(state)
+
+    assert repr(loaded) == repr(tree)
+    # comparing the nested dicts of dump_node would recurse
+    flat = ast.dump_node(ast.flatten_chains(tree))
+    assert ast.dump_node(ast.flatten_chains(loaded)) == flat
+    nodes, loaded_nodes = list(walk(tree)), list(walk(loaded))
+    # dynamic node classes are created per registry, so compare their names
+    assert [type(node).__name__ for node in loaded_nodes] == [
+        type(node).__name__ for node in nodes
+    ]
+    assert [node.get_position() for node in loaded_nodes] == [
+        node.get_position() for node in nodes
+    ]
+    assert [node.get_text(sql_text) for node in loaded_nodes] == [
+        node.get_text(sql_text) for node in nodes
+    ]
+
+
+def test_loaded_tree_is_detached():
+    tree = load_tree(dump_tree(ast.parse("SELECT a FROM b")))
+    assert isinstance(tree._ctx, DetachedContext)
+    assert tree.body[0].target_list[0].fields[0] == "a"
+
+
+def test_shared_nodes_are_loaded_once():
+    tree = load_tree(dump_tree(ast.parse("SELECT a FROM b WHERE a > 1", "subquery")))
+    where_clause = tree.children_by_field["where_clause"]
+    assert where_clause is tree.children[tree._field_references["where_clause"]]
+
+
+def test_round_trip_deep_chain():
+    tree = ast.parse(make_chain("and", 1500), two_stage=True)
+    loaded = load_tree(pickle.loads(pickle.dumps(dump_tree(tree))))
+    # comparing the nested dicts of dump_node would recurse
+    flat = ast.dump_node(ast.flatten_chains(tree))
+    assert ast.dump_node(ast.flatten_chains(loaded)) == flat
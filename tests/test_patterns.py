@@ -0,0 +1,140 @@
+import ast as pyast
+from types import SimpleNamespace
+
+import pytest
+
+from antlr_plsql import ast, patterns
+from antlr_plsql.index import get_index
+from antlr_plsql.patterns import Pattern, PatternSet
+
+SQL = (
+    "SELECT a.b, f(x), count(*) FROM t1 JOIN t2 ON t1.id = t2.id AND id = 3 "
+    "WHERE id = 1 AND b IN (SELECT c FROM d WHERE F(id) > 2)"
+)
+
+
+def find_paths(pattern, sql_text=SQL):
+    tree = ast.parse(sql_text)
+    index = get_index(tree)
+    return [index.path(node) for node in Pattern(pattern).find_all(tree)]
+
+
+@pytest.mark.parametrize(
+    "pattern, paths",
+    [
+        (
+            'BinaryExpr(op="=", left="id") in JoinExpr.cond',
+            ["body[0].from_clause[0].cond.right"],
+        ),
+        (
+            'BinaryExpr(op="=", left="id") not in JoinExpr',
+            ["body[0].where_clause.left"],
+        ),
+        (
+            'BinaryExpr(op="=") in JoinExpr.cond',
+            ["body[0].from_clause[0].cond.left", "body[0].from_clause[0].cond.right"],
+        ),
+        ('"T1.ID"', ["body[0].from_clause[0].cond.left.left"]),
+        ("Call(args=[Star])", ["body[0].target_list[2]"]),
+        (
+            'Call(name="f", args=[..., "id", ...])',
+            ["body[0].where_clause.right.right.where_clause.left"],
+        ),
+        (
+            "Call(args=[_, ...]) in SelectStmt.target_list",
+            ["body[0].target_list[1]", "body[0].target_list[2]"],
+        ),
+        (
+            "SelectStmt(where_clause=has(Call))",
+            ["body[0]", "body[0].where_clause.right.right"],
+        ),
+        ("SelectStmt(where_clause=~has(Call))", []),
+        (
+            'Identifier in SelectStmt(from_clause=["d"]).where_clause',
+            [
+                "body[0].where_clause.right.right.where_clause.left.name",
+                "body[0].where_clause.right.right.where_clause.left.args[0]",
+            ],
+        ),
+        (
+            'BinaryExpr(op="in" | "not in")',
+            ["body[0].where_clause.right"],
+        ),
+        ("JoinExpr(using=None, join_type=None)", ["body[0].from_clause[0]"]),
+    ],
+)
+def test_pattern(pattern, paths):
+    assert find_paths(pattern) == paths
+
+
+@pytest.mark.skipif(not hasattr(pyast, "Str"), reason="no Python 3.7 node types")
+def test_pattern_constants_before_python_38(monkeypatch):
+    # the node types of Python 3.7 constants still match Constant nodes
+    monkeypatch.setattr(patterns, "sys", SimpleNamespace(version_info=(3, 7)))
+    assert find_paths('Call(name="f", args=[..., "id", ...])') == [
+        "body[0].where_clause.right.right.where_clause.left"
+    ]
+    assert find_paths("JoinExpr(using=None, join_type=None)") == [
+        "body[0].from_clause[0]"
+    ]
+
+
+@pytest.mark.parametrize(
+    "pattern, message",
+    [
+        ("Foo", "Unknown node class in pattern: Foo"),
+        ("Call(nam=_)", "Unknown field in pattern: Call.nam"),
+        ("_ in JoinExpr.on", "Unknown field in pattern: JoinExpr.on"),
+        ("Call +", "Invalid pattern"),
+        ("Call(name=1)", "Unsupported pattern"),
+    ],
+)
+def test_pattern_error(pattern, message):
+    with pytest.raises(ValueError, match=message):
+        Pattern(pattern)
+
+
+def test_pattern_set():
+    patterns = PatternSet(
+        {
+            "id_equals": 'BinaryExpr(op="=", left="id")',
+            "ands": 'BinaryExpr(op="and")',
+            "calls": "Call",
+            "joins": "JoinExpr",
+            "none": 'Call(name="g")',
+            "any": "_",
+        }
+    )
+    tree = ast.parse(SQL)
+    result = patterns.find_all(tree)
+    assert "none" not in result
+    for name in ("id_equals", "ands", "calls", "joins", "any"):
+        assert result[name] == patterns.patterns[name].find_all(tree)
+    assert [len(result[name]) for name in ("id_equals", "ands", "calls")] == [2, 2, 3]
+    assert result["any"][0] is tree
+
+    trees = [ast.parse(SQL), ast.parse("SELECT f(id) FROM b")]
+    results = patterns.find_many(trees)
+    assert len(results[1]["calls"]) == 1 and "id_equals" not in results[1]
+
+
+def test_pattern_set_tables_are_bounded():
+    patterns = PatternSet({"calls": "Call", "any": "_"})
+    sizes = []
+    for i in range(3):
+        # each parse creates its own class for For_update_clause
+        trees = [ast.parse("SELECT f({}) FROM b FOR UPDATE".format(i))]
+        results = patterns.find_many(trees)
+        assert len(results[0]["calls"]) == 1
+        sizes.append(len(patterns._table.tables))
+    assert sizes == [sizes[0]] * 3
+
+
+def test_pattern_set_long_chain():
+    terms = ["a{} = 1".format(i) for i in range(2000)]
+    tree = ast.parse("SELECT a FROM b WHERE " + " AND ".join(terms), two_stage=True)
+    patterns = PatternSet(['BinaryExpr(op="=", left="a1999")', "_ in BinaryExpr.left"])
+    result = patterns.find_all(tree)
+    assert len(result[0]) == 1
+    assert result[0][0] is tree.body[0].where_clause.right
+    assert result[1][0] is tree.body[0].where_clause.left
@@ -0,0 +1,286 @@
+import random
+
+import pytest
+from antlr_plsql import ast
+from antlr_plsql.batch import ParsePool
+from antlr_plsql import script as script_module
+from antlr_plsql.script import split_script, parse_script, reparse_script
+from tests.test_examples import examples, load_examples
+
+script = """-- first
+SELECT a FROM b;
+SELECT 'x;y' AS "c;d" FROM e /* ; */ ;
+
+  UPDATE a SET b = 1;
+CREATE OR REPLACE PROCEDURE p IS
+BEGIN
+  NULL;
+END;
+/
+"""
+
+
+@pytest.mark.parametrize(
+    "sql_text, statements",
+    [
+        ("", [""]),
+        ("SELECT a FROM b", ["SELECT a FROM b"]),
+        ("SELECT a FROM b; -- end", ["SELECT a FROM b; -- end"]),
+        (
+            "SELECT ';' FROM b; SELECT c FROM d",
+            ["SELECT ';' FROM b;", " SELECT c FROM d"],
+        ),
+        (
+            'SELECT "a;" FROM b -- ;\n;',
+            ['SELECT "a;" FROM b -- ;\n;'],
+        ),
+        (
+            "BEGIN\n  NULL;\nEND;\n/\nSELECT a FROM b;",
+            ["BEGIN\n  NULL;\nEND;\n", "/", "\nSELECT a FROM b;"],
+        ),
+        (
+            # a division is not the end of a block
+            "DECLARE x NUMBER;\nBEGIN\n  x := 1\n  / 2;\nEND;",
+            ["DECLARE x NUMBER;\nBEGIN\n  x := 1\n  / 2;\nEND;"],
+        ),
+    ],
+)
+def test_split_script(sql_text, statements):
+    assert [
+        sql_text[start:stop] for start, stop in split_script(sql_text)
+    ] == statements
+
+
+def test_split_script_covers_text():
+    ranges = split_script(script)
+    assert "".join(script[start:stop] for start, stop in ranges) == script
+
+
+@pytest.mark.parametrize(
+    "sql_text", ["", "SELECT a FROM b", "SELECT a FROM b;", "SELECT a FROM b; ", script]
+)
+def test_parse_script(sql_text):
+    tree = ast.parse(sql_text)
+    result = parse_script(sql_text)
+
+    assert repr(result) == repr(tree)
+    assert ast.dump_node(result) == ast.dump_node(tree)
+    assert result.get_text(sql_text) == tree.get_text(sql_text)
+    assert [stmt.get_text(sql_text) for stmt in result.body] == [
+        stmt.get_text(sql_text) for stmt in tree.body
+    ]
+    assert [stmt.get_position() for stmt in result.body] == [
+        stmt.get_position() for stmt in tree.body
+    ]
+
+
+@pytest.mark.examples
+def test_parse_script_examples():
+    # the examples without syntax errors, as one script
+    queries = []
+    for _, query in sorted(load_examples(examples)):
+        try:
+            ast.parse(query, strict=True, two_stage=True)
+        except ast.ParseError:
+            continue
+        queries.append(query.rstrip().rstrip(";") + "\n;\n")
+    sql_text = "".join(queries)
+    tree = ast.parse(sql_text, strict=True, two_stage=True)
+    result = parse_script(sql_text, strict=True, two_stage=True)
+
+    assert len(result.body) == len(queries)
+    assert repr(result) == repr(tree)
+    assert ast.dump_node(result) == ast.dump_node(tree)
+    assert [stmt.get_position() for stmt in result.body] == [
+        stmt.get_position() for stmt in tree.body
+    ]
+
+
+def test_parse_script_isolates_errors():
+    sql_text = "SELECT a FROM b;\nSELECT FROM WHERE;\nUPDATE c SET d = 1;"
+    result = parse_script(sql_text)
+    assert result.body[0].get_text(sql_text) == "SELECT a FROM b"
+    assert result.body[-1].get_text(sql_text) == "UPDATE c SET d = 1"
+
+
+def test_parse_script_differs_on_errors():
+    # a statement after a `/` needs a semicolon before it in sql_script
+    sql_text = (
+        "CREATE OR REPLACE PROCEDURE p IS\nBEGIN\n  NULL;\nEND;\n/\n"
+        "UPDATE c SET d = 1;\nSELECT a FROM b;"
+    )
+    with pytest.raises(ast.ParseError):
+        ast.parse(sql_text, strict=True)
+    result = parse_script(sql_text)
+    assert [type(stmt).__name__ for stmt in result.body] == [
+        "Create_procedure_body",
+        "UpdateStmt",
+        "SelectStmt",
+        "Terminal",
+    ]
+    assert result.body[1].get_text(sql_text) == "UPDATE c SET d = 1"
+
+
+def test_parse_script_strict():
+    with pytest.raises(ast.ParseError):
+        parse_script("SELECT a FROM b;\nSELECT FROM WHERE;", strict=True)
+
+
+def test_parse_script_in_pool():
+    with ParsePool(workers=1, warmup=()) as pool:
+        result = parse_script(script, pool=pool)
+    tree = ast.parse(script)
+
+    assert ast.dump_node(result) == ast.dump_node(tree)
+    assert [stmt.get_text(script) for stmt in result.body] == [
+        stmt.get_text(script) for stmt in tree.body
+    ]
+    assert [stmt.get_position() for stmt in result.body] == [
+        stmt.get_position() for stmt in tree.body
+    ]
+
+
+@pytest.mark.parametrize(
+    "offset, removed, inserted",
+    [
+        (0, 0, "-- new\n"),
+        (16, 1, "c"),  # in a statement
+        (26, 0, "\n\n"),  # between statements
+        (24, 1, ""),  # removes a semicolon
+        (26, 0, "SELECT 1 FROM dual;"),  # adds a statement
+        (39, 0, "'"),  # opens a string
+        (60, 2, ""),  # removes a comment end
+        (129, 4, "NULL; NULL"),  # in a PL/SQL unit
+        (len(script), 0, "SELECT z FROM y"),
+        (0, len(script), ""),
+    ],
+)
+def test_reparse_script(offset, removed, inserted):
+    previous = parse_script(script)
+    sql_text = script[:offset] + inserted + script[offset + removed :]
+    result = reparse_script(previous, script, offset, removed, inserted)
+    tree = parse_script(sql_text)
+
+    assert repr(result) == repr(tree)
+    assert ast.dump_node(result) == ast.dump_node(tree)
+    assert result.get_text(sql_text) == tree.get_text(sql_text)
+    assert [stmt.get_text(sql_text) for stmt in result.body] == [
+        stmt.get_text(sql_text) for stmt in tree.body
+    ]
+    assert [stmt.get_position() for stmt in result.body] == [
+        stmt.get_position() for stmt in tree.body
+    ]
+
+
+def test_reparse_script_random_edits():
+    sql_text = """SELECT a FROM b;
+SELECT c, d FROM e WHERE f > 1;
+INSERT INTO t (x, y) VALUES (1, 'two');
+CREATE OR REPLACE PROCEDURE p IS
+BEGIN
+  UPDATE t SET x = 2;
+END;
+/
+UPDATE t SET y = 'three' WHERE x = 1;
+SELECT x FROM t;
+"""
+    pieces = ["a", ";", "/", "\n", "'", "--", "/*", "*/", "\n/\n", "END;", "BEGIN"]
+    previous = parse_script(sql_text)
+    rng = random.Random(13)
+    for _ in range(60):
+        offset = rng.randrange(len(sql_text) + 1)
+        removed = rng.randrange(min(4, len(sql_text) - offset) + 1)
+        inserted = rng.choice(pieces) if rng.random() < 0.7 else ""
+        new_text = sql_text[:offset] + inserted + sql_text[offset + removed :]
+        edit = (offset, removed, inserted)
+        try:
+            tree = parse_script(new_text)
+        except Exception as e:
+            # e.g. the transformer can fail after error recovery
+            with pytest.raises(type(e)):
+                reparse_script(previous, sql_text, offset, removed, inserted)
+            continue
+        result = reparse_script(previous, sql_text, offset, removed, inserted)
+
+        assert ast.dump_node(result) == ast.dump_node(tree), edit
+        assert [stmt.get_position() for stmt in result.body] == [
+            stmt.get_position() for stmt in tree.body
+        ], edit
+        assert result.get_text(new_text) == tree.get_text(new_text), edit
+
+
+def test_reparse_script_only_parses_edited_statement(monkeypatch):
+    sql_text = "".join("SELECT a{0} FROM b;\n".format(i) for i in range(10))
+    previous = ast.parse(sql_text)
+    parsed = []
+    parse_statement = script_module.parse_statement
+    monkeypatch.setattr(
+        script_module,
+        "parse_statement",
+        lambda tokens, *args: parsed.append(tokens) or parse_statement(tokens, *args),
+    )
+    offset = sql_text.index("a4")
+    result = reparse_script(previous, sql_text, offset, 2, "c\n")
+
+    assert len(parsed) == 1
+    assert result.body[4].get_text(
+        sql_text[:offset] + "c\n" + sql_text[offset + 2 :]
+    ) == ("SELECT c\n FROM b")
+    # the statements before the edit are reused
+    assert result.body[3] is previous.body[3]
+    assert result.body[5].get_position()["line_start"] == 7
+
+
+def test_reparse_script_only_lexes_around_edit(monkeypatch):
+    sql_text = "".join("SELECT a{0} FROM b;\n".format(i) for i in range(30))
+    previous = parse_script(sql_text)
+    lexed = []
+    lex_from = script_module.lex_from
+
+    def counting_lex_from(*args):
+        for token in lex_from(*args):
+            lexed.append(token)
+            yield token
+
+    monkeypatch.setattr(script_module, "lex_from", counting_lex_from)
+    offset = sql_text.index("a15")
+    result = reparse_script(previous, sql_text, offset, 3, "c15")
+
+    # the edited statement and the one before it, and a few tokens after
+    assert len(lexed) < 20
+    new_text = sql_text[:offset] + "c15" + sql_text[offset + 3 :]
+    assert repr(result) == repr(parse_script(new_text))
+
+
+@pytest.mark.parametrize(
+    "sql_text, edited, inserted",
+    [
+        # a `/*` without `*/` is lexed as `/` and `*`, until it's closed
+        ("SELECT a /* FROM b;\nSELECT c FROM d;\nSELECT e FROM f;", "e", "*/"),
+        ("SELECT 'a FROM b;\nSELECT c FROM d;\nSELECT e FROM f;", "e", "'"),
+    ],
+)
+def test_reparse_script_changes_tokens_before_edit(sql_text, edited, inserted):
+    offset = sql_text.index(edited)
+    new_text = sql_text[:offset] + inserted + sql_text[offset:]
+    previous = parse_script(sql_text)
+    result = reparse_script(previous, sql_text, offset, 0, inserted)
+    assert repr(result) == repr(parse_script(new_text))
+
+    # and back, from the statements of result
+    result = reparse_script(result, new_text, offset, len(inserted), "")
+    assert repr(result) == repr(previous)
+
+
+def test_reparse_script_repeated_edits():
+    sql_text = "SELECT a FROM b;\nSELECT c FROM d;"
+    result = parse_script(sql_text)
+    for offset, removed, inserted in [(7, 1, "xy"), (0, 0, "\n"), (27, 1, "e")]:
+        result = reparse_script(result, sql_text, offset, removed, inserted)
+        sql_text = sql_text[:offset] + inserted + sql_text[offset + removed :]
+    assert repr(result) == repr(ast.parse(sql_text))
+
+
+def test_reparse_script_out_of_range():
+    with pytest.raises(ValueError):
+        reparse_script(parse_script("SELECT a FROM b"), "SELECT a FROM b", 10, 10, "")
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from antlr_plsql import ast, server
+from antlr_plsql.aio import AsyncParser
+from antlr_plsql.server import Client, parse_encoded
+
+texts = [
+    "SELECT a FROM b",
+    "SELECT a, b FROM c WHERE a > 1",
+    "UPDATE a SET b = 1",
+]
+
+
+@pytest.fixture(scope="module", params=["thread", "process"])
+def address(request, tmpdir_factory):
+    address = "unix:" + str(tmpdir_factory.mktemp("server").join("parse.sock"))
+    parser = AsyncParser(2, executor=request.param, warmup=texts[:1])
+    started = threading.Event()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(
+        server.serve(address, parser, ready=lambda _: started.set())
+    )
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            server.cancel_remaining_tasks(loop)
+            loop.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(30)
+    yield address
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join()
+    parser.close()
+
+
+def test_parse(address):
+    client = Client(address)
+    for text in texts:
+        tree = client.parse(text)
+        assert ast.dump_node(tree) == ast.dump_node(ast.parse(text))
+    tree = client.parse("a < 1", start="expression")
+    assert isinstance(tree, ast.BinaryExpr)
+    assert tree.op == "<"
+    client.close()
+
+
+def test_parse_encoded_untracked():
+    instances = len(ast.Terminal.DEBUG_INSTANCES)
+    ok, content = parse_encoded(texts[1], "sql_script", False, False, "binary")
+    assert ok
+    assert ast.dump_node(server.loads_binary(content)) == ast.dump_node(
+        ast.parse(texts[1])
+    )
+    # only the reference parse adds Terminals
+    reference = len(ast.Terminal.DEBUG_INSTANCES) - instances
+    parse_encoded(texts[1], "sql_script", False, False, "json")
+    assert len(ast.Terminal.DEBUG_INSTANCES) - instances == reference
+
+
+def test_parse_json(address):
+    client = Client(address)
+    assert client.parse_json(texts[1]) == json.loads(
+        json.dumps(ast.dump_node(ast.parse(texts[1])))
+    )
+
+
+def test_parse_error(address):
+    client = Client(address)
+    with pytest.raises(ast.ParseError) as error:
+        client.parse("SELECT x FROM ____", strict=True)
+    assert error.value.msg.startswith("line 1:")
+    # the connection is still usable
+    assert isinstance(client.parse(texts[0]), ast.Script)
+
+
+def test_bad_request(address):
+    client = Client(address)
+    status, content = client.request("POST", "/parse", b"{}")
+    assert status == 400
+    assert "invalid request" in json.loads(content.decode("utf-8"))["error"]
+    status, _ = client.request("GET", "/other")
+    assert status == 404
+
+
+@pytest.mark.parametrize(
+    "request_args, message",
+    [
+        ({"start": "reset"}, "no rule 'reset'"),
+        ({"start": "no_such_rule"}, "no rule 'no_such_rule'"),
+        ({"strict": "false"}, "strict is not a boolean"),
+        ({"two_stage": 1}, "two_stage is not a boolean"),
+    ],
+)
+def test_invalid_parse_args(address, request_args, message):
+    client = Client(address)
+    body = json.dumps(dict({"sql": texts[0]}, **request_args)).encode("utf-8")
+    status, content = client.request("POST", "/parse?format=binary", body)
+    assert status == 400
+    assert message in json.loads(content.decode("utf-8"))["error"]
+    # the connection is still usable
+    assert isinstance(client.parse(texts[0]), ast.Script)
+
+
+def test_server_error(address, monkeypatch):
+    def fail(query, body):
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(server, "get_parse_args", fail)
+    client = Client(address)
+    with pytest.raises(RuntimeError, match="parse server error 500"):
+        client.parse(texts[0])
+    monkeypatch.undo()
+    assert isinstance(client.parse(texts[0]), ast.Script)
+    assert client.stats()["server_errors"] >= 1
+
+
+def test_drop_in_parse(address, monkeypatch):
+    monkeypatch.setenv("ANTLR_PLSQL_SERVER", address)
+    monkeypatch.setattr(server, "clients", threading.local())
+    for text in texts:
+        tree = server.parse(text)
+        expected = ast.parse(text)
+        assert repr(tree) == repr(expected)
+        assert ast.dump_node(tree) == ast.dump_node(expected)
+        statement, expected_statement = tree.body[0], expected.body[0]
+        assert type(statement) is type(expected_statement)
+        assert statement.children_by_field.keys() == (
+            expected_statement.children_by_field.keys()
+        )
+        assert statement.get_text(text) == expected_statement.get_text(text)
+
+
+def test_stats(address):
+    client = Client(address)
+    client.parse(texts[0])
+    stats = client.stats()
+    assert stats["requests"] >= 1
+    assert stats["workers"] == 2
+    assert stats["throughput"] > 0
+    assert set(stats["parser"]["latency"]) == {"p50", "p90", "p99"}
@@ -30,6 +30,21 @@ def test_call_name(speaker):
     assert speaker.describe(call, fmt="{node_name}") == "function call `COUNT`"
 
 
+def test_args_field_names():
+    fmt = "The {field_name} of the {node_name}"
+    call = ast.parse("COUNT(a)", start="standard_function")
+    assert (
+        ast.speaker.describe(call, field="args", fmt=fmt)
+        == "The args of the function call `COUNT`"
+    )
+    tree = ast.parse("SELECT a FROM b WHERE c = 1 AND d = 2 AND e = 3")
+    chain = ast.flatten_chains(tree).body[0].where_clause
+    assert (
+        ast.speaker.describe(chain, field="args", fmt=fmt)
+        == "The operands of the chain of `and` expressions"
+    )
+
+
 @pytest.mark.parametrize(
     "start, code",
     [
@@ -63,3 +78,76 @@ def test_print_speaker(code, start):
                 tree, field=field_name, fmt="The {field_name} of the {node_name}"
             )
         )
+
+
+@pytest.fixture
+def compiled_speaker():
+    return ast.CompiledSpeaker(**yaml.safe_load(open("antlr_plsql/speaker.yml")))
+
+
+@pytest.mark.parametrize(
+    "start, code",
+    [
+        ("selected_element", "id as id2"),
+        ("binary_expression", "1 + 2"),
+        ("standard_function", "COUNT(*)"),
+        ("subquery", "SELECT x FROM y UNION SELECT m FROM n"),
+        ("unary_expression", "-1"),
+    ],
+)
+def test_compiled_speaker(compiled_speaker, start, code):
+    speaker = Speaker(**yaml.safe_load(open("antlr_plsql/speaker.yml")))
+    tree = ast.parse(code, start=start)
+    fmt = "The {field_name} of the {node_name}"
+
+    # twice, the second time from memoized messages
+    for _ in range(2):
+        assert compiled_speaker.describe(tree) == speaker.describe(tree)
+        for field_name in tree._fields:
+            assert compiled_speaker.describe(
+                tree, field=field_name, fmt=fmt
+            ) == speaker.describe(tree, field=field_name, fmt=fmt)
+    assert compiled_speaker.describe(
+        tree, fmt="{node_name} ({name})", name="x"
+    ) == speaker.describe(tree, fmt="{node_name} ({name})", name="x")
+
+
+def test_compiled_speaker_node_fields(compiled_speaker):
+    plus = ast.parse("1 + 2", start="binary_expression")
+    minus = ast.parse("1 - 2", start="binary_expression")
+    assert compiled_speaker.describe(plus) == "binary expression `+`"
+    assert compiled_speaker.describe(minus) == "binary expression `-`"
+
+
+def test_describe_many(compiled_speaker):
+    tree = ast.parse("SELECT a + 1 FROM b ORDER BY a", start="subquery")
+    fmt = "The {field_name} of the {node_name}"
+    messages = compiled_speaker.describe_many(tree, field_fmt=fmt)
+    assert messages[0] == (tree, None, "`SELECT` statement")
+    assert messages[1] == (tree, "pref", "The pref of the `SELECT` statement")
+    assert (tree.target_list[0], None, "binary expression `+`") in messages
+    for node, field, message in messages:
+        if field is None:
+            assert message == compiled_speaker.describe(node)
+        else:
+            assert message == compiled_speaker.describe(node, fmt, field)
+
+    messages = compiled_speaker.describe_many(tree, field_fmt=fmt, fields=["expr"])
+    assert (
+        tree.order_by_clause,
+        "expr",
+        "The expression of the order by expression",
+    ) in messages
+    assert {field for _, field, _ in messages} == {None, "expr"}
+
+
+def test_describe_many_cache_is_bounded(compiled_speaker):
+    fmt = "The {field_name} of the {node_name}"
+    sizes = []
+    for i in range(3):
+        # each parse creates its own class for For_update_clause
+        tree = ast.parse("SELECT a + {} FROM b FOR UPDATE".format(i))
+        compiled_speaker.describe_many(tree, field_fmt=fmt)
+        sizes.append(len(compiled_speaker._field_messages))
+    assert sizes[0] > 0
+    assert sizes == [sizes[0]] * 3
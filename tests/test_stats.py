@@ -0,0 +1,71 @@
+import pytest
+
+from antlr_plsql import ast
+from antlr_plsql.stats import ParseStats, count_nodes
+
+query = "SELECT a, b FROM c WHERE d > 1 ORDER BY a"
+
+
+def test_parse_stats():
+    stats = ParseStats()
+    tree = ast.parse(query, stats=stats)
+
+    assert list(stats.times) == ["lex", "parse", "visit", "transform"]
+    assert stats.total_time == sum(stats.times.values())
+    assert stats.tokens == 14
+    assert stats.nodes == count_nodes(tree)
+    assert stats.stage == ast.LL
+    assert stats.syntax_errors == []
+    # the prediction of these rules needs full context
+    assert stats.full_context["selected_element"]
+    assert set(stats.ambiguities) <= set(stats.full_context)
+    assert repr(tree) == repr(ast.parse(query))
+
+
+def test_parse_stats_callback():
+    results = []
+    ast.parse(query, stats=results.append)
+    assert len(results) == 1
+    assert results[0].as_dict()["tokens"] == 14
+
+
+def test_parse_stats_errors():
+    stats = ParseStats()
+    ast.parse("SELECT FROM", stats=stats)
+    assert stats.stage == ast.RECOVERY
+    assert [error[:2] for error in stats.syntax_errors] == [(1, 7)]
+
+
+def test_parse_stats_strict():
+    results = []
+    with pytest.raises(ast.ParseError):
+        ast.parse("SELECT FROM", strict=True, stats=results.append)
+    assert len(results[0].syntax_errors) == 1
+    assert results[0].nodes == 0
+
+
+def test_parse_stats_two_stage():
+    stats = ParseStats()
+    ast.parse("SELECT a FROM b", two_stage=True, stats=stats)
+    assert stats.stage == ast.SLL
+    assert not stats.full_context
+
+
+def test_parse_stats_cached():
+    ast.enable_cache()
+    try:
+        tree = ast.parse(query)
+        stats = ParseStats()
+        assert repr(ast.parse(query, stats=stats)) == repr(tree)
+    finally:
+        ast.disable_cache()
+    assert stats.cached
+    assert stats.nodes == count_nodes(tree)
+    assert not stats.times
+
+
+def test_count_nodes_shared():
+    tree = ast.parse("SELECT a FROM b WHERE c = 1")
+    select = tree.body[0]
+    # the where clause is both a field and a child of the select statement
+    assert count_nodes(tree) == count_nodes(select) + 1
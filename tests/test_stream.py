@@ -0,0 +1,103 @@
+import gc
+import io
+import tracemalloc
+import pytest
+from antlr_plsql import ast
+from antlr_plsql.script import parse_script, merge_scripts, split_script
+from antlr_plsql.stream import iter_statements
+
+script = """-- ünïcode
+SELECT a FROM b;
+SELECT 'x;y€' AS "c;d" FROM e /* ; */ ;
+
+  UPDATE a SET b = 1;
+BEGIN
+  NULL;
+END;
+/
+SELECT 1 FROM dual -- end
+"""
+
+
+@pytest.fixture
+def script_path(tmpdir):
+    path = tmpdir.join("script.sql")
+    path.write_binary(script.encode("utf-8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("block_size", [1, 5, 1 << 20])
+def test_iter_statements(script_path, block_size):
+    statements = list(iter_statements(script_path, block_size=block_size))
+
+    assert [
+        (stmt.char_start, stmt.char_start + len(stmt.text)) for stmt in statements
+    ] == split_script(script)
+    data = script.encode("utf-8")
+    for stmt in statements:
+        assert data[stmt.byte_start : stmt.byte_stop].decode("utf-8") == stmt.text
+        assert stmt.line == script.count("\n", 0, stmt.char_start) + 1
+
+    tree = merge_scripts([stmt.tree for stmt in statements])
+    reference = parse_script(script)
+    assert repr(tree) == repr(reference)
+    assert [stmt.get_position() for stmt in tree.body] == [
+        stmt.get_position() for stmt in reference.body
+    ]
+
+
+def test_iter_statements_get_text(script_path):
+    statement = list(iter_statements(script_path))[1]
+    select = statement.tree.body[0]
+    assert statement.get_text(select) == """SELECT 'x;y€' AS "c;d" FROM e"""
+    assert statement.get_text(select.target_list[0]) == """'x;y€' AS "c;d\""""
+
+
+def test_iter_statements_path_object(script_path, tmpdir):
+    path = tmpdir.join("script.sql")  # a py.path, which has __fspath__
+    assert [stmt.text for stmt in iter_statements(path)] == [
+        stmt.text for stmt in iter_statements(script_path)
+    ]
+
+
+@pytest.mark.parametrize("f", [io.StringIO(script), io.BytesIO(script.encode("utf-8"))])
+def test_iter_statements_file_objects(f):
+    assert "".join(stmt.text for stmt in iter_statements(f)) == script
+
+
+def test_iter_statements_empty():
+    statements = list(iter_statements(io.BytesIO(b"")))
+    assert len(statements) == 1
+    assert statements[0].text == ""
+    assert statements[0].tree.body == []
+
+
+def test_iter_statements_strict():
+    statements = iter_statements(
+        io.StringIO("SELECT a FROM b;\nSELECT FROM;"), strict=True
+    )
+    assert next(statements).tree.body[0].from_clause
+    with pytest.raises(ast.ParseError):
+        next(statements)
+
+
+def retained_memory(n):
+    """Bytes still allocated after streaming n statements and dropping them"""
+    text = "SELECT a, b FROM c WHERE a = 1;\n" * n
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in iter_statements(io.StringIO(text)):
+            pass
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+
+def test_iter_statements_memory_is_bounded():
+    retained_memory(5)  # warm up the DFA
+    few = retained_memory(10)
+    many = retained_memory(40)
+    assert many < 2 * few + 100000
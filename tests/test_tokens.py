@@ -0,0 +1,61 @@
+import pytest
+
+from antlr_plsql import ast
+from antlr_plsql.tokens import COLUMNS, TokenTable, tokenize
+from tests.test_examples import examples, load_examples
+
+
+def test_tokenize():
+    table = tokenize("SELECT a -- b\nFROM t;")
+
+    assert len(table) == 6
+    assert [table.get_name(i) for i in range(len(table))] == [
+        "SELECT",
+        "A_LETTER",
+        "SINGLE_LINE_COMMENT",
+        "FROM",
+        "REGULAR_ID",
+        "SEMICOLON",
+    ]
+    assert [table.get_text(i) for i in range(len(table))] == [
+        "SELECT",
+        "a",
+        "-- b\n",
+        "FROM",
+        "t",
+        ";",
+    ]
+    assert list(table.lines) == [1, 1, 1, 2, 2, 2]
+    assert list(table.columns) == [0, 7, 9, 0, 5, 6]
+    assert list(table.channels) == [0, 0, 1, 0, 0, 0]
+    assert table.types[0] == TokenTable.get_type("SELECT")
+
+
+def test_tokenize_empty():
+    assert len(tokenize("  ")) == 0
+
+
+def test_tokenize_buffers():
+    table = tokenize("SELECT a FROM b")
+    for name in COLUMNS:
+        view = memoryview(getattr(table, name))
+        assert view.format == "i"
+        assert view.nbytes == 4 * len(table)
+
+
+@pytest.mark.parametrize("name, query", load_examples(examples)[::10])
+def test_tokenize_examples(name, query):
+    stream = ast.lex(query)
+    stream.fill()
+    table = tokenize(query)
+    tokens = stream.tokens[:-1]  # without EOF
+    assert list(table.types) == [token.type for token in tokens]
+    assert list(table.starts) == [token.start for token in tokens]
+    assert list(table.stops) == [token.stop for token in tokens]
+    assert list(table.lines) == [token.line for token in tokens]
+    assert list(table.columns) == [token.column for token in tokens]
+    assert list(table.channels) == [token.channel for token in tokens]
+    assert (
+        table.names[stream.tokens[0].type]
+        == ast.grammar.Parser.symbolicNames[stream.tokens[0].type]
+    )